@@ -7,16 +7,18 @@ Aaron Edwards
 """
 # standard modules
 import argparse
+import atexit
 import json
 import logging
 import time
+import threading
 import sys
 import os
+from concurrent.futures import ThreadPoolExecutor
 
-from . import sites, menus, vpn, anynets
+from . import sites, menus, vpn, anynets, discovery, api_utils, transport, async_client, metadata_cache, vpn_numpy
 from .utils import dump_version
 from .versions import SCRIPT_VERSION, SCRIPT_NAME
-from progressbar import Bar, ETA, Percentage, ProgressBar
 
 # CloudGenix Python SDK
 try:
@@ -60,16 +62,50 @@ sdk_vars = {
     "reload_list_b": None,          # list of sites b to be used on re-loop of logic
     "reload_wn_list_a": None,       # list of WAN Networks a to be used on re-loop of logic
     "reload_wn_list_b": None,       # list of WAN Networks b to be used on re-loop of logic
-    "loop_counter": 0               # Loop counter, arg files only loaded on first loop.
+    "loop_counter": 0,              # Loop counter, arg files only loaded on first loop.
+    "workers": discovery.DEFAULT_WORKERS,   # Max API requests in flight at the same time (discovery and changes).
+    "topology_batch": 0,            # Max sites per topology query (0 or 1 = one site per query).
+    "bulk_swi": True,               # Load Site WAN Interfaces with one tenant-wide query instead of per site.
+    "tenant_site_count": 0,         # Sites in the tenant, set when sites are loaded (bulk_swi is for big shares).
+    "hub_topology": False,          # Query topology for HUB sites too (hub links are seen from the branch side).
+    "skip_inactive": True,          # Creating links - do not query admin disabled sites or sites with no role.
+    "inactive_site_ids": set(),     # Site IDs skip_inactive applies to, set when sites are loaded.
+    "inactive_sites_skipped": set(),    # Inactive site IDs left out of the last topology load, links not shown.
+    "link_inventory": False,        # Hub/Spoke lists links from the tenant link inventory instead of topology.
+    "numpy": False,                 # Full Mesh/Hub-Spoke links calculated with numpy arrays, see vpn_numpy module.
+    "retry_policy": api_utils.new_retry_policy(),   # Backoff/retry settings shared by all API calls that retry.
+    "api_limiter": api_utils.new_concurrency_limiter(discovery.DEFAULT_WORKERS),   # Adaptive in-flight limit.
+    "rate_limits": api_utils.new_rate_limits(),    # Requests per second budgets, per API group (default no limit).
+    "hedge_policy": None,           # Duplicate slow topology/SWI reads (None = off), see api_utils.hedged_call().
+    "async_api": False,             # Discovery and VPN Mesh Link changes on an asyncio event loop, not threads.
+    "topology_snapshot": None,      # Topology/SWI info shared by all meshing stances, see discovery module.
+    "topology_cache_file": None,    # File to keep topology snapshot in between runs (None = no cache).
+    "topology_cache_key": None,     # Tenant/controller info the cache file must match.
+    "topology_max_age": discovery.DEFAULT_CACHE_MAX_AGE,   # Max age (seconds) of a cached snapshot.
+    "topology_refresh": False,      # Ignore the cache file on next load, set by --refresh.
+    "topology_cache_sites": set(),  # Site IDs whose topology (link status) is still from the cache file.
+    "topology_cache_timestamp": None,   # When the cached snapshot was built.
+    "metadata_cache_dir": None,     # Directory to keep sites/WAN networks/domains in between runs (None = no cache).
+    "metadata_cache_key": None,     # Tenant/controller info the metadata cache files must match.
+    "prefetch": True,               # Load topology in the background while site lists are edited.
+    "prefetch_thread": None,        # Latest background topology load thread, see prefetch_topology_snapshot().
+    "prefetch_cancel": None,        # threading.Event that stops the latest background topology load.
+    "prefetch_sites": None,         # (site IDs, topology site IDs) sets the latest background load is loading.
+    "metadata": {},                 # Sites/WAN networks/domains (futures) kept for the session, see get_metadata().
+    "transport_adapter": None       # SDK session HTTP adapter, see transport module.
 }
 
 
-def siteid_to_name_dict(sdk_vars, sdk_session, site_name_to_domain=False, site_id_to_domain=False):
+def siteid_to_name_dict(sdk_vars, sdk_session, site_name_to_domain=False, site_id_to_domain=False,
+                        inactive_site_ids=False):
     """
-    Create a Site ID <-> Name xlation constructs
+    Create a Site ID <-> Name xlation constructs. Sites are read a page at a time (when the SDK and controller
+    support the sites query API), and only the fields used here are kept from each page.
     :param sdk_vars: sdk_vars global info struct
     :param site_name_to_domain: if not bool False, should be dict to receive site name->domain (service_endpoint) ID map.
     :param site_id_to_domain: if not bool False, should be dict to receive site id->domain (service_endpoint) ID map.
+    :param inactive_site_ids: if not bool False, should be set to receive IDs of sites that can't have VPN links
+                              (admin disabled, or no element_cluster_role).
     :return: xlate_dict, a dict with siteid key to site name. site_list, a list of site IDs
     """
     id_xlate_dict = {}
@@ -79,47 +115,54 @@ def siteid_to_name_dict(sdk_vars, sdk_session, site_name_to_domain=False, site_i
     site_tags = {}
     site_id_to_role = {}
 
-    resp = sdk_session.get.sites()
-    status = resp.cgx_status
-    raw_sites = resp.cgx_content
-
-    sites_list = raw_sites.get('items', None)
-
-    if not status or not sites_list:
+    def index_sites(sites_list):
+        # build translation dict. Safe to see a site twice (see api_utils.query_all_pages()).
+        for site in sites_list:
+            name = site.get('name')
+            site_id = site.get('id')
+            role = site.get('element_cluster_role')
+            service_binding = site.get('service_binding')
+
+            if name and site_id:
+                if site_id not in id_xlate_dict:
+                    site_id_list.append(site_id)
+                    site_name_list.append(name)
+                id_xlate_dict[site_id] = name
+                name_xlate_dict[name] = site_id
+                site_tags[name] = site.get('tags') or []
+
+            if site_id and role:
+                site_id_to_role[site_id] = role
+
+            # check for service binding / domain dict
+            if site_name_to_domain is not False and isinstance(site_name_to_domain, dict) and name and \
+                    service_binding:
+                site_name_to_domain[name] = service_binding
+            if site_id_to_domain is not False and isinstance(site_id_to_domain, dict) and site_id and \
+                    service_binding:
+                site_id_to_domain[site_id] = service_binding
+
+            # check for sites discovery can skip
+            if inactive_site_ids is not False and isinstance(inactive_site_ids, set) and site_id and \
+                    (site.get('admin_state') == 'disabled' or role in [None, 'NONE']):
+                inactive_site_ids.add(site_id)
+
+    # SDK 6.x names the sites query API site_query.
+    query_func = getattr(sdk_session.post, 'site_query', None) or getattr(sdk_session.post, 'sites_query', None)
+    status = metadata_cache.load_items(index_sites, "sites", query_func, sdk_session.get.sites, sdk_vars,
+                                       sdk_session, description="sites")
+
+    if not status or not id_xlate_dict:
         print("ERROR: unable to get sites for account '{0}'.".format(sdk_vars['tenant_name']))
-        return {}, {}, [], []
-
-    # build translation dict
-    for site in sites_list:
-        name = site.get('name')
-        site_id = site.get('id')
-        role = site.get('element_cluster_role')
-        service_binding = site.get('service_binding')
-
-        if name and site_id:
-            id_xlate_dict[site_id] = name
-            name_xlate_dict[name] = site_id
-            site_id_list.append(site_id)
-            site_name_list.append(name)
-            if not site['tags']:
-                site['tags'] = []
-            site_tags[name] = site['tags']
-
-        if site_id and role:
-            site_id_to_role[site_id] = role
-
-        # check for service binding / domain dict
-        if site_name_to_domain is not False and isinstance(site_name_to_domain, dict) and name and service_binding:
-            site_name_to_domain[name] = service_binding
-        if site_id_to_domain is not False and isinstance(site_id_to_domain, dict) and id and service_binding:
-            site_id_to_domain[site_id] = service_binding
+        return {}, {}, [], [], {}, {}
 
     return id_xlate_dict, name_xlate_dict, site_id_list, site_name_list, site_id_to_role, site_tags
 
 
 def wannetworkid_to_name_dict(sdk_vars, sdk_session):
     """
-    Create a Site ID <-> Name xlation constructs
+    Create a Site ID <-> Name xlation constructs. WAN Networks are read a page at a time (when the SDK and
+    controller support the WAN Networks query API), and only the fields used here are kept from each page.
     :param passed_sdk_vars: sdk_vars global info struct
     :return: xlate_dict, a dict with wannetworkid key to wan_network name. wan_network_list, a list of wan_network IDs
     """
@@ -129,32 +172,366 @@ def wannetworkid_to_name_dict(sdk_vars, sdk_session):
     wan_network_name_list = []
     wan_network_id_type = {}
 
-    resp = sdk_session.get.wannetworks()
-    status = resp.cgx_status
-    raw_wan_networks = resp.cgx_content
+    def index_wan_networks(wan_networks_list):
+        # build translation dict. Safe to see a WAN Network twice (see api_utils.query_all_pages()).
+        for wan_network in wan_networks_list:
+            name = wan_network.get('name')
+            wan_network_id = wan_network.get('id')
+            wn_type = wan_network.get('type')
+
+            if name and wan_network_id:
+                if wan_network_id not in id_xlate_dict:
+                    wan_network_id_list.append(wan_network_id)
+                    wan_network_name_list.append(name)
+                id_xlate_dict[wan_network_id] = name
+                name_xlate_dict[name] = wan_network_id
 
-    wan_networks_list = raw_wan_networks.get('items', None)
+            if wan_network_id and wn_type:
+                wan_network_id_type[wan_network_id] = wn_type
 
-    if not status or not wan_networks_list:
+    status = metadata_cache.load_items(index_wan_networks, "wannetworks",
+                                       getattr(sdk_session.post, 'wannetworks_query', None),
+                                       sdk_session.get.wannetworks, sdk_vars, sdk_session, description="WAN Networks")
+
+    if not status or not id_xlate_dict:
         print("ERROR: unable to get wan networks for account '{0}'.".format(sdk_vars['tenant_name']))
-        return {}, {}, [], []
+        return {}, {}, [], [], {}
 
-    # build translation dict
-    for wan_network in wan_networks_list:
-        name = wan_network.get('name')
-        wan_network_id = wan_network.get('id')
-        wn_type = wan_network.get('type')
+    return id_xlate_dict, name_xlate_dict, wan_network_id_list, wan_network_name_list, wan_network_id_type
 
-        if name and wan_network_id:
-            id_xlate_dict[wan_network_id] = name
-            name_xlate_dict[name] = wan_network_id
-            wan_network_id_list.append(wan_network_id)
-            wan_network_name_list.append(name)
 
-        if wan_network_id and wn_type:
-            wan_network_id_type[wan_network_id] = wn_type
+def site_metadata(sdk_session):
+    """
+    Get the site info every meshing stance needs, including domain (service binding) membership. Also sets
+    sdk_vars['inactive_site_ids'] and sdk_vars['tenant_site_count'].
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :return: tuple of siteid_to_name_dict() results, then site name -> domain ID and site ID -> domain ID dicts.
+    """
+    sitename_to_domain_id = {}
+    siteid_to_domain_id = {}
+    inactive_site_ids = set()
+    id_sitename_dict, sitename_id_dict, site_id_list, site_name_list, site_id_to_role_dict, site_tags \
+        = siteid_to_name_dict(sdk_vars, sdk_session, site_name_to_domain=sitename_to_domain_id,
+                              site_id_to_domain=siteid_to_domain_id, inactive_site_ids=inactive_site_ids)
 
-    return id_xlate_dict, name_xlate_dict, wan_network_id_list, wan_network_name_list, wan_network_id_type
+    # discovery skips these, see discovery.update_topology_snapshot().
+    sdk_vars["inactive_site_ids"] = inactive_site_ids
+    # discovery only pages through every Site WAN Interface for a big share of these, see discovery.use_bulk_swi().
+    sdk_vars["tenant_site_count"] = len(site_id_list)
+
+    return id_sitename_dict, sitename_id_dict, site_id_list, site_name_list, site_id_to_role_dict, site_tags, \
+        sitename_to_domain_id, siteid_to_domain_id
+
+
+def servicebindingmaps_metadata(sdk_session):
+    """
+    Get the service binding maps (domains).
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :return: list of service binding map items
+    """
+    servicebindingmaps = []
+    if not metadata_cache.load_items(servicebindingmaps.extend, "servicebindingmaps",
+                                     getattr(sdk_session.post, 'servicebindingmaps_query', None),
+                                     sdk_session.get.servicebindingmaps, sdk_vars, sdk_session,
+                                     description="service binding maps"):
+        return []
+
+    return servicebindingmaps
+
+
+def start_metadata_load():
+    """
+    Start fetching sites, WAN networks and service binding maps concurrently in the background. Results are kept
+    in sdk_vars['metadata'] for the rest of the session (see get_metadata()), until invalidate_metadata().
+    :return: No return
+    """
+    metadata_functions = {
+        "sites": (site_metadata, [CGX_SESSION]),
+        "wannetworks": (wannetworkid_to_name_dict, [sdk_vars, CGX_SESSION]),
+        "servicebindingmaps": (servicebindingmaps_metadata, [CGX_SESSION])
+    }
+
+    executor = ThreadPoolExecutor(max_workers=len(metadata_functions))
+    for name, (metadata_function, metadata_args) in metadata_functions.items():
+        if name not in sdk_vars["metadata"]:
+            # runs while the menus are up, retry notices are logged.
+            sdk_vars["metadata"][name] = executor.submit(background_call, metadata_function, *metadata_args)
+    # worker threads exit once the fetches are done.
+    executor.shutdown(wait=False)
+
+
+def background_call(func, *args):
+    """
+    Run a function for a background load, logging API retry notices instead of printing them over the menus.
+    :param func: function to call
+    :param args: positional args for func
+    :return: func return value
+    """
+    with api_utils.quiet_retry_notices():
+        return func(*args)
+
+
+def get_metadata(name):
+    """
+    Get session metadata, waiting for it if it is still loading. Failed or empty results are not kept, so the
+    next call fetches them again.
+    :param name: 'sites' (site_metadata() tuple), 'wannetworks' (wannetworkid_to_name_dict() tuple) or
+                 'servicebindingmaps' (list of items)
+    :return: metadata
+    """
+    if name not in sdk_vars["metadata"]:
+        start_metadata_load()
+
+    future = sdk_vars["metadata"][name]
+    try:
+        result = future.result()
+    except Exception:
+        sdk_vars["metadata"].pop(name, None)
+        raise
+
+    if not (result[0] if isinstance(result, tuple) else result):
+        sdk_vars["metadata"].pop(name, None)
+
+    return result
+
+
+def invalidate_metadata():
+    """
+    Forget session metadata, so sites, WAN networks and service binding maps are fetched again.
+    :return: No return
+    """
+    sdk_vars["metadata"] = {}
+
+
+def get_topology_snapshot():
+    """
+    Get the session topology snapshot - the one already in memory, the previous run's from the on-disk cache (if
+    enabled and not too old), or a new empty one.
+    :return: topology snapshot dict
+    """
+    snapshot = sdk_vars.get("topology_snapshot")
+    cache_file = sdk_vars.get("topology_cache_file")
+
+    if not snapshot and cache_file and not sdk_vars["topology_refresh"]:
+        # try previous run's snapshot.
+        snapshot = discovery.load_cached_topology_snapshot(cache_file, sdk_vars["topology_cache_key"],
+                                                           sdk_vars["topology_max_age"])
+        if snapshot:
+            print("Using cached VPN topology information from {0:.0f} minutes ago. Use --refresh to reload."
+                  "".format((time.time() - snapshot['timestamp']) / 60))
+            sdk_vars["topology_cache_sites"] = set(snapshot['topology_sites'])
+            sdk_vars["topology_cache_timestamp"] = snapshot['timestamp']
+    # only refresh once.
+    sdk_vars["topology_refresh"] = False
+
+    if not snapshot:
+        snapshot = discovery.new_topology_snapshot()
+        sdk_vars["topology_cache_sites"] = set()
+
+    # keep for other loops/stances.
+    sdk_vars["topology_snapshot"] = snapshot
+
+    return snapshot
+
+
+def refresh_topology_snapshot(snapshot, site_id_list, site_id_to_role_dict, wan_network_to_type_dict,
+                              topology_site_id_list=None, link_inventory=False, site_callback=None, quiet=False,
+                              skip_inactive=True, cancel=None):
+    """
+    Query any sites in site_id_list the snapshot does not have yet, and update the on-disk cache if it changed.
+    :param snapshot: topology snapshot dict
+    :param site_id_list: list of site IDs needed
+    :param site_id_to_role_dict: xlation dict of site ID to element_cluster_role
+    :param wan_network_to_type_dict: xlation dict of WAN network ID to type
+    :param topology_site_id_list: Optional list of the site IDs that need topology (default all in site_id_list)
+    :param link_inventory: Only modifiable links are needed, list them from the tenant link inventory if enabled.
+    :param site_callback: Optional function called with (snapshot, site ID) as each site is ready, see
+                          discovery.update_topology_snapshot().
+    :param quiet: No progress output (for background loads).
+    :param skip_inactive: Leave out inactive sites (if enabled) - False when removing links.
+    :param cancel: Optional threading.Event to stop loading early, see discovery.update_topology_snapshot().
+    :return: topology snapshot dict
+    """
+    loaded_count = len(snapshot['topology_sites']) + len(snapshot['swi_sites'])
+    stale_count = len(snapshot['stale_sites'])
+    # stale sites are queried again below, their link status is no longer from the cache file.
+    sdk_vars["topology_cache_sites"].difference_update(snapshot['stale_sites'])
+    inventory_loaded = snapshot['inventory_loaded']
+    discovery.update_topology_snapshot(snapshot, site_id_list, site_id_to_role_dict, wan_network_to_type_dict,
+                                       sdk_vars, CGX_SESSION, topology_site_id_list=topology_site_id_list,
+                                       link_inventory=link_inventory and sdk_vars["link_inventory"],
+                                       site_callback=site_callback, quiet=quiet, skip_inactive=skip_inactive,
+                                       cancel=cancel)
+
+    if stale_count or len(snapshot['topology_sites']) + len(snapshot['swi_sites']) != loaded_count or \
+            snapshot['inventory_loaded'] != inventory_loaded:
+        # sites were queried, update cache.
+        discovery.save_session_topology_snapshot(sdk_vars)
+
+    return snapshot
+
+
+def load_topology_snapshot(site_id_list, site_id_to_role_dict, wan_network_to_type_dict,
+                           topology_site_id_list=None, link_inventory=False, site_callback=None, skip_inactive=True):
+    """
+    Get the session topology snapshot, querying any sites in site_id_list it does not have yet.
+    :param site_id_list: list of site IDs needed
+    :param site_id_to_role_dict: xlation dict of site ID to element_cluster_role
+    :param wan_network_to_type_dict: xlation dict of WAN network ID to type
+    :param topology_site_id_list: Optional list of the site IDs that need topology (default all in site_id_list)
+    :param link_inventory: Only modifiable links are needed, list them from the tenant link inventory if enabled.
+    :param site_callback: Optional function called with (snapshot, site ID) as each site is ready, see
+                          discovery.update_topology_snapshot().
+    :param skip_inactive: Leave out inactive sites (if enabled) - False when removing links.
+    :return: topology snapshot dict
+    """
+    # background loads touch the snapshot, let them finish first.
+    wait_topology_prefetch(site_id_list, topology_site_id_list=topology_site_id_list)
+
+    snapshot = get_topology_snapshot()
+
+    return refresh_topology_snapshot(snapshot, site_id_list, site_id_to_role_dict, wan_network_to_type_dict,
+                                     topology_site_id_list=topology_site_id_list, link_inventory=link_inventory,
+                                     site_callback=site_callback, skip_inactive=skip_inactive)
+
+
+def topology_prefetch_worker(previous_thread, cancel, snapshot, site_id_list, site_id_to_role_dict,
+                             wan_network_to_type_dict, topology_site_id_list):
+    """
+    Background thread - load sites into the topology snapshot ahead of time (see prefetch_topology_snapshot()).
+    :param previous_thread: previous prefetch thread, or None. Prefetches run one at a time, in order.
+    :param cancel: threading.Event, set when this load is superseded or no longer needed.
+    :param snapshot: topology snapshot dict
+    :param site_id_list: list of site IDs to load
+    :param site_id_to_role_dict: xlation dict of site ID to element_cluster_role
+    :param wan_network_to_type_dict: xlation dict of WAN network ID to type
+    :param topology_site_id_list: list of the site IDs that need topology
+    :return: No return
+    """
+    if previous_thread is not None:
+        # already cancelled, so only waits for its queries in flight.
+        previous_thread.join()
+
+    if cancel.is_set():
+        return
+
+    try:
+        with api_utils.quiet_retry_notices():
+            refresh_topology_snapshot(snapshot, site_id_list, site_id_to_role_dict, wan_network_to_type_dict,
+                                      topology_site_id_list=topology_site_id_list, quiet=True, cancel=cancel)
+    except Exception as e:
+        # anything missed is loaded (with progress/errors shown) when the lists are used.
+        logger.warning("Background VPN topology load failed: {0}".format(e))
+
+
+def prefetch_topology_snapshot(site_id_list, site_id_to_role_dict, wan_network_to_type_dict,
+                               topology_site_id_list=None):
+    """
+    Start loading sites into the topology snapshot in the background, while the operator is still in the menus.
+    Starting a new load stops the previous one (sites it already loaded are kept). load_topology_snapshot() waits
+    for it, then only queries what is still missing.
+    :param site_id_list: list of site IDs to load
+    :param site_id_to_role_dict: xlation dict of site ID to element_cluster_role
+    :param wan_network_to_type_dict: xlation dict of WAN network ID to type
+    :param topology_site_id_list: Optional list of the site IDs that need topology (default all in site_id_list)
+    :return: No return
+    """
+    # lists changed, older loads are superseded.
+    if sdk_vars["prefetch_cancel"] is not None:
+        sdk_vars["prefetch_cancel"].set()
+
+    if not sdk_vars["prefetch"] or not site_id_list:
+        return
+
+    if topology_site_id_list is None:
+        topology_site_id_list = site_id_list
+
+    snapshot = get_topology_snapshot()
+    cancel = threading.Event()
+
+    # daemon, so exiting from a menu does not wait for it.
+    prefetch_thread = threading.Thread(target=topology_prefetch_worker,
+                                       args=(sdk_vars["prefetch_thread"], cancel, snapshot, list(site_id_list),
+                                             site_id_to_role_dict, wan_network_to_type_dict,
+                                             list(topology_site_id_list)),
+                                       daemon=True)
+    prefetch_thread.start()
+    sdk_vars["prefetch_thread"] = prefetch_thread
+    sdk_vars["prefetch_cancel"] = cancel
+    sdk_vars["prefetch_sites"] = (set(site_id_list), set(topology_site_id_list))
+
+
+def wait_topology_prefetch(site_id_list=None, topology_site_id_list=None):
+    """
+    Wait for background topology loads started by prefetch_topology_snapshot() to finish. A load that includes sites
+    not in site_id_list is stopped instead, so only queries already in flight are waited for.
+    :param site_id_list: Optional list of site IDs about to be loaded (default wait for the background load as is)
+    :param topology_site_id_list: Optional list of the site IDs that need topology (default all in site_id_list)
+    :return: No return
+    """
+    prefetch_thread = sdk_vars["prefetch_thread"]
+    if prefetch_thread is None:
+        return
+
+    if site_id_list is not None:
+        if topology_site_id_list is None:
+            topology_site_id_list = site_id_list
+        prefetch_site_ids, prefetch_topology_site_ids = sdk_vars["prefetch_sites"]
+        if not prefetch_site_ids.issubset(site_id_list) or \
+                not prefetch_topology_site_ids.issubset(topology_site_id_list):
+            sdk_vars["prefetch_cancel"].set()
+
+    if prefetch_thread.is_alive():
+        if sdk_vars["prefetch_cancel"].is_set():
+            print("Stopping background VPN topology load, please wait.")
+        else:
+            print("Finishing background VPN topology load, please wait.")
+        prefetch_thread.join()
+
+    sdk_vars["prefetch_thread"] = None
+    sdk_vars["prefetch_cancel"] = None
+    sdk_vars["prefetch_sites"] = None
+
+
+def custom_site_id_lists(site_list_a, site_list_b, sitename_id_dict, site_id_to_role_dict):
+    """
+    Convert custom mesh site name lists to the site ID lists discovery needs.
+    :param site_list_a: list of site names for list A
+    :param site_list_b: list of site names for list B
+    :param sitename_id_dict: xlation dict of site name to site ID
+    :param site_id_to_role_dict: xlation dict of site ID to element_cluster_role
+    :return: tuple of site ID list A, site ID list B, combined site ID list (no duplicates), list of the combined
+             site IDs that need topology.
+    """
+    # convert site lists (by name) to ID lists. Look up ID in previous sitename_id dict. if exists, enter.
+    site_id_list_a = []
+    for site in site_list_a:
+        site_id = sitename_id_dict.get(site, None)
+        if site_id:
+            site_id_list_a.append(site_id)
+
+    site_id_list_b = []
+    for site in site_list_b:
+        site_id = sitename_id_dict.get(site, None)
+        if site_id:
+            site_id_list_b.append(site_id)
+
+    # combine site lists and remove duplicates so we can pull topology info from API once per site.
+    combined_site_id_list = list(site_id_list_a)
+    site_id_set_a = set(site_id_list_a)
+    combined_site_id_list.extend(x for x in site_id_list_b if x not in site_id_set_a)
+
+    if site_id_list_a and site_id_list_b:
+        # A <-> B links are in the topology of both ends, only one list needs topology. SWIs are needed for both.
+        topology_site_ids = discovery.custom_topology_site_ids(site_id_list_a, site_id_list_b,
+                                                               site_id_to_role_dict,
+                                                               hub_topology=sdk_vars["hub_topology"])
+    else:
+        # only one list so far (prefetch) - guess that list will need topology.
+        topology_site_ids = set(combined_site_id_list)
+
+    return site_id_list_a, site_id_list_b, combined_site_id_list, [x for x in combined_site_id_list
+                                                                   if x in topology_site_ids]
 
 
 def custom_loop_function():
@@ -186,9 +563,6 @@ def custom_loop_function():
 
         logger.info("Initial Launch:")
 
-        # create file-system friendly tenant str.
-        sdk_vars["tenant_str"] = "".join([x for x in CGX_SESSION.tenant_name if x.isalnum()]).lower()
-
         # load site lists for first run.
         if sdk_vars['load_list_a']:
             try:
@@ -244,21 +618,31 @@ def custom_loop_function():
         site_list_a = sdk_vars["reload_list_a"]
         site_list_b = sdk_vars["reload_list_b"]
 
-    # Get/update list of sites, create python dictionary to map site ID to name.
-    print("Caching all site information, please wait...")
+    # Get list of sites, create python dictionary to map site ID to name. Kept between loops.
+    if any(not sdk_vars["metadata"].get(x) or not sdk_vars["metadata"][x].done() for x in ["sites", "wannetworks"]):
+        print("Caching all site information, please wait...")
 
-    id_sitename_dict, sitename_id_dict, site_id_list, site_name_list, site_id_to_role_dict, site_tags \
-        = siteid_to_name_dict(sdk_vars, CGX_SESSION)
+    id_sitename_dict, sitename_id_dict, site_id_list, site_name_list, site_id_to_role_dict, site_tags, _, _ \
+        = get_metadata("sites")
     id_wan_network_name_dict, wan_network_name_id_dict, wan_network_id_list, wan_network_name_list, \
-        wan_network_to_type_dict = wannetworkid_to_name_dict(sdk_vars, CGX_SESSION)
+        wan_network_to_type_dict = get_metadata("wannetworks")
 
     logger.debug("SITE -> ROLE ({0}): {1}".format(len(site_id_to_role_dict),
                                                   json.dumps(site_id_to_role_dict, indent=4)))
 
     # Begin Site Selection Loop
+    prefetched_lists = None
     loop = True
     while loop:
 
+        # start loading topology for the lists so far while the operator works in the menus.
+        if (site_list_a, site_list_b) != prefetched_lists:
+            prefetched_lists = (list(site_list_a), list(site_list_b))
+            _, _, prefetch_site_id_list, prefetch_topology_site_id_list = \
+                custom_site_id_lists(site_list_a, site_list_b, sitename_id_dict, site_id_to_role_dict)
+            prefetch_topology_snapshot(prefetch_site_id_list, site_id_to_role_dict, wan_network_to_type_dict,
+                                       topology_site_id_list=prefetch_topology_site_id_list)
+
         # Print header
         print("")
         sites.print_selection_overview(site_list_a, site_list_b, sitename_id_dict, site_id_to_role_dict)
@@ -267,6 +651,7 @@ def custom_loop_function():
         action = [
             ("Edit Site List A", 'edit_sitelista'),
             ("Edit Site List B", 'edit_sitelistb'),
+            ("Reload Sites and WAN Networks", 'reload_metadata'),
             ("Continue", 'continue')
         ]
 
@@ -282,6 +667,15 @@ def custom_loop_function():
         elif selected_action == 'edit_sitelistb':
             site_list_b = sites.edit_site_list(site_list_b, "Site List B", site_name_list, sdk_vars["tenant_str"],
                                                site_tags)
+        elif selected_action == 'reload_metadata':
+            print("Reloading all site information, please wait...")
+            invalidate_metadata()
+            id_sitename_dict, sitename_id_dict, site_id_list, site_name_list, site_id_to_role_dict, site_tags, \
+                _, _ = get_metadata("sites")
+            id_wan_network_name_dict, wan_network_name_id_dict, wan_network_id_list, wan_network_name_list, \
+                wan_network_to_type_dict = get_metadata("wannetworks")
+            # lists may now load different sites.
+            prefetched_lists = None
         elif selected_action == "continue":
             if (len(site_list_a) < 1) or (len(site_list_b) < 1):
                 print("\nERROR, must select at least one site in each list.")
@@ -307,189 +701,17 @@ def custom_loop_function():
 
     mesh_type = menus.quick_menu(banner, line_fmt, action)[1]
 
-    # map type-specific anynet based on choice above
-    anynet_specific_type = 'anynet'
-    if mesh_type in ['privatewan']:
-        anynet_specific_type = "private-anynet"
-    elif mesh_type in ['publicwan']:
-        anynet_specific_type = "public-anynet"
-
-    # convert site lists (by name) to ID lists. Look up ID in previous sitename_id dict. if exists, enter.
-    site_id_list_a = []
-    for site in site_list_a:
-        site_id = sitename_id_dict.get(site, None)
-        if site_id:
-            site_id_list_a.append(site_id)
-
-    site_id_list_b = []
-    for site in site_list_b:
-        site_id = sitename_id_dict.get(site, None)
-        if site_id:
-            site_id_list_b.append(site_id)
-
-    # combine site lists and remove duplicates so we can pull topology info from API once per site.
-    combined_site_id_list = list(site_id_list_a)
-    combined_site_id_list.extend(x for x in site_id_list_b if x not in site_id_list_a)
-
-    # print json.dumps(combined_site_id_list, indent=4)
-
-    # get/update topology
-
-    print("Loading VPN topology information for {0} sites, please wait...".format(len(combined_site_id_list)))
+    site_id_list_a, site_id_list_b, combined_site_id_list, topology_site_id_list = \
+        custom_site_id_lists(site_list_a, site_list_b, sitename_id_dict, site_id_to_role_dict)
 
-    logger.debug('COMBINED_SITE_ID_LIST ({0}): {1}'.format(len(combined_site_id_list),
-                                                           json.dumps(combined_site_id_list, indent=4)))
+    # get/update topology. Snapshot holds both VPN types, so switching mesh type on re-loop is free.
+    snapshot = load_topology_snapshot(combined_site_id_list, site_id_to_role_dict, wan_network_to_type_dict,
+                                      topology_site_id_list=topology_site_id_list)
 
-    swi_to_wan_network_dict = {}
-    swi_to_site_dict = {}
-    wan_network_to_swi_dict = {}
-    all_anynets = {}
-    site_swi_dict = {}
-
-    # could be a long query - start a progress bar.
-    pbar = ProgressBar(widgets=[Percentage(), Bar(), ETA()], max_value=len(combined_site_id_list)+1).start()
-    site_processed = 1
-
-    for site in combined_site_id_list:
-        site_swi_list = []
-
-        query = {
-            "type": "basenet",
-            "nodes": [
-                site
-            ]
-        }
-
-        status = False
-        rest_call_retry = 0
-
-        while not status:
-            resp = CGX_SESSION.post.topology(query)
-            status = resp.cgx_status
-            topology = resp.cgx_content
-
-            if not status:
-                print("API request for topology for site ID {0} failed/timed out. Retrying.".format(site))
-                rest_call_retry += 1
-                # have we hit retry limit?
-                if rest_call_retry >= sdk_vars['rest_call_max_retry']:
-                    # Bail out
-                    print("ERROR: could not query site ID {0}. Continuing.".format(site))
-                    status = True
-                    topology = False
-                else:
-                    # wait and keep going.
-                    time.sleep(1)
-
-        if status and topology:
-            # iterate topology. We need to iterate all of the matching SWIs, and existing anynet connections (sorted).
-            logger.debug("TOPOLOGY: {0}".format(json.dumps(topology, indent=4)))
-
-            for link in topology.get('links', []):
-                link_type = link.get('type', "")
-
-                # if an anynet link (SWI to SWI)
-                if link_type in ["anynet", anynet_specific_type]:
-                    # vpn record, check for uniqueness.
-                    # 4.4.1
-                    source_swi = link.get('source_wan_if_id')
-                    if not source_swi:
-                        # 4.3.x compatibility
-                        source_swi = link.get('source_wan_path_id')
-                        if source_swi:
-                            link['source_wan_if_id'] = source_swi
-                    # 4.4.1
-                    dest_swi = link.get('target_wan_if_id')
-                    if not dest_swi:
-                        # 4.3.x compatibility
-                        dest_swi = link.get('target_wan_path_id')
-                        if dest_swi:
-                            link['target_wan_if_id'] = dest_swi
-                    # create anynet lookup key
-                    anynet_lookup_key = "_".join(sorted([source_swi, dest_swi]))
-                    if not all_anynets.get(anynet_lookup_key, None):
-                        # path is not in current anynets, add
-                        all_anynets[anynet_lookup_key] = link
-
-        # Query 2 - now need to query SWI for site, since stub-topology may not be in topology info.
-        status = False
-
-        while not status:
-            resp = CGX_SESSION.get.waninterfaces(site)
-            status = resp.cgx_status
-            site_wan_if_result = resp.cgx_content
-
-            if not status:
-                print("API request for Site WAN Interfaces for site ID {0} failed/timed out. Retrying.".format(site))
-                time.sleep(1)
-
-        if status and site_wan_if_result:
-            site_wan_if_items = site_wan_if_result.get('items', [])
-            logger.debug('SITE WAN IF ITEMS ({0}): {1}'.format(len(site_wan_if_items),
-                                                               json.dumps(site_wan_if_items, indent=4)))
-
-            # iterate all the site wan interfaces
-            for current_swi in site_wan_if_items:
-                # get the WN bound to the SWI.
-                wan_network_id = current_swi.get('network_id', "")
-                swi_id = current_swi.get('id', "")
-
-                if swi_id:
-                    # update SWI -> Site xlation dict
-                    swi_to_site_dict[swi_id] = site
-
-                # get the SWIs that match the mesh_type
-                if wan_network_id and swi_id and wan_network_to_type_dict.get(wan_network_id, "") == mesh_type:
-                    logger.debug('SWI_ID = SITE: {0} = {1}'.format(swi_id, site))
-
-                    # query existing wan_network_to_swi dict if entry exists.
-                    existing_swi_list = wan_network_to_swi_dict.get(wan_network_id, [])
-
-                    # update swi -> WN xlate dict
-                    swi_to_wan_network_dict[swi_id] = wan_network_id
-
-                    # update site-level SWI list.
-                    site_swi_list.append(swi_id)
-
-                    # update WN -> swi xlate dict
-                    existing_swi_list.append(swi_id)
-                    wan_network_to_swi_dict[wan_network_id] = existing_swi_list
-
-        # add all matching mesh_type stubs to site_swi_dict
-        site_swi_dict[site] = site_swi_list
-
-        # iterate bar and counter.
-        site_processed += 1
-        pbar.update(site_processed)
-
-    # finish after iteration.
-    pbar.finish()
-
-    # update all_anynets with site info. Can't do this above, because xlation table not finished when needed.
-    for anynet_key, link in all_anynets.items():
-        # 4.4.1
-        source_swi = link.get('source_wan_if_id')
-        if not source_swi:
-            # 4.3.x compatibility
-            source_swi = link.get('source_wan_path_id')
-        # 4.4.1
-        dest_swi = link.get('target_wan_if_id')
-        if not dest_swi:
-            # 4.3.x compatibility
-            dest_swi = link.get('target_wan_path_id')
-        link['source_site_id'] = swi_to_site_dict.get(source_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
-        link['target_site_id'] = swi_to_site_dict.get(dest_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
-
-    logger.debug("SWI -> WN xlate ({0}): {1}".format(len(swi_to_wan_network_dict),
-                                               json.dumps(swi_to_wan_network_dict, indent=4)))
-    logger.debug("All Anynets ({0}): {1}".format(len(all_anynets),
-                                                     json.dumps(all_anynets, indent=4)))
-    logger.debug("SWI construct ({0}): {1}".format(len(site_swi_dict),
-                                                   json.dumps(site_swi_dict, indent=4)))
-    logger.debug("WN xlate ({0}): {1}".format(len(wan_network_to_swi_dict),
-                                              json.dumps(wan_network_to_swi_dict, indent=4)))
-    logger.debug("SWI -> SITE xlate ({0}): {1}".format(len(swi_to_site_dict),
-                                              json.dumps(swi_to_site_dict, indent=4)))
+    all_anynets, site_swi_dict = discovery.topology_snapshot_view(snapshot, mesh_type)
+    swi_to_wan_network_dict = snapshot['swi_to_wan_network_dict']
+    swi_to_site_dict = snapshot['swi_to_site_dict']
+    wan_network_to_swi_dict = snapshot['wan_network_to_swi_dict']
 
     new_anynets, current_anynets = vpn.main_vpn_menu(site_id_list_a,
                                                      site_id_list_b,
@@ -517,6 +739,10 @@ def custom_loop_function():
                                               site_id_to_role_dict,
                                               sdk_vars, CGX_SESSION)
 
+    if reload_or_exit == 'reload_all':
+        # query every selected site again, not just the ones with links changed.
+        discovery.mark_sites_stale(sdk_vars, combined_site_id_list)
+
     # Increment global loop counter
     sdk_vars["loop_counter"] += 1
 
@@ -544,19 +770,16 @@ def regional_loop_function(operation):
         # set logging off unless asked for
         pass
 
-    sitename_to_domain_id = {}
-    siteid_to_domain_id = {}
-    # Get/update list of sites, create python dictionary to map site ID to name.
-    id_sitename_dict, sitename_id_dict, site_id_list, site_name_list, site_id_to_role_dict, site_tags \
-        = siteid_to_name_dict(sdk_vars, CGX_SESSION, site_name_to_domain=sitename_to_domain_id,
-                              site_id_to_domain=siteid_to_domain_id)
+    # Get list of sites, create python dictionary to map site ID to name. Kept between loops.
+    id_sitename_dict, sitename_id_dict, site_id_list, site_name_list, site_id_to_role_dict, site_tags, \
+        sitename_to_domain_id, siteid_to_domain_id = get_metadata("sites")
     id_wan_network_name_dict, wan_network_name_id_dict, wan_network_id_list, wan_network_name_list, \
-        wan_network_to_type_dict = wannetworkid_to_name_dict(sdk_vars, CGX_SESSION)
+        wan_network_to_type_dict = get_metadata("wannetworks")
 
     # jd(siteid_to_domain_id)
 
     # pull domain membership info
-    servicebindingmaps_cache = CGX_SESSION.extract_items(CGX_SESSION.get.servicebindingmaps())
+    servicebindingmaps_cache = get_metadata("servicebindingmaps")
 
     sbm_name_to_id = CGX_SESSION.build_lookup_dict(servicebindingmaps_cache)
     sbm_id_to_name = CGX_SESSION.build_lookup_dict(servicebindingmaps_cache, key_val='id', value_val='name')
@@ -598,10 +821,6 @@ def regional_loop_function(operation):
     site_list_b = site_name_list[:]
     # TODO count site types here.
 
-    # we need to process for both public and private WANs.
-    anynet_specific_type_pub = "public-anynet"
-    anynet_specific_type_priv = "private-anynet"
-
     # convert site lists (by name) to ID lists. Look up ID in previous sitename_id dict. if exists, enter.
     site_id_list_a = []
     for site in site_list_a:
@@ -617,190 +836,17 @@ def regional_loop_function(operation):
 
     # combine site lists and remove duplicates so we can pull topology info from API once per site.
     combined_site_id_list = list(site_id_list_a)
-    combined_site_id_list.extend(x for x in site_id_list_b if x not in site_id_list_a)
+    site_id_set_a = set(site_id_list_a)
+    combined_site_id_list.extend(x for x in site_id_list_b if x not in site_id_set_a)
 
-    # print json.dumps(combined_site_id_list, indent=4)
+    # get/update topology - both public and private WANs come from the same snapshot.
+    snapshot = load_topology_snapshot(combined_site_id_list, site_id_to_role_dict, wan_network_to_type_dict)
 
-    # get/update topology
-
-    print("Loading VPN topology information for {0} sites, please wait.".format(len(combined_site_id_list)))
-
-    logger.debug('COMBINED_SITE_ID_LIST ({0}): {1}'.format(len(combined_site_id_list),
-                                                           json.dumps(combined_site_id_list, indent=4)))
-
-    swi_to_wan_network_dict = {}
-    swi_to_site_dict = {}
-    wan_network_to_swi_dict = {}
-    all_anynets_pub = {}
-    all_anynets_priv = {}
-    site_swi_dict_pub = {}
-    site_swi_dict_priv = {}
-
-    # could be a long query - start a progress bar.
-    pbar = ProgressBar(widgets=[Percentage(), Bar(), ETA()], max_value=len(combined_site_id_list)+1).start()
-    site_processed = 1
-
-    for site in combined_site_id_list:
-        site_swi_list_pub = []
-        site_swi_list_priv = []
-
-        query = {
-            "type": "basenet",
-            "nodes": [
-                site
-            ]
-        }
-
-        status = False
-        rest_call_retry = 0
-        topology = None
-
-        while not status:
-            resp = CGX_SESSION.post.topology(query)
-            status = resp.cgx_status
-            topology = resp.cgx_content
-
-            if not status:
-                print("API request for topology for site ID {0} failed/timed out. Retrying.".format(site))
-                rest_call_retry += 1
-                # have we hit retry limit?
-                if rest_call_retry >= sdk_vars['rest_call_max_retry']:
-                    # Bail out
-                    print("ERROR: could not query site ID {0}. Continuing.".format(site))
-                    status = True
-                    topology = False
-                else:
-                    # wait and keep going.
-                    time.sleep(1)
-
-        if status and topology:
-            # iterate topology. We need to iterate all of the matching SWIs, and existing anynet connections (sorted).
-            logger.debug("TOPOLOGY: {0}".format(json.dumps(topology, indent=4)))
-
-            for link in topology.get('links', []):
-                link_type = link.get('type', "")
-
-                # if an anynet link (SWI to SWI)
-                if link_type in [anynet_specific_type_pub, anynet_specific_type_priv]:
-                    # vpn record, check for uniqueness.
-                    # 4.4.1
-                    source_swi = link.get('source_wan_if_id')
-                    if not source_swi:
-                        # 4.3.x compatibility
-                        source_swi = link.get('source_wan_path_id')
-                        if source_swi:
-                            link['source_wan_if_id'] = source_swi
-                    # 4.4.1
-                    dest_swi = link.get('target_wan_if_id')
-                    if not dest_swi:
-                        # 4.3.x compatibility
-                        dest_swi = link.get('target_wan_path_id')
-                        if dest_swi:
-                            link['target_wan_if_id'] = dest_swi
-                    # create anynet lookup key
-                    anynet_lookup_key = "_".join(sorted([source_swi, dest_swi]))
-                    if link_type in [anynet_specific_type_pub]:
-                        if not all_anynets_pub.get(anynet_lookup_key, None):
-                            # path is not in current anynets, add
-                            all_anynets_pub[anynet_lookup_key] = link
-                    elif link_type in [anynet_specific_type_priv]:
-                        if not all_anynets_priv.get(anynet_lookup_key, None):
-                            # path is not in current anynets, add
-                            all_anynets_priv[anynet_lookup_key] = link
-
-        # Query 2 - now need to query SWI for site, since stub-topology may not be in topology info.
-        status = False
-        site_wan_if_result = False
-
-        while not status:
-            resp = CGX_SESSION.get.waninterfaces(site)
-            status = resp.cgx_status
-            site_wan_if_result = resp.cgx_content
-
-            if not status:
-                print("API request for Site WAN Interfaces for site ID {0} failed/timed out. Retrying.".format(site))
-                time.sleep(1)
-
-        if status and site_wan_if_result:
-            site_wan_if_items = site_wan_if_result.get('items', [])
-            logger.debug('SITE WAN IF ITEMS ({0}): {1}'.format(len(site_wan_if_items),
-                                                               json.dumps(site_wan_if_items, indent=4)))
-
-            # iterate all the site wan interfaces
-            for current_swi in site_wan_if_items:
-                # get the WN bound to the SWI.
-                wan_network_id = current_swi.get('network_id', "")
-                swi_id = current_swi.get('id', "")
-
-                if swi_id:
-                    # update SWI -> Site xlation dict
-                    swi_to_site_dict[swi_id] = site
-
-                # get the SWIs that match the mesh_type
-                if wan_network_id and swi_id and wan_network_to_type_dict.get(wan_network_id, "") in ['publicwan',
-                                                                                                      'privatewan']:
-                    logger.debug('SWI_ID = SITE: {0} = {1}'.format(swi_id, site))
-
-                    # query existing wan_network_to_swi dict if entry exists.
-                    existing_swi_list = wan_network_to_swi_dict.get(wan_network_id, [])
-
-                    # update swi -> WN xlate dict
-                    swi_to_wan_network_dict[swi_id] = wan_network_id
-
-                    # update site-level SWI list.
-                    if wan_network_to_type_dict.get(wan_network_id, "") == 'publicwan':
-                        site_swi_list_pub.append(swi_id)
-                    elif wan_network_to_type_dict.get(wan_network_id, "") == 'privatewan':
-                        site_swi_list_priv.append(swi_id)
-
-                    # update WN -> swi xlate dict
-                    existing_swi_list.append(swi_id)
-                    wan_network_to_swi_dict[wan_network_id] = existing_swi_list
-
-        # add all matching mesh_type stubs to site_swi_dict
-        site_swi_dict_pub[site] = site_swi_list_pub
-        site_swi_dict_priv[site] = site_swi_list_priv
-
-        # iterate bar and counter.
-        site_processed += 1
-        pbar.update(site_processed)
-
-    # finish after iteration.
-    pbar.finish()
-
-    # jd(all_anynets_pub)
-    # jd(all_anynets_priv)
-
-    # update all_anynets with site info. Can't do this above, because xlation table not finished when needed.
-    for anynet_key, link in all_anynets_pub.items():
-        source_swi = link.get('source_wan_if_id')
-        dest_swi = link.get('target_wan_if_id')
-        link['source_site_id'] = swi_to_site_dict.get(source_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
-        link['target_site_id'] = swi_to_site_dict.get(dest_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
-
-    for anynet_key, link in all_anynets_priv.items():
-        source_swi = link.get('source_wan_if_id')
-        dest_swi = link.get('target_wan_if_id')
-        link['source_site_id'] = swi_to_site_dict.get(source_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
-        link['target_site_id'] = swi_to_site_dict.get(dest_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
-
-    logger.debug("SWI -> WN xlate ({0}): {1}".format(len(swi_to_wan_network_dict),
-                                               json.dumps(swi_to_wan_network_dict, indent=4)))
-    logger.debug("All Anynets Pub ({0}): {1}".format(len(all_anynets_pub),
-                                                     json.dumps(all_anynets_pub, indent=4)))
-    logger.debug("All Anynets Pub ({0}): {1}".format(len(all_anynets_priv),
-                                                     json.dumps(all_anynets_priv, indent=4)))
-    logger.debug("SWI construct Pub ({0}): {1}".format(len(site_swi_dict_pub),
-                                                       json.dumps(site_swi_dict_pub, indent=4)))
-    logger.debug("SWI construct Priv ({0}): {1}".format(len(site_swi_dict_priv),
-                                                        json.dumps(site_swi_dict_priv, indent=4)))
-    logger.debug("WN xlate ({0}): {1}".format(len(wan_network_to_swi_dict),
-                                              json.dumps(wan_network_to_swi_dict, indent=4)))
-    logger.debug("SWI -> SITE xlate ({0}): {1}".format(len(swi_to_site_dict),
-                                              json.dumps(swi_to_site_dict, indent=4)))
-
-    # jd(all_anynets_pub)
-    # jd(all_anynets_priv)
+    all_anynets_pub, site_swi_dict_pub = discovery.topology_snapshot_view(snapshot, 'publicwan')
+    all_anynets_priv, site_swi_dict_priv = discovery.topology_snapshot_view(snapshot, 'privatewan')
+    swi_to_wan_network_dict = snapshot['swi_to_wan_network_dict']
+    swi_to_site_dict = snapshot['swi_to_site_dict']
+    wan_network_to_swi_dict = snapshot['wan_network_to_swi_dict']
 
     regional_mesh_work_dict = {}
     for domain_name, domain_site_id_list in domain_name_to_site_id_list.items():
@@ -914,11 +960,11 @@ def allchange_loop_function(operation):
         # set logging off unless asked for
         pass
 
-    # Get/update list of sites, create python dictionary to map site ID to name.
-    id_sitename_dict, sitename_id_dict, site_id_list, site_name_list, site_id_to_role_dict, site_tags \
-        = siteid_to_name_dict(sdk_vars, CGX_SESSION)
+    # Get list of sites, create python dictionary to map site ID to name.
+    id_sitename_dict, sitename_id_dict, site_id_list, site_name_list, site_id_to_role_dict, site_tags, _, _ \
+        = get_metadata("sites")
     id_wan_network_name_dict, wan_network_name_id_dict, wan_network_id_list, wan_network_name_list, \
-        wan_network_to_type_dict = wannetworkid_to_name_dict(sdk_vars, CGX_SESSION)
+        wan_network_to_type_dict = get_metadata("wannetworks")
 
     logger.debug("SITE -> ROLE ({0}): {1}".format(len(site_id_to_role_dict),
                                                   json.dumps(site_id_to_role_dict, indent=4)))
@@ -928,10 +974,6 @@ def allchange_loop_function(operation):
     site_list_b = site_name_list[:]
     # TODO count site types here.
 
-    # we need to process for both public and private WANs.
-    anynet_specific_type_pub = "public-anynet"
-    anynet_specific_type_priv = "private-anynet"
-
     # convert site lists (by name) to ID lists. Look up ID in previous sitename_id dict. if exists, enter.
     site_id_list_a = []
     for site in site_list_a:
@@ -947,212 +989,52 @@ def allchange_loop_function(operation):
 
     # combine site lists and remove duplicates so we can pull topology info from API once per site.
     combined_site_id_list = list(site_id_list_a)
-    combined_site_id_list.extend(x for x in site_id_list_b if x not in site_id_list_a)
-
-    # print json.dumps(combined_site_id_list, indent=4)
-
-    # get/update topology
-
-    print("Loading VPN topology information for {0} sites, please wait.".format(len(combined_site_id_list)))
-
-    logger.debug('COMBINED_SITE_ID_LIST ({0}): {1}'.format(len(combined_site_id_list),
-                                                           json.dumps(combined_site_id_list, indent=4)))
-
-    swi_to_wan_network_dict = {}
-    swi_to_site_dict = {}
-    wan_network_to_swi_dict = {}
-    all_anynets_pub = {}
-    all_anynets_priv = {}
-    site_swi_dict_pub = {}
-    site_swi_dict_priv = {}
-
-    # could be a long query - start a progress bar.
-    pbar = ProgressBar(widgets=[Percentage(), Bar(), ETA()], max_value=len(combined_site_id_list)+1).start()
-    site_processed = 1
-
-    for site in combined_site_id_list:
-        site_swi_list_pub = []
-        site_swi_list_priv = []
-
-        query = {
-            "type": "basenet",
-            "nodes": [
-                site
-            ]
-        }
+    site_id_set_a = set(site_id_list_a)
+    combined_site_id_list.extend(x for x in site_id_list_b if x not in site_id_set_a)
+
+    # Hub/Spoke removes every on-demand link, including ones to inactive sites. Only skip them when creating.
+    skip_inactive = operation != 'delete_c'
+
+    if sdk_vars["numpy"]:
+        # list A and B are the same sites - calculate every link at once when the topology is in.
+        snapshot = load_topology_snapshot(combined_site_id_list, site_id_to_role_dict, wan_network_to_type_dict,
+                                          link_inventory=(operation == 'delete_c'), skip_inactive=skip_inactive)
+
+        new_anynets_pub, current_anynets_pub = vpn_numpy.full_mesh_vpn_links(
+            combined_site_id_list, snapshot['site_swi_dict_pub'],
+            [snapshot['all_anynets_pub'], snapshot['all_anynets_generic']], snapshot['swi_to_site_dict'],
+            site_id_to_role_dict)
+        new_anynets_priv, current_anynets_priv = vpn_numpy.full_mesh_vpn_links(
+            combined_site_id_list, snapshot['site_swi_dict_priv'],
+            [snapshot['all_anynets_priv'], snapshot['all_anynets_generic']], snapshot['swi_to_site_dict'],
+            site_id_to_role_dict)
 
-        status = False
-        rest_call_retry = 0
-        topology = None
-
-        while not status:
-            resp = CGX_SESSION.post.topology(query)
-            status = resp.cgx_status
-            topology = resp.cgx_content
-
-            if not status:
-                print("API request for topology for site ID {0} failed/timed out. Retrying.".format(site))
-                rest_call_retry += 1
-                # have we hit retry limit?
-                if rest_call_retry >= sdk_vars['rest_call_max_retry']:
-                    # Bail out
-                    print("ERROR: could not query site ID {0}. Continuing.".format(site))
-                    status = True
-                    topology = False
-                else:
-                    # wait and keep going.
-                    time.sleep(1)
-
-        if status and topology:
-            # iterate topology. We need to iterate all of the matching SWIs, and existing anynet connections (sorted).
-            logger.debug("TOPOLOGY: {0}".format(json.dumps(topology, indent=4)))
-
-            for link in topology.get('links', []):
-                link_type = link.get('type', "")
-
-                # if an anynet link (SWI to SWI)
-                if link_type in [anynet_specific_type_pub, anynet_specific_type_priv]:
-                    # vpn record, check for uniqueness.
-                    # 4.4.1
-                    source_swi = link.get('source_wan_if_id')
-                    if not source_swi:
-                        # 4.3.x compatibility
-                        source_swi = link.get('source_wan_path_id')
-                        if source_swi:
-                            link['source_wan_if_id'] = source_swi
-                    # 4.4.1
-                    dest_swi = link.get('target_wan_if_id')
-                    if not dest_swi:
-                        # 4.3.x compatibility
-                        dest_swi = link.get('target_wan_path_id')
-                        if dest_swi:
-                            link['target_wan_if_id'] = dest_swi
-                    # create anynet lookup key
-                    anynet_lookup_key = "_".join(sorted([source_swi, dest_swi]))
-                    if link_type in [anynet_specific_type_pub]:
-                        if not all_anynets_pub.get(anynet_lookup_key, None):
-                            # path is not in current anynets, add
-                            all_anynets_pub[anynet_lookup_key] = link
-                    elif link_type in [anynet_specific_type_priv]:
-                        if not all_anynets_priv.get(anynet_lookup_key, None):
-                            # path is not in current anynets, add
-                            all_anynets_priv[anynet_lookup_key] = link
-
-        # Query 2 - now need to query SWI for site, since stub-topology may not be in topology info.
-        status = False
-        site_wan_if_result = False
-
-        while not status:
-            resp = CGX_SESSION.get.waninterfaces(site)
-            status = resp.cgx_status
-            site_wan_if_result = resp.cgx_content
-
-            if not status:
-                print("API request for Site WAN Interfaces for site ID {0} failed/timed out. Retrying.".format(site))
-                time.sleep(1)
-
-        if status and site_wan_if_result:
-            site_wan_if_items = site_wan_if_result.get('items', [])
-            logger.debug('SITE WAN IF ITEMS ({0}): {1}'.format(len(site_wan_if_items),
-                                                               json.dumps(site_wan_if_items, indent=4)))
-
-            # iterate all the site wan interfaces
-            for current_swi in site_wan_if_items:
-                # get the WN bound to the SWI.
-                wan_network_id = current_swi.get('network_id', "")
-                swi_id = current_swi.get('id', "")
-
-                if swi_id:
-                    # update SWI -> Site xlation dict
-                    swi_to_site_dict[swi_id] = site
-
-                # get the SWIs that match the mesh_type
-                if wan_network_id and swi_id and wan_network_to_type_dict.get(wan_network_id, "") in ['publicwan',
-                                                                                                      'privatewan']:
-                    logger.debug('SWI_ID = SITE: {0} = {1}'.format(swi_id, site))
-
-                    # query existing wan_network_to_swi dict if entry exists.
-                    existing_swi_list = wan_network_to_swi_dict.get(wan_network_id, [])
-
-                    # update swi -> WN xlate dict
-                    swi_to_wan_network_dict[swi_id] = wan_network_id
-
-                    # update site-level SWI list.
-                    if wan_network_to_type_dict.get(wan_network_id, "") == 'publicwan':
-                        site_swi_list_pub.append(swi_id)
-                    elif wan_network_to_type_dict.get(wan_network_id, "") == 'privatewan':
-                        site_swi_list_priv.append(swi_id)
-
-                    # update WN -> swi xlate dict
-                    existing_swi_list.append(swi_id)
-                    wan_network_to_swi_dict[wan_network_id] = existing_swi_list
-
-        # add all matching mesh_type stubs to site_swi_dict
-        site_swi_dict_pub[site] = site_swi_list_pub
-        site_swi_dict_priv[site] = site_swi_list_priv
-
-        # iterate bar and counter.
-        site_processed += 1
-        pbar.update(site_processed)
-
-    # finish after iteration.
-    pbar.finish()
-
-    # update all_anynets with site info. Can't do this above, because xlation table not finished when needed.
-    for anynet_key, link in all_anynets_pub.items():
-        source_swi = link.get('source_wan_if_id')
-        dest_swi = link.get('target_wan_if_id')
-        link['source_site_id'] = swi_to_site_dict.get(source_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
-        link['target_site_id'] = swi_to_site_dict.get(dest_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
-
-    for anynet_key, link in all_anynets_priv.items():
-        source_swi = link.get('source_wan_if_id')
-        dest_swi = link.get('target_wan_if_id')
-        link['source_site_id'] = swi_to_site_dict.get(source_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
-        link['target_site_id'] = swi_to_site_dict.get(dest_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
-
-    logger.debug("SWI -> WN xlate ({0}): {1}".format(len(swi_to_wan_network_dict),
-                                               json.dumps(swi_to_wan_network_dict, indent=4)))
-    logger.debug("All Anynets Pub ({0}): {1}".format(len(all_anynets_pub),
-                                                     json.dumps(all_anynets_pub, indent=4)))
-    logger.debug("All Anynets Pub ({0}): {1}".format(len(all_anynets_priv),
-                                                     json.dumps(all_anynets_priv, indent=4)))
-    logger.debug("SWI construct Pub ({0}): {1}".format(len(site_swi_dict_pub),
-                                                       json.dumps(site_swi_dict_pub, indent=4)))
-    logger.debug("SWI construct Priv ({0}): {1}".format(len(site_swi_dict_priv),
-                                                        json.dumps(site_swi_dict_priv, indent=4)))
-    logger.debug("WN xlate ({0}): {1}".format(len(wan_network_to_swi_dict),
-                                              json.dumps(wan_network_to_swi_dict, indent=4)))
-    logger.debug("SWI -> SITE xlate ({0}): {1}".format(len(swi_to_site_dict),
-                                              json.dumps(swi_to_site_dict, indent=4)))
-
-    new_anynets_pub, current_anynets_pub = vpn.no_menu_all_links(site_id_list_a,
-                                                                 site_id_list_b,
-                                                                 all_anynets_pub,
-                                                                 site_swi_dict_pub,
-                                                                 swi_to_wan_network_dict,
-                                                                 wan_network_to_swi_dict,
-                                                                 id_wan_network_name_dict,
-                                                                 wan_network_name_id_dict,
-                                                                 swi_to_site_dict,
-                                                                 id_sitename_dict,
-                                                                 'publicwan',
-                                                                 site_id_to_role_dict,
-                                                                 sdk_vars=sdk_vars, sdk_session=CGX_SESSION)
-
-    new_anynets_priv, current_anynets_priv = vpn.no_menu_all_links(site_id_list_a,
-                                                                   site_id_list_b,
-                                                                   all_anynets_priv,
-                                                                   site_swi_dict_priv,
-                                                                   swi_to_wan_network_dict,
-                                                                   wan_network_to_swi_dict,
-                                                                   id_wan_network_name_dict,
-                                                                   wan_network_name_id_dict,
-                                                                   swi_to_site_dict,
-                                                                   id_sitename_dict,
-                                                                   'privatewan',
-                                                                   site_id_to_role_dict,
-                                                                   sdk_vars=sdk_vars, sdk_session=CGX_SESSION)
+    else:
+        # links are calculated as each site loads, so most of the work is done by the time the last site is in.
+        calculation_pub = vpn.new_vpn_link_calculation(site_id_list_a, site_id_list_b, site_id_to_role_dict)
+        calculation_priv = vpn.new_vpn_link_calculation(site_id_list_a, site_id_list_b, site_id_to_role_dict)
+
+        def add_site_links(snapshot, site_id):
+            vpn.add_site_vpn_links(calculation_pub, site_id, snapshot['site_swi_dict_pub'].get(site_id),
+                                   [snapshot['all_anynets_pub'], snapshot['all_anynets_generic']],
+                                   snapshot['swi_to_site_dict'])
+            vpn.add_site_vpn_links(calculation_priv, site_id, snapshot['site_swi_dict_priv'].get(site_id),
+                                   [snapshot['all_anynets_priv'], snapshot['all_anynets_generic']],
+                                   snapshot['swi_to_site_dict'])
+
+        # get/update topology - both public and private WANs come from the same snapshot. Hub/Spoke only removes
+        # modifiable links, link status is not needed.
+        snapshot = load_topology_snapshot(combined_site_id_list, site_id_to_role_dict, wan_network_to_type_dict,
+                                          link_inventory=(operation == 'delete_c'), site_callback=add_site_links,
+                                          skip_inactive=skip_inactive)
+
+        new_anynets_pub = calculation_pub['new_anynets']
+        current_anynets_pub = calculation_pub['current_anynets']
+        new_anynets_priv = calculation_priv['new_anynets']
+        current_anynets_priv = calculation_priv['current_anynets']
+
+    swi_to_wan_network_dict = snapshot['swi_to_wan_network_dict']
+    logger.info("NEW AN Count: ({0}) Public, ({1}) Private".format(len(new_anynets_pub), len(new_anynets_priv)))
 
     reload_or_exit = anynets.main_anynet_nomenu_just_do(new_anynets_pub,
                                                         current_anynets_pub,
@@ -1184,6 +1066,80 @@ def go():
     controller_group.add_argument("--controller", "-C",
                                   help="Controller URI, ex. https://api.elcapitan.cloudgenix.com",
                                   default=None)
+    controller_group.add_argument("--workers", help="Max API requests in flight at the same time when loading "
+                                                    "VPN topology information or changing VPN Mesh Links. Starts "
+                                                    "lower and adapts to controller latency and throttling "
+                                                    "(default: {0})".format(discovery.DEFAULT_WORKERS),
+                                  type=int, default=discovery.DEFAULT_WORKERS)
+    controller_group.add_argument("--topology-batch", help="Query topology for up to this many sites per request. "
+                                                           "Batch size tunes itself, and is split on errors or "
+                                                           "timeouts (default: 0, one site per request)",
+                                  type=int, default=0)
+    controller_group.add_argument("--no-bulk-swi", help="Query Site WAN Interfaces one site at a time instead of "
+                                                        "with a tenant-wide query (only used when the selected "
+                                                        "sites are at least a quarter of the tenant)",
+                                  dest='bulk_swi', action='store_false', default=True)
+    controller_group.add_argument("--max-retries", help="Retries for failed/throttled API requests, with "
+                                                        "exponential backoff. Permanent errors are not retried "
+                                                        "(default: {0})".format(api_utils.DEFAULT_MAX_RETRIES),
+                                  type=int, default=api_utils.DEFAULT_MAX_RETRIES)
+    controller_group.add_argument("--api-rps", help="Max API requests per second, all requests combined. "
+                                                    "0 is no limit (default: 0)",
+                                  type=float, default=0)
+    controller_group.add_argument("--topology-rps", help="Max topology queries per second. 0 is no limit "
+                                                         "(default: 0)",
+                                  type=float, default=0)
+    controller_group.add_argument("--waninterfaces-rps", help="Max Site WAN Interface requests per second. "
+                                                              "0 is no limit (default: 0)",
+                                  type=float, default=0)
+    controller_group.add_argument("--write-rps", help="Max VPN Mesh Link create/update/delete requests per "
+                                                      "second. 0 is no limit (default: 0)",
+                                  type=float, default=0)
+    controller_group.add_argument("--hedge", help="Send a duplicate topology/Site WAN Interface request when one "
+                                                  "runs longer than 95%% of recent requests, use the first answer",
+                                  action='store_true', default=False)
+    controller_group.add_argument("--hedge-budget", help="Max duplicate requests from --hedge, as a fraction of "
+                                                         "requests (default: {0})"
+                                                         "".format(api_utils.DEFAULT_HEDGE_BUDGET),
+                                  type=float, default=api_utils.DEFAULT_HEDGE_BUDGET)
+    controller_group.add_argument("--async", help="Load VPN topology information and change VPN Mesh Links "
+                                                  "with asyncio on one thread instead of a thread pool, so --workers "
+                                                  "can be in the thousands. --hedge does not apply. Needs the "
+                                                  "'aiohttp' python module",
+                                  dest='async_api', action='store_true', default=False)
+    controller_group.add_argument("--no-prefetch", help="Do not load VPN topology information in the background "
+                                                        "while site lists are being edited",
+                                  dest='prefetch', action='store_false', default=True)
+    controller_group.add_argument("--include-inactive", help="Also query topology and Site WAN Interfaces for "
+                                                             "admin disabled sites and sites with no element "
+                                                             "cluster role (otherwise left out of the mesh, and "
+                                                             "links to them are not shown). Hub/Spoke always "
+                                                             "includes them",
+                                  dest='skip_inactive', action='store_false', default=True)
+    controller_group.add_argument("--link-inventory", help="For Hub/Spoke, list existing VPN Mesh Links from the "
+                                                           "tenant link inventory instead of querying VPN topology "
+                                                           "for every site. Link status is not shown",
+                                  action='store_true', default=False)
+    controller_group.add_argument("--hub-topology", help="Also query topology for DC (HUB) sites. Not normally "
+                                                         "needed, DC links are seen from the branch side",
+                                  action='store_true', default=False)
+
+    cache_group = parser.add_argument_group('Cache', 'These options control the on-disk caches.')
+    cache_group.add_argument("--max-age", help="Use cached VPN topology information up to this many seconds old, "
+                                               "instead of querying every site each run. Link status shown and "
+                                               "changes planned can be this old. 0 disables the cache (default: "
+                                               "{0})".format(discovery.DEFAULT_CACHE_MAX_AGE),
+                             type=int, default=discovery.DEFAULT_CACHE_MAX_AGE)
+    cache_group.add_argument("--refresh", help="Ignore cached VPN topology information and reload it from the API",
+                             action='store_true', default=False)
+    cache_group.add_argument("--no-metadata-cache", help="Do not keep sites, WAN Networks and domains between "
+                                                         "runs. When kept, they are only downloaded again if "
+                                                         "changed (HTTP ETag)",
+                             dest='metadata_cache', action='store_false', default=True)
+    cache_group.add_argument("--cache-dir", help="Directory for cached VPN topology information, sites, WAN "
+                                                 "Networks and domains (default: {0})"
+                                                 "".format(discovery.DEFAULT_CACHE_DIR),
+                             default=discovery.DEFAULT_CACHE_DIR)
 
     login_group = parser.add_argument_group('Login', 'These options allow skipping of interactive login')
     login_group.add_argument("--email", "-E", help="Use this email as User Name instead of cloudgenix_settings.py "
@@ -1210,6 +1166,10 @@ def go():
     vpn_group.add_argument("--load-list-b", "-LB", help="JSON file containing Site List B", default=False)
     vpn_group.add_argument("--load-wn-list-a", "-WA", help="JSON file containing Wan Network List A", default=False)
     vpn_group.add_argument("--load-wn-list-b", "-WB", help="JSON file containing Wan Network List B", default=False)
+    vpn_group.add_argument("--numpy", help="Calculate Full Mesh and Hub/Spoke VPN Mesh Links with numpy arrays "
+                                           "once VPN topology is loaded, instead of site by site while it loads. "
+                                           "Needs the 'numpy' python module",
+                           action='store_true', default=False)
 
     ARGS = vars(parser.parse_args())
 
@@ -1217,6 +1177,31 @@ def go():
     debuglevel = ARGS["verbose"]
     sdk_debuglevel = ARGS["sdkdebug"]
 
+    # API worker pool size, and the adaptive limit on requests in flight under it.
+    sdk_vars["workers"] = max(1, ARGS["workers"])
+    sdk_vars["api_limiter"] = api_utils.new_concurrency_limiter(sdk_vars["workers"])
+    sdk_vars["topology_batch"] = max(0, ARGS["topology_batch"])
+    sdk_vars["bulk_swi"] = ARGS["bulk_swi"]
+    sdk_vars["hub_topology"] = ARGS["hub_topology"]
+    sdk_vars["skip_inactive"] = ARGS["skip_inactive"]
+    sdk_vars["link_inventory"] = ARGS["link_inventory"]
+    sdk_vars["prefetch"] = ARGS["prefetch"]
+    sdk_vars["retry_policy"] = api_utils.new_retry_policy(max_retries=ARGS["max_retries"])
+    if ARGS["async_api"] and async_client.aiohttp is None:
+        print("ERROR: --async requires the 'aiohttp' python module (try 'pip install aiohttp').")
+        sys.exit(1)
+    sdk_vars["async_api"] = ARGS["async_api"]
+    if ARGS["numpy"] and vpn_numpy.numpy is None:
+        print("ERROR: --numpy requires the 'numpy' python module (try 'pip install numpy').")
+        sys.exit(1)
+    sdk_vars["numpy"] = ARGS["numpy"]
+    if ARGS["hedge"]:
+        sdk_vars["hedge_policy"] = api_utils.new_hedge_policy(sdk_vars["workers"], budget=ARGS["hedge_budget"])
+    sdk_vars["rate_limits"] = api_utils.new_rate_limits(all_rps=ARGS["api_rps"],
+                                                        topology_rps=ARGS["topology_rps"],
+                                                        waninterfaces_rps=ARGS["waninterfaces_rps"],
+                                                        anynet_writes_rps=ARGS["write_rps"])
+
     # Build SDK Constructor
     if ARGS['controller'] and ARGS['insecure']:
         CGX_SESSION = cloudgenix.API(controller=ARGS['controller'], ssl_verify=False)
@@ -1227,6 +1212,10 @@ def go():
     else:
         CGX_SESSION = cloudgenix.API()
 
+    # connection pool sized for the workers, with keep-alive and per-endpoint timeouts. Log reuse stats on exit.
+    sdk_vars["transport_adapter"] = transport.configure_transport(CGX_SESSION, sdk_vars["workers"])
+    atexit.register(transport.log_transport_stats, sdk_vars["transport_adapter"])
+
     # check for region ignore
     if ARGS['ignore_region']:
         CGX_SESSION.ignore_region = True
@@ -1291,6 +1280,30 @@ def go():
                 user_email = None
                 user_password = None
 
+    # create file-system friendly tenant str.
+    sdk_vars["tenant_str"] = "".join([x for x in CGX_SESSION.tenant_name if x.isalnum()]).lower()
+
+    # topology cache is per tenant.
+    if ARGS["max_age"] > 0:
+        sdk_vars["topology_cache_file"] = discovery.topology_cache_filename(ARGS["cache_dir"], sdk_vars["tenant_str"])
+        sdk_vars["topology_cache_key"] = {
+            "tenant_id": CGX_SESSION.tenant_id,
+            "controller": CGX_SESSION.controller
+        }
+        sdk_vars["topology_max_age"] = ARGS["max_age"]
+        sdk_vars["topology_refresh"] = ARGS["refresh"]
+
+    # sites, WAN networks and domains are cached per tenant, and revalidated each run.
+    if ARGS["metadata_cache"]:
+        sdk_vars["metadata_cache_dir"] = ARGS["cache_dir"]
+        sdk_vars["metadata_cache_key"] = {
+            "tenant_id": CGX_SESSION.tenant_id,
+            "controller": CGX_SESSION.controller
+        }
+
+    # load sites, WAN networks and domains while the stance menu is up.
+    start_metadata_load()
+
     # Begin meshing loop
     loop = True
     while loop:
@@ -1,13 +1,15 @@
 #!/usr/bin/env python
+import asyncio
 import json
 import copy
 import logging
-import time
 import sys
-from . import menus
+from itertools import islice
+from . import menus, discovery, async_client
 from .utils import re_pick, stat_inc
-from .versions import MODIFY_RETRY_COUNT
+from .api_utils import retry_call, RATE_LIMIT_ANYNET_WRITES
 from progressbar import Bar, ETA, Percentage, ProgressBar
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 # Set NON-SYSLOG logging to use function name
 logger = logging.getLogger(__name__)
@@ -17,18 +19,9 @@ logger = logging.getLogger(__name__)
 # delete_anynet_link(tenant_id, anynet_id)
 
 
-def create_anynet_link(site1_id, wan_if_id1, site2_id, wan_if_id2, forced=False, admin_state=True, sdk_vars=None, sdk_session=None):
-
-    # data = {
-    #     "ep1_site_id": site1_id,
-    #     "ep2_site_id": site2_id,
-    #     "ep1_wan_if_id": wan_if_id1,
-    #     "ep2_wan_if_id": wan_if_id2,
-    #     "forced": forced,
-    #     'admin_up': admin_state
-    # }
+def anynet_link_data(site1_id, wan_if_id1, site2_id, wan_if_id2, forced=False, admin_state=True):
     # 5.5.1+ anynet
-    data = {
+    return {
         "name": None,
         "description": None,
         "tags": None,
@@ -42,8 +35,27 @@ def create_anynet_link(site1_id, wan_if_id1, site2_id, wan_if_id2, forced=False,
         "vpnlink_configuration": None
     }
 
+
+def create_anynet_link(site1_id, wan_if_id1, site2_id, wan_if_id2, forced=False, admin_state=True, sdk_vars=None, sdk_session=None):
+
+    # data = {
+    #     "ep1_site_id": site1_id,
+    #     "ep2_site_id": site2_id,
+    #     "ep1_wan_if_id": wan_if_id1,
+    #     "ep2_wan_if_id": wan_if_id2,
+    #     "forced": forced,
+    #     'admin_up': admin_state
+    # }
+    data = anynet_link_data(site1_id, wan_if_id1, site2_id, wan_if_id2, forced=forced, admin_state=admin_state)
+
     # return api_utils.rest_call(url, 'post', data=data, sdk_vars=sdk_vars, sdk_session=sdk_session)
-    resp = sdk_session.post.tenant_anynetlinks(data)
+    resp = retry_call(sdk_session.post.tenant_anynetlinks, data,
+                      retry_policy=sdk_vars.get('retry_policy') if sdk_vars else None,
+                      limiter=sdk_vars.get('api_limiter') if sdk_vars else None,
+                      rate_limits=sdk_vars.get('rate_limits') if sdk_vars else None,
+                      rate_group=RATE_LIMIT_ANYNET_WRITES,
+                      description="create Mesh VPN Link {0}({1}) <-> {2}({3})".format(site1_id, wan_if_id1,
+                                                                                      site2_id, wan_if_id2))
     return resp.cgx_status, resp.cgx_content
 
 
@@ -54,17 +66,177 @@ def update_anynet_link(anynet_id, admin_state=True, sdk_vars=None, sdk_session=N
     }
 
     # return api_utils.rest_call(url, 'put', data=data, sdk_vars=sdk_vars, sdk_session=sdk_session)
-    resp = sdk_session.put.tenant_anynetlinks(anynet_id, data)
+    resp = retry_call(sdk_session.put.tenant_anynetlinks, anynet_id, data,
+                      retry_policy=sdk_vars.get('retry_policy') if sdk_vars else None,
+                      limiter=sdk_vars.get('api_limiter') if sdk_vars else None,
+                      rate_limits=sdk_vars.get('rate_limits') if sdk_vars else None,
+                      rate_group=RATE_LIMIT_ANYNET_WRITES,
+                      description="{0} Mesh VPN Link {1}".format("enable" if admin_state else "disable", anynet_id))
     return resp.cgx_status, resp.cgx_content
 
 
 def delete_anynet_link(anynet_id, sdk_vars=None, sdk_session=None):
 
     # return api_utils.rest_call(url, 'delete', sdk_vars=sdk_vars, sdk_session=sdk_session)
-    resp = sdk_session.delete.tenant_anynetlinks(anynet_id)
+    resp = retry_call(sdk_session.delete.tenant_anynetlinks, anynet_id,
+                      retry_policy=sdk_vars.get('retry_policy') if sdk_vars else None,
+                      limiter=sdk_vars.get('api_limiter') if sdk_vars else None,
+                      rate_limits=sdk_vars.get('rate_limits') if sdk_vars else None,
+                      rate_group=RATE_LIMIT_ANYNET_WRITES,
+                      description="delete Mesh VPN Link {0}".format(anynet_id))
     return resp.cgx_status, resp.cgx_content
 
 
+def apply_anynet_change(action, anynet, sdk_vars, sdk_session):
+    """
+    Make one VPN Mesh Link change.
+    :param action: 'create', 'delete', 'enable' or 'disable'
+    :param anynet: anynet dict (new anynet for create, topology link otherwise)
+    :param sdk_vars: sdk_vars global info struct
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :return: API result, or False if the change failed.
+    """
+    if action == 'create':
+        status, result = create_anynet_link(anynet['source_site_id'], anynet['source_wan_if_id'],
+                                            anynet['target_site_id'], anynet['target_wan_if_id'],
+                                            forced=True, admin_state=True, sdk_vars=sdk_vars,
+                                            sdk_session=sdk_session)
+    elif action == 'delete':
+        status, result = delete_anynet_link(anynet['path_id'], sdk_vars=sdk_vars, sdk_session=sdk_session)
+    else:
+        status, result = update_anynet_link(anynet['path_id'], admin_state=(action == 'enable'),
+                                            sdk_vars=sdk_vars, sdk_session=sdk_session)
+
+    return anynet_change_result(action, anynet, status, result)
+
+
+def anynet_change_result(action, anynet, status, result):
+    """
+    Report a failed VPN Mesh Link change, and pick the result to fold into the topology snapshot.
+    :param action: 'create', 'delete', 'enable' or 'disable'
+    :param anynet: anynet dict (new anynet for create, topology link otherwise)
+    :param status: Boolean API status
+    :param result: API result content
+    :return: API result, or False if the change failed.
+    """
+    if status:
+        return result
+
+    if action == 'create':
+        print("ERROR: Could not create Mesh VPN Link {0}({1}) <-> {2}({3})). Continuing."
+              "".format(anynet['source_site_id'], anynet['source_wan_if_id'],
+                        anynet['target_site_id'], anynet['target_wan_if_id']))
+    elif action == 'delete':
+        print("ERROR: Could not delete Mesh VPN Link {0}. Continuing.".format(anynet['path_id']))
+    else:
+        print("ERROR: Could not {0} Mesh VPN Link {1}. Continuing.".format(action, anynet['path_id']))
+
+    return False
+
+
+async def async_apply_anynet_change(action, anynet, client):
+    """
+    Make one VPN Mesh Link change (asyncio client).
+    :param action: 'create', 'delete', 'enable' or 'disable'
+    :param anynet: anynet dict (new anynet for create, topology link otherwise)
+    :param client: async_client client dict
+    :return: API result, or False if the change failed.
+    """
+    if action == 'create':
+        data = anynet_link_data(anynet['source_site_id'], anynet['source_wan_if_id'],
+                                anynet['target_site_id'], anynet['target_wan_if_id'], forced=True, admin_state=True)
+        resp = await async_client.retry_request(
+            client, async_client.post_tenant_anynetlinks, data, rate_group=RATE_LIMIT_ANYNET_WRITES,
+            description="create Mesh VPN Link {0}({1}) <-> {2}({3})".format(
+                anynet['source_site_id'], anynet['source_wan_if_id'],
+                anynet['target_site_id'], anynet['target_wan_if_id']))
+    elif action == 'delete':
+        resp = await async_client.retry_request(client, async_client.delete_tenant_anynetlinks, anynet['path_id'],
+                                                rate_group=RATE_LIMIT_ANYNET_WRITES,
+                                                description="delete Mesh VPN Link {0}".format(anynet['path_id']))
+    else:
+        resp = await async_client.retry_request(client, async_client.put_tenant_anynetlinks, anynet['path_id'],
+                                                {'admin_up': action == 'enable'}, rate_group=RATE_LIMIT_ANYNET_WRITES,
+                                                description="{0} Mesh VPN Link {1}".format(action, anynet['path_id']))
+
+    return anynet_change_result(action, anynet, resp.cgx_status, resp.cgx_content)
+
+
+async def async_apply_anynet_changes(changes, sdk_vars, sdk_session, pbar=None):
+    """
+    Make many VPN Mesh Link changes concurrently on an asyncio event loop, see apply_anynet_changes().
+    :param changes: list of (action, anynet) tuples, see apply_anynet_change()
+    :param sdk_vars: sdk_vars global info struct
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :param pbar: Optional started ProgressBar with max_value of len(changes) + 1.
+    :return: No return
+    """
+    workers = max(1, sdk_vars.get('workers', discovery.DEFAULT_WORKERS))
+    counter = 1
+    changes = iter(changes)
+    in_flight = {}
+
+    client = await async_client.open_client(sdk_session, sdk_vars)
+    try:
+        while True:
+            # keep up to workers changes going, not a task per change.
+            for action, anynet in islice(changes, workers - len(in_flight)):
+                task = asyncio.ensure_future(async_apply_anynet_change(action, anynet, client))
+                in_flight[task] = (action, anynet)
+
+            if not in_flight:
+                break
+
+            done, _ = await asyncio.wait(list(in_flight), return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                action, anynet = in_flight.pop(task)
+                discovery.fold_anynet_result(sdk_vars, action, anynet, task.result())
+                counter += 1
+                if pbar is not None:
+                    pbar.update(counter)
+    finally:
+        await async_client.close_client(client)
+
+
+def apply_anynet_changes(changes, sdk_vars, sdk_session, pbar=None):
+    """
+    Make many VPN Mesh Link changes in parallel. Requests in flight are bounded by sdk_vars['workers'] and the
+    adaptive sdk_vars['api_limiter']. Results are folded into the topology snapshot as each change finishes.
+    With sdk_vars['async_api'] set, changes run on an asyncio event loop instead of a thread pool.
+    :param changes: list of (action, anynet) tuples, see apply_anynet_change()
+    :param sdk_vars: sdk_vars global info struct
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :param pbar: Optional started ProgressBar with max_value of len(changes) + 1.
+    :return: No return
+    """
+    if sdk_vars.get('async_api', False):
+        asyncio.run(async_apply_anynet_changes(changes, sdk_vars, sdk_session, pbar=pbar))
+        return
+
+    workers = max(1, sdk_vars.get('workers', discovery.DEFAULT_WORKERS))
+    counter = 1
+    changes = iter(changes)
+    in_flight = {}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # keep up to workers changes submitted, not a future per change (and Ctrl-C leaves nothing queued).
+            for action, anynet in islice(changes, workers - len(in_flight)):
+                future = executor.submit(apply_anynet_change, action, anynet, sdk_vars, sdk_session)
+                in_flight[future] = (action, anynet)
+
+            if not in_flight:
+                break
+
+            done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+            for future in done:
+                action, anynet = in_flight.pop(future)
+                discovery.fold_anynet_result(sdk_vars, action, anynet, future.result())
+                counter += 1
+                if pbar is not None:
+                    pbar.update(counter)
+
+
 def delete_anynets_menu(current_anynets, sdk_vars, sdk_session):
 
     modifiable_anynets = {}
@@ -84,36 +256,14 @@ def delete_anynets_menu(current_anynets, sdk_vars, sdk_session):
                                    .format(num_anynets), 'N')
 
     if do_we_go in ['y']:
+        # sites at both ends of these links need their topology confirmed after the change.
+        discovery.mark_anynets_stale(sdk_vars, [modifiable_anynets])
+
         print("Preparing to DISABLE {0} VPN Mesh Links..".format(num_anynets))
 
-        counter = 1
         pbar = ProgressBar(widgets=[Percentage(), Bar(), ETA()], max_value=num_anynets+1).start()
-        for anynet_uniqueid, anynet in modifiable_anynets.items():
-
-            status = False
-            rest_call_retry = 0
-
-            while not status:
-                status, disable_result = delete_anynet_link(anynet['path_id'], sdk_vars=sdk_vars, sdk_session=sdk_session)
-
-                if not status:
-                    print("API request to disable Mesh VPN Link {0} failed/timed out. Retrying."\
-                        .format(anynet['path_id']))
-                    rest_call_retry += 1
-                    # have we hit retry limit?
-                    # print rest_call_retry
-                    # print sdk_vars['rest_call_max_retry']
-                    # print rest_call_retry >= sdk_vars['rest_call_max_retry']
-                    if rest_call_retry >= MODIFY_RETRY_COUNT:
-                        # Bail out
-                        print("ERROR: Could not disable Mesh VPN Link {0}. Continuing.".format(anynet['path_id']))
-                        status = True
-                        disable_result = False
-                    else:
-                        # wait and keep going.
-                        time.sleep(1)
-            counter += 1
-            pbar.update(counter)
+        changes = [('delete', anynet) for anynet in modifiable_anynets.values()]
+        apply_anynet_changes(changes, sdk_vars, sdk_session, pbar=pbar)
     else:
         print("Canceling...")
 
@@ -155,33 +305,14 @@ def delete_anynets_menu_both(current_anynets_pub, current_anynets_priv, sdk_vars
                                    "".format(num_anynets_pub, num_anynets_priv), 'N')
 
     if do_we_go in ['y']:
+        # sites at both ends of these links need their topology confirmed after the change.
+        discovery.mark_anynets_stale(sdk_vars, [modifiable_anynets])
+
         print("\nRemoving {0} Branch-Branch VPN Mesh Links..".format(num_anynets))
 
-        counter = 1
         pbar = ProgressBar(widgets=[Percentage(), Bar(), ETA()], max_value=num_anynets+1).start()
-        for anynet_uniqueid, anynet in modifiable_anynets.items():
-
-            status = False
-            rest_call_retry = 0
-
-            while not status:
-                status, disable_result = delete_anynet_link(anynet['path_id'], sdk_vars=sdk_vars,
-                                                            sdk_session=sdk_session)
-
-                if not status:
-                    print("API request to disable Mesh VPN Link {0} failed/timed out. Retrying."\
-                        .format(anynet['path_id']))
-                    rest_call_retry += 1
-                    if rest_call_retry >= MODIFY_RETRY_COUNT:
-                        # Bail out
-                        print("ERROR: Could not disable Mesh VPN Link {0}. Continuing.".format(anynet['path_id']))
-                        status = True
-                        disable_result = False
-                    else:
-                        # wait and keep going.
-                        time.sleep(1)
-            counter += 1
-            pbar.update(counter)
+        changes = [('delete', anynet) for anynet in modifiable_anynets.values()]
+        apply_anynet_changes(changes, sdk_vars, sdk_session, pbar=pbar)
 
         # make sure to clear the bar.
         pbar.finish()
@@ -205,37 +336,14 @@ def disable_anynets_menu(current_anynets, sdk_vars, sdk_session):
                                    .format(num_anynets), 'N')
 
     if do_we_go in ['y']:
+        # sites at both ends of these links need their topology confirmed after the change.
+        discovery.mark_anynets_stale(sdk_vars, [current_anynets])
+
         print("Preparing to DISABLE {0} VPN Mesh Links..".format(num_anynets))
 
-        counter = 1
         pbar = ProgressBar(widgets=[Percentage(), Bar(), ETA()], max_value=num_anynets+1).start()
-        for anynet_uniqueid, anynet in current_anynets.items():
-
-            status = False
-            rest_call_retry = 0
-
-            while not status:
-                status, disable_result = update_anynet_link(anynet['path_id'], admin_state=False,
-                                                            sdk_vars=sdk_vars, sdk_session=sdk_session)
-
-                if not status:
-                    print("API request to disable Mesh VPN Link {0} failed/timed out. Retrying."\
-                        .format(anynet['path_id']))
-                    rest_call_retry += 1
-                    # have we hit retry limit?
-                    # print rest_call_retry
-                    # print sdk_vars['rest_call_max_retry']
-                    # print rest_call_retry >= sdk_vars['rest_call_max_retry']
-                    if rest_call_retry >= MODIFY_RETRY_COUNT:
-                        # Bail out
-                        print("ERROR: Could not disable Mesh VPN Link {0}. Continuing.".format(anynet['path_id']))
-                        status = True
-                        disable_result = False
-                    else:
-                        # wait and keep going.
-                        time.sleep(1)
-            counter += 1
-            pbar.update(counter)
+        changes = [('disable', anynet) for anynet in current_anynets.values()]
+        apply_anynet_changes(changes, sdk_vars, sdk_session, pbar=pbar)
     else:
         print("Canceling...")
 
@@ -252,37 +360,14 @@ def enable_anynets_menu(current_anynets, sdk_vars, sdk_session):
                                    .format(num_anynets), 'N')
 
     if do_we_go in ['y']:
+        # sites at both ends of these links need their topology confirmed after the change.
+        discovery.mark_anynets_stale(sdk_vars, [current_anynets])
+
         print("Preparing to ENABLE {0} VPN Mesh Links..".format(num_anynets))
 
-        counter = 1
         pbar = ProgressBar(widgets=[Percentage(), Bar(), ETA()], max_value=num_anynets+1).start()
-        for anynet_uniqueid, anynet in current_anynets.items():
-
-            status = False
-            rest_call_retry = 0
-
-            while not status:
-                status, enable_result = update_anynet_link(anynet['path_id'], admin_state=True,
-                                                           sdk_vars=sdk_vars, sdk_session=sdk_session)
-
-                if not status:
-                    print("API request to enable Mesh VPN Link {0} failed/timed out. Retrying."\
-                        .format(anynet['path_id']))
-                    rest_call_retry += 1
-                    # have we hit retry limit?
-                    # print rest_call_retry
-                    # print sdk_vars['rest_call_max_retry']
-                    # print rest_call_retry >= sdk_vars['rest_call_max_retry']
-                    if rest_call_retry >= MODIFY_RETRY_COUNT:
-                        # Bail out
-                        print("ERROR: Could not disable Mesh VPN Link {0}. Continuing.".format(anynet['path_id']))
-                        status = True
-                        enable_result = False
-                    else:
-                        # wait and keep going.
-                        time.sleep(1)
-            counter += 1
-            pbar.update(counter)
+        changes = [('enable', anynet) for anynet in current_anynets.values()]
+        apply_anynet_changes(changes, sdk_vars, sdk_session, pbar=pbar)
     else:
         print("Canceling...")
 
@@ -298,40 +383,14 @@ def create_anynets_menu(new_anynets, sdk_vars, sdk_session):
                                    .format(num_anynets), 'N')
 
     if do_we_go in ['y']:
+        # sites at both ends of these links need their topology confirmed after the change.
+        discovery.mark_anynets_stale(sdk_vars, [new_anynets])
+
         print("Preparing to deploy {0} VPN Mesh Links..".format(num_anynets))
 
-        counter = 1
         pbar = ProgressBar(widgets=[Percentage(), Bar(), ETA()], max_value=num_anynets+1).start()
-        for anynet_uniqueid, anynet in new_anynets.items():
-
-            status = False
-            rest_call_retry = 0
-
-            while not status:
-                status, create_result = create_anynet_link(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                                           anynet['target_site_id'], anynet['target_wan_if_id'],
-                                                           forced=True, admin_state=True, sdk_vars=sdk_vars,
-                                                           sdk_session=sdk_session)
-
-                if not status:
-                    print("API request to create Mesh VPN Link {0}({1}) <-> {2}({3})) failed/timed out. Retrying."\
-                        .format(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                anynet['target_site_id'], anynet['target_wan_if_id']))
-                    rest_call_retry += 1
-                    # have we hit retry limit?
-                    if rest_call_retry >= MODIFY_RETRY_COUNT:
-                        # Bail out
-                        print("ERROR: Could not create Mesh VPN Link {0}({1}) <-> {2}({3})). Continuing."\
-                        .format(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                anynet['target_site_id'], anynet['target_wan_if_id']))
-                        status = True
-                        create_result = False
-                    else:
-                        # wait and keep going.
-                        time.sleep(1)
-
-            counter += 1
-            pbar.update(counter)
+        changes = [('create', anynet) for anynet in new_anynets.values()]
+        apply_anynet_changes(changes, sdk_vars, sdk_session, pbar=pbar)
     else:
         print("Canceling...")
 
@@ -353,72 +412,15 @@ def create_anynets_menu_both(new_anynets_pub, new_anynets_priv, sdk_vars, sdk_se
                                    "".format(num_anynets_pub, num_anynets_priv), 'N')
 
     if do_we_go in ['y']:
+        # sites at both ends of these links need their topology confirmed after the change.
+        discovery.mark_anynets_stale(sdk_vars, [new_anynets_pub, new_anynets_priv])
+
         print("\nDeploying {0} Branch-Branch VPN Mesh Links..".format(num_anynets))
 
-        counter = 1
         pbar = ProgressBar(widgets=[Percentage(), Bar(), ETA()], max_value=num_anynets+1).start()
-
-        for anynet_uniqueid, anynet in new_anynets_pub.items():
-
-            status = False
-            rest_call_retry = 0
-
-            while not status:
-                status, create_result = create_anynet_link(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                                           anynet['target_site_id'], anynet['target_wan_if_id'],
-                                                           forced=True, admin_state=True, sdk_vars=sdk_vars,
-                                                           sdk_session=sdk_session)
-
-                if not status:
-                    print("API request to create Mesh VPN Link {0}({1}) <-> {2}({3})) failed/timed out. Retrying."
-                          "".format(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                    anynet['target_site_id'], anynet['target_wan_if_id']))
-                    rest_call_retry += 1
-                    # have we hit retry limit?
-                    if rest_call_retry >= MODIFY_RETRY_COUNT:
-                        # Bail out
-                        print("ERROR: Could not create Mesh VPN Link {0}({1}) <-> {2}({3})). Continuing."
-                              "".format(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                        anynet['target_site_id'], anynet['target_wan_if_id']))
-                        status = True
-                        create_result = False
-                    else:
-                        # wait and keep going.
-                        time.sleep(1)
-
-            counter += 1
-            pbar.update(counter)
-
-        for anynet_uniqueid, anynet in new_anynets_priv.items():
-
-            status = False
-            rest_call_retry = 0
-
-            while not status:
-                status, create_result = create_anynet_link(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                                           anynet['target_site_id'], anynet['target_wan_if_id'],
-                                                           forced=True, admin_state=True, sdk_vars=sdk_vars,
-                                                           sdk_session=sdk_session)
-
-                if not status:
-                    print("API request to create Mesh VPN Link {0}({1}) <-> {2}({3})) failed/timed out. Retrying."
-                          "".format(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                    anynet['target_site_id'], anynet['target_wan_if_id']))
-                    rest_call_retry += 1
-                    # have we hit retry limit?
-                    if rest_call_retry >= MODIFY_RETRY_COUNT:
-                        # Bail out
-                        print("ERROR: Could not create Mesh VPN Link {0}({1}) <-> {2}({3})). Continuing."
-                              "".format(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                        anynet['target_site_id'], anynet['target_wan_if_id']))
-                        status = True
-                        create_result = False
-                    else:
-                        # wait and keep going.
-                        time.sleep(1)
-
-            counter += 1
-            pbar.update(counter)
+        changes = ([('create', anynet) for anynet in new_anynets_pub.values()] +
+                   [('create', anynet) for anynet in new_anynets_priv.values()])
+        apply_anynet_changes(changes, sdk_vars, sdk_session, pbar=pbar)
 
         # make sure to clear the bar.
         pbar.finish()
@@ -479,120 +481,18 @@ def apply_regional_mesh(regional_mesh_dict, sdk_vars, sdk_session):
     do_we_go = menus.quick_confirm(quick_confirm_string, 'N')
 
     if do_we_go in ['y']:
+        # sites at both ends of these links need their topology confirmed after the change.
+        discovery.mark_anynets_stale(sdk_vars, [new_anynets_pub, new_anynets_priv,
+                                                remove_anynets_pub, remove_anynets_priv])
+
         print(f"\nDeploying {num_new_anynets} new and removing {num_remove_anynets} existing Branch-Branch VPN Mesh Links..")
 
-        counter = 1
         pbar = ProgressBar(widgets=[Percentage(), Bar(), ETA()], max_value=num_anynet_changes+1).start()
-
-        for anynet_uniqueid, anynet in new_anynets_pub.items():
-
-            status = False
-            rest_call_retry = 0
-
-            while not status:
-                status, create_result = create_anynet_link(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                                           anynet['target_site_id'], anynet['target_wan_if_id'],
-                                                           forced=True, admin_state=True, sdk_vars=sdk_vars,
-                                                           sdk_session=sdk_session)
-
-                if not status:
-                    print("API request to create Mesh VPN Link {0}({1}) <-> {2}({3})) failed/timed out. Retrying."
-                          "".format(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                    anynet['target_site_id'], anynet['target_wan_if_id']))
-                    rest_call_retry += 1
-                    # have we hit retry limit?
-                    if rest_call_retry >= MODIFY_RETRY_COUNT:
-                        # Bail out
-                        print("ERROR: Could not create Mesh VPN Link {0}({1}) <-> {2}({3})). Continuing."
-                              "".format(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                        anynet['target_site_id'], anynet['target_wan_if_id']))
-                        status = True
-                        create_result = False
-                    else:
-                        # wait and keep going.
-                        time.sleep(1)
-
-            counter += 1
-            pbar.update(counter)
-
-        for anynet_uniqueid, anynet in new_anynets_priv.items():
-
-            status = False
-            rest_call_retry = 0
-
-            while not status:
-                status, create_result = create_anynet_link(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                                           anynet['target_site_id'], anynet['target_wan_if_id'],
-                                                           forced=True, admin_state=True, sdk_vars=sdk_vars,
-                                                           sdk_session=sdk_session)
-
-                if not status:
-                    print("API request to create Mesh VPN Link {0}({1}) <-> {2}({3})) failed/timed out. Retrying."
-                          "".format(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                    anynet['target_site_id'], anynet['target_wan_if_id']))
-                    rest_call_retry += 1
-                    # have we hit retry limit?
-                    if rest_call_retry >= MODIFY_RETRY_COUNT:
-                        # Bail out
-                        print("ERROR: Could not create Mesh VPN Link {0}({1}) <-> {2}({3})). Continuing."
-                              "".format(anynet['source_site_id'], anynet['source_wan_if_id'],
-                                        anynet['target_site_id'], anynet['target_wan_if_id']))
-                        status = True
-                        create_result = False
-                    else:
-                        # wait and keep going.
-                        time.sleep(1)
-
-            counter += 1
-            pbar.update(counter)
-
-        for anynet_uniqueid, anynet in remove_anynets_pub.items():
-
-            status = False
-            rest_call_retry = 0
-
-            while not status:
-                status, disable_result = delete_anynet_link(anynet['path_id'], sdk_vars=sdk_vars,
-                                                            sdk_session=sdk_session)
-
-                if not status:
-                    print("API request to disable Mesh VPN Link {0} failed/timed out. Retrying."\
-                        .format(anynet['path_id']))
-                    rest_call_retry += 1
-                    if rest_call_retry >= MODIFY_RETRY_COUNT:
-                        # Bail out
-                        print("ERROR: Could not disable Mesh VPN Link {0}. Continuing.".format(anynet['path_id']))
-                        status = True
-                        disable_result = False
-                    else:
-                        # wait and keep going.
-                        time.sleep(1)
-            counter += 1
-            pbar.update(counter)
-
-        for anynet_uniqueid, anynet in remove_anynets_priv.items():
-
-            status = False
-            rest_call_retry = 0
-
-            while not status:
-                status, disable_result = delete_anynet_link(anynet['path_id'], sdk_vars=sdk_vars,
-                                                            sdk_session=sdk_session)
-
-                if not status:
-                    print("API request to disable Mesh VPN Link {0} failed/timed out. Retrying."\
-                        .format(anynet['path_id']))
-                    rest_call_retry += 1
-                    if rest_call_retry >= MODIFY_RETRY_COUNT:
-                        # Bail out
-                        print("ERROR: Could not disable Mesh VPN Link {0}. Continuing.".format(anynet['path_id']))
-                        status = True
-                        disable_result = False
-                    else:
-                        # wait and keep going.
-                        time.sleep(1)
-            counter += 1
-            pbar.update(counter)
+        changes = ([('create', anynet) for anynet in new_anynets_pub.values()] +
+                   [('create', anynet) for anynet in new_anynets_priv.values()] +
+                   [('delete', anynet) for anynet in remove_anynets_pub.values()] +
+                   [('delete', anynet) for anynet in remove_anynets_priv.values()])
+        apply_anynet_changes(changes, sdk_vars, sdk_session, pbar=pbar)
 
 
         # make sure to clear the bar.
@@ -756,6 +656,8 @@ def main_anynet_menu(new_anynets, current_anynets,
             print("")
             print_selection_overview(new_anynet_text_list, "\"New\" links to finish Mesh")
             print("")
+            discovery.print_cached_topology_age(sdk_vars)
+            discovery.print_skipped_inactive_sites(sdk_vars)
         else:
             print("")
             print("s")
@@ -771,6 +673,7 @@ def main_anynet_menu(new_anynets, current_anynets,
             ("Delete All Matching Current Modifiable Links", 'delete_c'),
             ("Create All New Links", 'create_n'),
             ("Refresh Link Status (reload main menu)", 'reload'),
+            ("Re-query All Selected Sites (reload main menu)", 'reload_all'),
             ("Quit", 'quit')
         ]
 
@@ -809,8 +712,13 @@ def main_anynet_menu(new_anynets, current_anynets,
             if result:
                 links_modified = True
         elif selected_action == 'reload':
+            # sites with links changed (or failed) are queried again, changes already made are folded in.
             reload_main_menu = True
             loop = False
+        elif selected_action == 'reload_all':
+            # caller queries every selected site again.
+            reload_main_menu = 'reload_all'
+            loop = False
         else:
             sdk_session.interactive.logout()
             sys.exit()
@@ -853,6 +761,9 @@ def main_anynet_nomenu_just_do(new_anynets_pub, current_anynets_pub, new_anynets
                                                                                       id_wan_network_name_dict,
                                                                                       site_id_to_role_dict)
 
+    discovery.print_cached_topology_age(sdk_vars)
+    discovery.print_skipped_inactive_sites(sdk_vars)
+
     logger.debug("CURRENT_MESH_PUB ({0}): {1}".format(len(current_anynet_text_list_pub),
                                                       json.dumps(current_anynet_text_list_pub, indent=4)))
     logger.debug("CURRENT_MESH_PRIV ({0}): {1}".format(len(current_anynet_text_list_priv),
@@ -890,6 +801,9 @@ def regional_anynet_menu(regional_mesh_info_dict, swi_to_wn_dict, id_wan_network
              site_b_action_dict (Site-SWI dict for list B)
     """
 
+    discovery.print_cached_topology_age(sdk_vars)
+    discovery.print_skipped_inactive_sites(sdk_vars)
+
     loop = True
     while loop:
         # add line
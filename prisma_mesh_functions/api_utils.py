@@ -0,0 +1,701 @@
+#!/usr/bin/env python
+"""
+Shared CloudGenix API call helpers
+
+"""
+import logging
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from functools import partial
+from .versions import MODIFY_RETRY_COUNT
+
+# Set NON-SYSLOG logging to use function name
+logger = logging.getLogger(__name__)
+
+# items requested per page from "query" APIs.
+DEFAULT_PAGE_SIZE = 500
+# retry policy defaults. Delay doubles each retry (with jitter) from base up to max.
+DEFAULT_MAX_RETRIES = MODIFY_RETRY_COUNT - 1
+RETRY_BASE_DELAY = 1.0              # seconds
+RETRY_MAX_DELAY = 16.0              # seconds
+RETRY_AFTER_MAX_DELAY = 300.0       # seconds, longest Retry-After we will honor
+# HTTP status codes worth retrying. Anything else 4xx is a permanent failure (bad request, auth, not found, etc).
+RETRYABLE_STATUS_CODES = [408, 425, 429, 500, 502, 503, 504]
+# adaptive (AIMD) concurrency limit for API requests. The limit grows by about one request per round trip while
+# latency stays flat, and halves on throttling, server errors, timeouts or latency well above normal.
+LIMIT_START = 4
+LIMIT_MIN = 1
+LIMIT_DECREASE_FACTOR = 0.5
+LIMIT_LATENCY_TOLERANCE = 2.0       # latency this many times the normal latency of an API counts as congestion
+LIMIT_LATENCY_SMOOTHING = 0.1       # weight of each new sample in the normal latency average
+# token bucket rate limit groups. Every request takes a token from 'all' and from its own group, if limited.
+RATE_LIMIT_ALL = 'all'
+RATE_LIMIT_TOPOLOGY = 'topology'
+RATE_LIMIT_WANINTERFACES = 'waninterfaces'
+RATE_LIMIT_ANYNET_WRITES = 'anynet_writes'
+# hedged (duplicate) read requests. A read still running after the latency percentile of that API gets a duplicate,
+# first answer wins. Needs some samples first, and hedges are capped to a fraction of requests (the budget).
+DEFAULT_HEDGE_BUDGET = 0.05
+HEDGE_PERCENTILE = 95
+HEDGE_MIN_SAMPLES = 20
+HEDGE_MAX_SAMPLES = 200             # latency samples kept per API
+
+# per thread - retry notices are logged instead of printed while set, see quiet_retry_notices().
+RETRY_NOTICES = threading.local()
+
+
+def new_retry_policy(max_retries=DEFAULT_MAX_RETRIES, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+    """
+    Create a retry policy, shared by every API call that retries (see retry_call()).
+    :param max_retries: retries after the first attempt.
+    :param base_delay: delay before the first retry, in seconds.
+    :param max_delay: max delay between retries, in seconds (not counting Retry-After).
+    :return: retry policy dict
+    """
+    return {
+        "max_retries": max(0, max_retries),
+        "base_delay": base_delay,
+        "max_delay": max_delay
+    }
+
+
+def retryable_response(resp):
+    """
+    Check if a failed API response is worth retrying. Throttling (429), server errors (5xx) and timeouts/connection
+    errors (no HTTP status) are. Other 4xx errors will fail the same way again.
+    :param resp: failed CloudGenix SDK response
+    :return: Boolean
+    """
+    status_code = getattr(resp, 'status_code', None)
+
+    if not status_code:
+        # no HTTP response - timeout or connection error.
+        return True
+
+    return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+
+
+def retry_after_seconds(resp):
+    """
+    Get the delay a server asked for in a Retry-After header (seconds or HTTP date).
+    :param resp: CloudGenix SDK response
+    :return: seconds (float), or None if no usable header.
+    """
+    headers = getattr(resp, 'headers', None)
+    if not headers:
+        return None
+
+    retry_after = headers.get('Retry-After')
+    if retry_after is None:
+        return None
+
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+def retry_delay(retry_policy, retry_number, resp):
+    """
+    Work out how long to wait before a retry. Retry-After wins if the server sent it, otherwise exponential
+    backoff with jitter (a random delay between half and all of the backoff), so parallel callers spread out.
+    :param retry_policy: retry policy dict
+    :param retry_number: 0 for the first retry, 1 for the second, etc.
+    :param resp: failed CloudGenix SDK response
+    :return: seconds to wait (float)
+    """
+    retry_after = retry_after_seconds(resp)
+    if retry_after is not None:
+        return min(retry_after, RETRY_AFTER_MAX_DELAY)
+
+    backoff = min(retry_policy['max_delay'], retry_policy['base_delay'] * (2 ** retry_number))
+    return random.uniform(backoff / 2, backoff)
+
+
+@contextmanager
+def quiet_retry_notices(quiet=True):
+    """
+    Context manager - log retry notices from this thread instead of printing them (for background loads, which
+    would otherwise print over the menus).
+    :param quiet: Boolean, False to print them (ex. to restore a setting, see bind_retry_notices()).
+    :return: yields nothing
+    """
+    previous = getattr(RETRY_NOTICES, 'quiet', False)
+    RETRY_NOTICES.quiet = quiet
+    try:
+        yield
+    finally:
+        RETRY_NOTICES.quiet = previous
+
+
+def bind_retry_notices(func):
+    """
+    Wrap a function to run with the calling thread's retry notice setting, for work handed to other threads.
+    :param func: function to wrap
+    :return: wrapped function
+    """
+    quiet = getattr(RETRY_NOTICES, 'quiet', False)
+
+    def bound_func(*args, **kwargs):
+        with quiet_retry_notices(quiet):
+            return func(*args, **kwargs)
+
+    return bound_func
+
+
+def next_retry_delay(retry_policy, retry_number, resp, request_text):
+    """
+    Decide if an API response should be retried, and announce the retry.
+    :param retry_policy: retry policy dict
+    :param retry_number: retries made so far.
+    :param resp: CloudGenix SDK response
+    :param request_text: request description for messages, ex. "API request for topology for site ID 12345"
+    :return: seconds to wait before retrying (float), or None if the response should be returned as is.
+    """
+    if resp.cgx_status:
+        return None
+
+    if not retryable_response(resp):
+        logger.info("{0} failed with HTTP {1}, not retrying.".format(request_text,
+                                                                     getattr(resp, 'status_code', None)))
+        return None
+
+    if retry_number >= retry_policy['max_retries']:
+        return None
+
+    delay = retry_delay(retry_policy, retry_number, resp)
+    retry_text = "{0} failed/timed out. Retrying in {1:.1f}s.".format(request_text, delay)
+    if getattr(RETRY_NOTICES, 'quiet', False):
+        logger.info(retry_text)
+    else:
+        print(retry_text)
+    return delay
+
+
+def new_concurrency_limiter(max_limit, start_limit=LIMIT_START):
+    """
+    Create an adaptive concurrency limiter, shared by every thread making API requests (see limiter_acquire() and
+    limiter_release()). Additive increase while requests succeed at normal latency, multiplicative decrease on
+    congestion, between LIMIT_MIN and max_limit requests in flight.
+    :param max_limit: most requests ever allowed in flight at once.
+    :param start_limit: requests allowed in flight before anything has been measured.
+    :return: limiter dict
+    """
+    max_limit = max(LIMIT_MIN, max_limit)
+    return {
+        "condition": threading.Condition(),
+        "limit": float(max(LIMIT_MIN, min(start_limit, max_limit))),
+        "max_limit": max_limit,
+        "in_flight": 0,
+        "latency": {},              # API name -> smoothed latency of successful requests (seconds)
+        "last_decrease": 0.0        # time of the last decrease, one decrease per round of in-flight requests.
+    }
+
+
+def limiter_acquire(limiter):
+    """
+    Wait until the concurrency limit allows another request in flight, and count it.
+    :param limiter: limiter dict (from new_concurrency_limiter())
+    :return: request start time, to hand back to limiter_release().
+    """
+    with limiter['condition']:
+        while limiter['in_flight'] >= int(limiter['limit']):
+            limiter['condition'].wait()
+        limiter['in_flight'] += 1
+    return time.time()
+
+
+def limiter_try_acquire(limiter):
+    """
+    Count another request in flight if the concurrency limit allows it right now, without waiting (for callers
+    that wait their own way, ex. asyncio).
+    :param limiter: limiter dict (from new_concurrency_limiter())
+    :return: Boolean, True if counted.
+    """
+    with limiter['condition']:
+        if limiter['in_flight'] >= int(limiter['limit']):
+            return False
+        limiter['in_flight'] += 1
+    return True
+
+
+def limiter_release(limiter, start_time, api_name, resp):
+    """
+    Count a finished request, and adjust the concurrency limit based on how it went.
+    :param limiter: limiter dict (from new_concurrency_limiter())
+    :param start_time: start time from limiter_acquire()
+    :param api_name: name of the API called, latency is tracked per API.
+    :param resp: CloudGenix SDK response, or None if the call raised an exception.
+    :return: No return
+    """
+    latency = time.time() - start_time
+
+    with limiter['condition']:
+        limit_used = limiter['in_flight'] >= int(limiter['limit'])
+        limiter['in_flight'] -= 1
+
+        if resp is not None and not getattr(resp, 'cgx_status', False) and not retryable_response(resp):
+            # permanent error, says nothing about controller load.
+            congested = False
+        elif resp is None or not getattr(resp, 'cgx_status', False):
+            # throttled, server error or timeout.
+            congested = True
+        else:
+            normal_latency = limiter['latency'].get(api_name)
+            congested = normal_latency is not None and latency > normal_latency * LIMIT_LATENCY_TOLERANCE
+            if normal_latency is None:
+                limiter['latency'][api_name] = latency
+            else:
+                limiter['latency'][api_name] = normal_latency + (latency - normal_latency) * LIMIT_LATENCY_SMOOTHING
+
+        if congested:
+            # only back off once for requests that were in flight together.
+            if start_time >= limiter['last_decrease']:
+                limiter['limit'] = max(float(LIMIT_MIN), limiter['limit'] * LIMIT_DECREASE_FACTOR)
+                limiter['last_decrease'] = time.time()
+                logger.info("API concurrency limit decreased to {0}.".format(int(limiter['limit'])))
+        elif limit_used and limiter['limit'] < limiter['max_limit']:
+            # grow about one request per round of requests, only while the current limit is actually in use.
+            limiter['limit'] = min(float(limiter['max_limit']), limiter['limit'] + 1.0 / limiter['limit'])
+
+        limiter['condition'].notify_all()
+
+
+def new_token_bucket(rate, burst=None):
+    """
+    Create a token bucket rate limit (see token_bucket_reserve()).
+    :param rate: requests per second.
+    :param burst: most requests allowed back to back after the bucket has been idle, default 1 second worth.
+    :return: token bucket dict
+    """
+    if burst is None:
+        burst = max(1.0, rate)
+    return {
+        "lock": threading.Lock(),
+        "rate": float(rate),
+        "burst": float(burst),
+        "tokens": float(burst),
+        "updated": time.monotonic()
+    }
+
+
+def token_bucket_reserve(bucket):
+    """
+    Take a token from a token bucket. If none are available, the token is reserved ahead of time, so waiting
+    callers are let through in order at the bucket rate.
+    :param bucket: token bucket dict (from new_token_bucket())
+    :return: seconds to wait before using the token (float).
+    """
+    with bucket['lock']:
+        now = time.monotonic()
+        bucket['tokens'] = min(bucket['burst'], bucket['tokens'] + (now - bucket['updated']) * bucket['rate'])
+        bucket['updated'] = now
+        bucket['tokens'] -= 1.0
+        return -bucket['tokens'] / bucket['rate'] if bucket['tokens'] < 0 else 0.0
+
+
+def new_rate_limits(all_rps=0, topology_rps=0, waninterfaces_rps=0, anynet_writes_rps=0):
+    """
+    Create the per API group rate limits used by retry_call(). 0 (or less) means no limit for that group.
+    :param all_rps: requests per second for all API requests combined.
+    :param topology_rps: requests per second for topology queries.
+    :param waninterfaces_rps: requests per second for Site WAN Interface reads/queries.
+    :param anynet_writes_rps: requests per second for VPN Mesh Link creates, updates and deletes.
+    :return: dict of rate limit group name to token bucket dict (or None for no limit).
+    """
+    return {
+        RATE_LIMIT_ALL: new_token_bucket(all_rps) if all_rps > 0 else None,
+        RATE_LIMIT_TOPOLOGY: new_token_bucket(topology_rps) if topology_rps > 0 else None,
+        RATE_LIMIT_WANINTERFACES: new_token_bucket(waninterfaces_rps) if waninterfaces_rps > 0 else None,
+        RATE_LIMIT_ANYNET_WRITES: new_token_bucket(anynet_writes_rps) if anynet_writes_rps > 0 else None
+    }
+
+
+def rate_limit_delay(rate_limits, rate_group=None):
+    """
+    Take tokens for a request from the tenant-wide rate limit and the rate limit of its API group.
+    :param rate_limits: rate limits dict (from new_rate_limits()), or None for no limits.
+    :param rate_group: Optional rate limit group of the request, ex. RATE_LIMIT_TOPOLOGY
+    :return: seconds to wait before making the request (float).
+    """
+    delay = 0.0
+    if not rate_limits:
+        return delay
+
+    for group in [RATE_LIMIT_ALL, rate_group]:
+        bucket = rate_limits.get(group) if group else None
+        if bucket:
+            delay = max(delay, token_bucket_reserve(bucket))
+
+    return delay
+
+
+def rate_limit_wait(rate_limits, rate_group=None):
+    """
+    Wait for the tenant-wide rate limit, and the rate limit of a request's API group.
+    :param rate_limits: rate limits dict (from new_rate_limits()), or None for no limits.
+    :param rate_group: Optional rate limit group of the request, ex. RATE_LIMIT_TOPOLOGY
+    :return: No return
+    """
+    delay = rate_limit_delay(rate_limits, rate_group)
+    if delay > 0:
+        time.sleep(delay)
+
+
+def new_hedge_policy(workers, budget=DEFAULT_HEDGE_BUDGET):
+    """
+    Create a hedging policy for read-only API requests (see hedged_call()).
+    :param workers: max API requests in flight at once, sizes the thread pool requests are made from.
+    :param budget: max hedges, as a fraction of hedge-able requests made (0.05 = at most 5% extra requests).
+    :return: hedge policy dict
+    """
+    return {
+        "lock": threading.Lock(),
+        # primaries and hedges both run here, so the caller can take whichever answers first. Only exists while
+        # discovery runs, see hedging().
+        "executor": None,
+        "executor_workers": 2 * max(1, workers),
+        "executor_users": 0,
+        "budget": max(0.0, budget),
+        "latency": {},              # API name -> deque of recent successful request latencies (seconds)
+        "requests": 0,
+        "hedges": 0,
+        "hedge_wins": 0
+    }
+
+
+@contextmanager
+def hedging(hedge_policy):
+    """
+    Context manager - start the hedge policy thread pool for a run of hedged_call()s, and shut it down after the
+    last user is done.
+    :param hedge_policy: hedge policy dict (from new_hedge_policy()), or None for no hedging.
+    :return: yields nothing
+    """
+    if hedge_policy is None:
+        yield
+        return
+
+    with hedge_policy['lock']:
+        if hedge_policy['executor'] is None:
+            hedge_policy['executor'] = ThreadPoolExecutor(max_workers=hedge_policy['executor_workers'])
+        hedge_policy['executor_users'] += 1
+
+    try:
+        yield
+    finally:
+        with hedge_policy['lock']:
+            hedge_policy['executor_users'] -= 1
+            if not hedge_policy['executor_users']:
+                # losing hedges still running finish in the background.
+                hedge_policy['executor'].shutdown(wait=False)
+                hedge_policy['executor'] = None
+
+
+def hedge_delay(hedge_policy, api_name):
+    """
+    Get how long to wait for a request before hedging it - the HEDGE_PERCENTILE latency of recent requests.
+    :param hedge_policy: hedge policy dict (from new_hedge_policy())
+    :param api_name: name of the API called.
+    :return: seconds (float), or None if there are not enough samples yet.
+    """
+    with hedge_policy['lock']:
+        samples = hedge_policy['latency'].get(api_name)
+        if not samples or len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        sorted_samples = sorted(samples)
+
+    return sorted_samples[int((len(sorted_samples) - 1) * HEDGE_PERCENTILE / 100)]
+
+
+def hedged_call(hedge_policy, api_name, attempt_func):
+    """
+    Make a read-only request, sending a duplicate if it is slower than usual and the hedge budget allows.
+    The first successful answer is returned, the other request is left to finish and thrown away.
+    :param hedge_policy: hedge policy dict (from new_hedge_policy())
+    :param api_name: name of the API called, latency is tracked per API.
+    :param attempt_func: function that makes the request and returns the SDK response, with an 'admitted'
+                         keyword arg - threading.Event to set once the request is let through its rate/concurrency
+                         limits (see limited_call()).
+    :return: SDK response - the first success, or the last failure if both failed.
+    """
+    executor = hedge_policy['executor']
+    if executor is None:
+        # not inside hedging(), nothing to hedge with.
+        return attempt_func(admitted=threading.Event())
+
+    delay = hedge_delay(hedge_policy, api_name)
+    admitted = threading.Event()
+
+    def attempt():
+        try:
+            return attempt_func(admitted=admitted)
+        finally:
+            admitted.set()
+
+    primary = executor.submit(attempt)
+    pending = set([primary])
+
+    with hedge_policy['lock']:
+        hedge_policy['requests'] += 1
+
+    # time the request from when it is let through, waiting for the limiter/rate limits is local queueing - a
+    # hedge would just add load while the limiter is backing off.
+    admitted.wait()
+    start_time = time.time()
+
+    if delay is not None:
+        done, _ = wait(pending, timeout=delay)
+        if not done:
+            with hedge_policy['lock']:
+                hedge = hedge_policy['hedges'] + 1 <= hedge_policy['budget'] * hedge_policy['requests']
+                if hedge:
+                    hedge_policy['hedges'] += 1
+            if hedge:
+                logger.debug("{0} request still running after {1:.1f}s, hedging.".format(api_name, delay))
+                pending.add(executor.submit(attempt_func, admitted=threading.Event()))
+
+    resp = None
+    error = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            try:
+                resp = future.result()
+            except Exception as e:
+                error = e
+                continue
+
+            if getattr(resp, 'cgx_status', False):
+                with hedge_policy['lock']:
+                    hedge_policy['latency'].setdefault(api_name, deque(maxlen=HEDGE_MAX_SAMPLES))\
+                        .append(time.time() - start_time)
+                    if future is not primary:
+                        hedge_policy['hedge_wins'] += 1
+                return resp
+
+    if resp is None and error is not None:
+        raise error
+
+    return resp
+
+
+def log_hedge_stats(hedge_policy):
+    """
+    Log how many requests were hedged, and how many hedges answered first.
+    :param hedge_policy: hedge policy dict, or None.
+    :return: No return
+    """
+    if not hedge_policy or not hedge_policy['requests']:
+        return
+
+    logger.info("Hedged {0} of {1} read requests, {2} hedges answered first."
+                "".format(hedge_policy['hedges'], hedge_policy['requests'], hedge_policy['hedge_wins']))
+
+
+def limited_call(call_func, args, kwargs, limiter=None, rate_limits=None, rate_group=None, api_name=None,
+                 admitted=None):
+    """
+    Make one SDK call, after waiting for its rate limits and a slot under the concurrency limit.
+    :param call_func: SDK function, ex. sdk_session.post.topology
+    :param args: list of positional args for call_func
+    :param kwargs: dict of keyword args for call_func
+    :param limiter: Optional concurrency limiter dict (from new_concurrency_limiter())
+    :param rate_limits: Optional rate limits dict (from new_rate_limits())
+    :param rate_group: Optional rate limit group of call_func, ex. RATE_LIMIT_TOPOLOGY
+    :param api_name: Optional name the limiter tracks latency under, default call_func name.
+    :param admitted: Optional threading.Event, set when the rate limits and limiter let the call through.
+    :return: SDK response
+    """
+    rate_limit_wait(rate_limits, rate_group)
+
+    if limiter is None:
+        if admitted is not None:
+            admitted.set()
+        return call_func(*args, **kwargs)
+
+    resp = None
+    start_time = limiter_acquire(limiter)
+    if admitted is not None:
+        admitted.set()
+    try:
+        resp = call_func(*args, **kwargs)
+    finally:
+        limiter_release(limiter, start_time, api_name or getattr(call_func, '__name__', None), resp)
+
+    return resp
+
+
+def retry_call(call_func, *args, retry_policy=None, description=None, limiter=None, rate_limits=None,
+               rate_group=None, hedge_policy=None, api_name=None, **kwargs):
+    """
+    Make an SDK call, retrying retryable failures according to a retry policy.
+    :param call_func: SDK function, ex. sdk_session.post.topology
+    :param args: positional args for call_func
+    :param retry_policy: retry policy dict (from new_retry_policy()), default policy if None.
+    :param description: Optional text for retry messages, ex. "topology for site ID 12345"
+    :param limiter: Optional concurrency limiter dict (from new_concurrency_limiter()) each attempt must go through.
+    :param rate_limits: Optional rate limits dict (from new_rate_limits()) each attempt takes a token from.
+    :param rate_group: Optional rate limit group of call_func, ex. RATE_LIMIT_TOPOLOGY
+    :param hedge_policy: Optional hedge policy dict (from new_hedge_policy()), read-only call_funcs only.
+    :param api_name: Optional name latency is tracked under (limiter and hedging), default call_func name. Calls
+                     with a different normal latency, ex. batched queries, need their own.
+    :param kwargs: keyword args for call_func
+    :return: last SDK response. Check resp.cgx_status for success.
+    """
+    if retry_policy is None:
+        retry_policy = new_retry_policy()
+
+    request_text = "API request for {0}".format(description) if description else "API request"
+    if api_name is None:
+        api_name = getattr(call_func, '__name__', None)
+
+    retry_number = 0
+    while True:
+        if hedge_policy is None:
+            resp = limited_call(call_func, args, kwargs, limiter=limiter, rate_limits=rate_limits,
+                                rate_group=rate_group, api_name=api_name)
+        else:
+            resp = hedged_call(hedge_policy, api_name,
+                               partial(limited_call, call_func, args, kwargs, limiter=limiter,
+                                       rate_limits=rate_limits, rate_group=rate_group, api_name=api_name))
+
+        delay = next_retry_delay(retry_policy, retry_number, resp, request_text)
+        if delay is None:
+            return resp
+
+        time.sleep(delay)
+        retry_number += 1
+
+
+def query_page(page, page_size=DEFAULT_PAGE_SIZE, query_params=None):
+    """
+    Build the request body for one page of a CloudGenix "query" API.
+    :param page: page number, from 1.
+    :param page_size: items to request per page.
+    :param query_params: dict of query_params to filter on, or None for all objects.
+    :return: query dict
+    """
+    return {
+        "query_params": query_params if query_params else {},
+        "limit": page_size,
+        "dest_page": page,
+        "total_count": True
+    }
+
+
+def new_paging_state():
+    """
+    Create the state used by check_query_page() across the pages of one paged query.
+    :return: paging state dict
+    """
+    return {
+        "page": 1,
+        "seen_count": 0,
+        "seen_ids": set()
+    }
+
+
+def check_query_page(paging, resp, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Check a response for one page of a paged query, and move the paging state on to the next page.
+    :param paging: paging state dict (from new_paging_state())
+    :param resp: SDK response for page paging['page']
+    :param page_size: items requested per page.
+    :return: tuple of status (bool), list of items for the page, Boolean True if this was the last page.
+    """
+    page = paging['page']
+
+    if not resp.cgx_status or not isinstance(resp.cgx_content, dict):
+        logger.info("Query page {0} failed.".format(page))
+        return False, [], True
+
+    items = resp.cgx_content.get('items', [])
+    total_count = resp.cgx_content.get('total_count')
+
+    # make sure paging is actually honored - a controller that ignores dest_page would repeat page 1 forever.
+    new_ids = set(item.get('id') for item in items) - paging['seen_ids']
+    if items and not new_ids:
+        logger.info("Query page {0} returned no new items, paging not supported.".format(page))
+        return False, [], True
+    paging['seen_ids'].update(new_ids)
+    paging['seen_count'] += len(items)
+    paging['page'] += 1
+
+    # last page (or the controller ignored the limit and sent everything).
+    last_page = len(items) != page_size or (total_count is not None and paging['seen_count'] >= total_count)
+
+    return True, items, last_page
+
+
+def paged_query(query_func, query_params=None, page_size=DEFAULT_PAGE_SIZE, retry_policy=None, limiter=None,
+                rate_limits=None, rate_group=None):
+    """
+    Generator - run a CloudGenix "query" API one page at a time, handing back each page as it arrives so callers
+    can index results without holding the whole result set.
+    :param query_func: SDK query function, ex. sdk_session.post.waninterfaces_query
+    :param query_params: dict of query_params to filter on, or None for all objects.
+    :param page_size: items to request per page.
+    :param retry_policy: retry policy dict for each page request, default policy if None.
+    :param limiter: Optional concurrency limiter dict for each page request.
+    :param rate_limits: Optional rate limits dict for each page request.
+    :param rate_group: Optional rate limit group of query_func.
+    :return: yields tuple of status (bool), list of items for the page. Stops after a failed (False) page.
+    """
+    paging = new_paging_state()
+
+    while True:
+        page = paging['page']
+        query = query_page(page, page_size, query_params)
+
+        resp = retry_call(query_func, query, retry_policy=retry_policy, description="query page {0}".format(page),
+                          limiter=limiter, rate_limits=rate_limits, rate_group=rate_group)
+        status, items, last_page = check_query_page(paging, resp, page_size)
+
+        yield status, items
+
+        if last_page:
+            return
+
+
+def query_all_pages(page_func, query_func, get_func, description=None, page_size=DEFAULT_PAGE_SIZE,
+                    retry_policy=None, rate_limits=None):
+    """
+    Hand every object of a type to page_func a page at a time, using the paged "query" API when the SDK and
+    controller support it, else one GET of the full list. If paging fails part way, the full list is used and
+    page_func sees some objects twice - it must be safe to call again with the same objects.
+    :param page_func: function called with each list of items.
+    :param query_func: SDK query function, ex. sdk_session.post.site_query, or None if this SDK does not have one.
+    :param get_func: SDK function to GET the full list, ex. sdk_session.get.sites
+    :param description: Optional text for messages, ex. "sites"
+    :param page_size: items to request per page.
+    :param retry_policy: retry policy dict for each request, default policy if None.
+    :param rate_limits: Optional rate limits dict for each request.
+    :return: Boolean, True if every object was handed to page_func.
+    """
+    if query_func is not None:
+        for status, items in paged_query(query_func, page_size=page_size, retry_policy=retry_policy,
+                                         rate_limits=rate_limits):
+            if not status:
+                logger.info("Paged query for {0} failed, loading the full list.".format(description))
+                break
+            page_func(items)
+        else:
+            return True
+
+    resp = retry_call(get_func, retry_policy=retry_policy, description=description, rate_limits=rate_limits)
+    if not resp.cgx_status or not isinstance(resp.cgx_content, dict):
+        return False
+
+    page_func(resp.cgx_content.get('items', []))
+    return True
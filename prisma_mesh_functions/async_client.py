@@ -0,0 +1,348 @@
+#!/usr/bin/env python
+"""
+asyncio API client for the CloudGenix endpoints this tool uses, sharing the login, retry policy, concurrency
+limiter and rate limits of the SDK session. Optional - needs the 'aiohttp' module.
+
+"""
+import asyncio
+import inspect
+import json
+import logging
+import time
+from types import SimpleNamespace
+from .api_utils import limiter_try_acquire, limiter_release, rate_limit_delay, next_retry_delay, new_retry_policy, \
+    query_page, new_paging_state, check_query_page, DEFAULT_PAGE_SIZE
+from .transport import endpoint_timeout, DEFAULT_CONNECT_TIMEOUT, POOL_HEADROOM
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Set NON-SYSLOG logging to use function name
+logger = logging.getLogger(__name__)
+
+# API name -> (SDK function the threaded path calls, API version if the SDK does not say, path under
+# /api/tenants/{tenant_id}/). The API version is the default of the installed SDK function, so both paths use the
+# same API versions. The tenant-wide WAN interface query has no SDK function in SDK 6.x, its version is fixed.
+API_ENDPOINTS = {
+    "sites": ("get.sites", "v4.13", "sites"),
+    "wannetworks": ("get.wannetworks", "v2.1", "wannetworks"),
+    "servicebindingmaps": ("get.servicebindingmaps", "v2.1", "servicebindingmaps"),
+    "topology": ("post.topology", "v3.6", "topology"),
+    "waninterfaces": ("get.waninterfaces", "v2.10", "sites/{0}/waninterfaces"),
+    "waninterfaces_query": (None, "v2.5", "waninterfaces/query"),
+    "tenant_anynetlinks": ("post.tenant_anynetlinks", "v4.0", "anynetlinks"),
+    "tenant_anynetlink": ("put.tenant_anynetlinks", "v4.0", "anynetlinks/{0}")
+}
+# same success codes as the SDK rest_call().
+SUCCESS_STATUS_CODES = [200, 204, 301, 302]
+# how often a request waiting on the concurrency limiter re-checks it, for slots freed outside this event loop.
+LIMITER_POLL_SECONDS = 0.5
+# request headers not copied from the SDK session, aiohttp manages these itself.
+SKIP_SESSION_HEADERS = ['connection', 'content-length', 'host']
+
+
+async def open_client(sdk_session, sdk_vars):
+    """
+    Open an asyncio API client using the login of an SDK session. Must be called from a running event loop.
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :param sdk_vars: sdk_vars global info struct ('workers', 'api_limiter', 'rate_limits', 'retry_policy')
+    :return: client dict
+    """
+    session = sdk_session.expose_session()
+
+    # same certificate checks as the SDK.
+    ssl_option = getattr(sdk_session, '_ca_ssl_context', None)
+    if not session.verify:
+        ssl_option = False
+    elif ssl_option is None:
+        ssl_option = True
+
+    headers = {key: value for key, value in session.headers.items() if key.lower() not in SKIP_SESSION_HEADERS}
+    cookies = session.cookies.get_dict()
+    if cookies:
+        # send login cookies with every request, whatever the controller hostname looks like.
+        headers['Cookie'] = "; ".join("{0}={1}".format(key, value) for key, value in cookies.items())
+
+    workers = max(1, sdk_vars.get('workers', 1))
+    connector = aiohttp.TCPConnector(limit=workers + POOL_HEADROOM, ssl=ssl_option)
+
+    return {
+        "http": aiohttp.ClientSession(connector=connector, headers=headers,
+                                      cookie_jar=aiohttp.DummyCookieJar()),
+        "controller": sdk_session.controller,
+        "tenant_id": sdk_session.tenant_id,
+        "api_versions": {api_name: sdk_api_version(sdk_session, api_name) for api_name in API_ENDPOINTS},
+        "timeout": getattr(sdk_session, 'rest_call_timeout', None),
+        "retry_policy": sdk_vars.get('retry_policy'),
+        "limiter": sdk_vars.get('api_limiter'),
+        "limiter_condition": asyncio.Condition(),
+        "rate_limits": sdk_vars.get('rate_limits')
+    }
+
+
+async def close_client(client):
+    """
+    Close an asyncio API client and its connections.
+    :param client: client dict (from open_client())
+    :return: No return
+    """
+    await client['http'].close()
+
+
+def sdk_api_version(sdk_session, api_name):
+    """
+    Get the API version the installed SDK uses for an API - the default api_version of its SDK function.
+    :param sdk_session: CloudGenix SDK Session.
+    :param api_name: API_ENDPOINTS key
+    :return: API version text, ex. 'v3.6'
+    """
+    sdk_function_name, api_version, _ = API_ENDPOINTS[api_name]
+    if sdk_function_name is None:
+        return api_version
+
+    namespace, function_name = sdk_function_name.split(".")
+    sdk_function = getattr(getattr(sdk_session, namespace, None), function_name, None)
+    if sdk_function is None:
+        return api_version
+
+    try:
+        parameter = inspect.signature(sdk_function).parameters.get('api_version')
+    except (TypeError, ValueError):
+        return api_version
+
+    if parameter is None or not isinstance(parameter.default, str):
+        return api_version
+
+    return parameter.default
+
+
+def build_api_url(controller, tenant_id, api_version, api_name, *path_args):
+    """
+    Build the URL of a tenant API, the same way the SDK does.
+    :param controller: controller URL, ex. sdk_session.controller
+    :param tenant_id: tenant ID
+    :param api_version: API version text, ex. from sdk_api_version()
+    :param api_name: API_ENDPOINTS key
+    :param path_args: IDs for the API path, ex. site ID for 'waninterfaces'
+    :return: URL text
+    """
+    path = API_ENDPOINTS[api_name][2]
+    return "{0}/{1}/api/tenants/{2}/{3}".format(controller, api_version, tenant_id, path.format(*path_args))
+
+
+def tenant_api_url(sdk_session, api_name, *path_args):
+    """
+    Build the URL of a tenant API for an SDK session, with the API version its SDK uses.
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :param api_name: API_ENDPOINTS key
+    :param path_args: IDs for the API path, ex. site ID for 'waninterfaces'
+    :return: URL text
+    """
+    return build_api_url(sdk_session.controller, sdk_session.tenant_id, sdk_api_version(sdk_session, api_name),
+                         api_name, *path_args)
+
+
+def api_url(client, api_name, *path_args):
+    """
+    Build the URL of a tenant API for a client.
+    :param client: client dict
+    :param api_name: API_ENDPOINTS key
+    :param path_args: IDs for the API path, ex. site ID for 'waninterfaces'
+    :return: URL text
+    """
+    return build_api_url(client['controller'], client['tenant_id'], client['api_versions'][api_name], api_name,
+                         *path_args)
+
+
+def new_response(cgx_status, cgx_content, status_code=None, headers=None):
+    """
+    Create a response with the attributes of an SDK response that this tool reads.
+    :param cgx_status: Boolean, True if a successful CloudGenix response.
+    :param cgx_content: response content dict
+    :param status_code: HTTP status, None if no response was received.
+    :param headers: response headers
+    :return: response object
+    """
+    return SimpleNamespace(cgx_status=cgx_status, cgx_content=cgx_content, status_code=status_code,
+                           headers=headers if headers is not None else {})
+
+
+def response_content(text):
+    """
+    Decode a response body, the same way the SDK does for empty or non-JSON responses.
+    :param text: response body text
+    :return: content dict
+    """
+    if not text:
+        return {}
+
+    try:
+        return json.loads(text)
+    except ValueError:
+        return {
+            '_error': [
+                {
+                    'message': 'Response not in JSON format.',
+                    'data': {'raw': text}
+                }
+            ]
+        }
+
+
+async def api_request(client, method, url, data=None):
+    """
+    Make one API request. Read timeouts are per endpoint, see transport.DEFAULT_ENDPOINT_TIMEOUTS.
+    :param client: client dict
+    :param method: HTTP method
+    :param url: API URL
+    :param data: Optional dict/list to send as JSON
+    :return: response object (see new_response())
+    """
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=DEFAULT_CONNECT_TIMEOUT,
+                                    sock_read=endpoint_timeout(url, default=client['timeout']))
+    headers = None
+    if data is not None:
+        data = json.dumps(data)
+        headers = {'Content-Type': 'application/json'}
+
+    try:
+        async with client['http'].request(method, url, data=data, headers=headers, timeout=timeout,
+                                          allow_redirects=False) as response:
+            text = await response.text()
+            status_code = response.status
+            response_headers = response.headers
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        # timeouts have no message text.
+        error_text = str(e) or type(e).__name__
+        logger.info("Error, {0}.".format(error_text))
+        return new_response(False, {
+            '_error': [
+                {
+                    'message': 'REST Request Exception: {0}'.format(error_text),
+                    'data': {}
+                }
+            ]
+        })
+
+    return new_response(status_code in SUCCESS_STATUS_CODES, response_content(text), status_code,
+                        response_headers)
+
+
+# one request function per API used, named for the SDK call they stand in for.
+async def post_topology(client, data):
+    return await api_request(client, "post", api_url(client, "topology"), data=data)
+
+
+async def get_waninterfaces(client, site_id):
+    return await api_request(client, "get", api_url(client, "waninterfaces", site_id))
+
+
+async def post_waninterfaces_query(client, data):
+    return await api_request(client, "post", api_url(client, "waninterfaces_query"), data=data)
+
+
+async def post_tenant_anynetlinks(client, data):
+    return await api_request(client, "post", api_url(client, "tenant_anynetlinks"), data=data)
+
+
+async def put_tenant_anynetlinks(client, anynet_id, data):
+    return await api_request(client, "put", api_url(client, "tenant_anynetlink", anynet_id), data=data)
+
+
+async def delete_tenant_anynetlinks(client, anynet_id):
+    return await api_request(client, "delete", api_url(client, "tenant_anynetlink", anynet_id))
+
+
+async def limited_request(client, request_func, args, rate_group=None, api_name=None):
+    """
+    Make one request, after waiting for its rate limits and a slot under the concurrency limiter (both shared
+    with the SDK session threads, see api_utils.limited_call()).
+    :param client: client dict
+    :param request_func: request coroutine function of this module, ex. post_topology
+    :param args: list of args for request_func, after client.
+    :param rate_group: Optional rate limit group of request_func, ex. RATE_LIMIT_TOPOLOGY
+    :param api_name: Optional name the limiter tracks latency under, default request_func name.
+    :return: response object
+    """
+    delay = rate_limit_delay(client['rate_limits'], rate_group)
+    if delay > 0:
+        await asyncio.sleep(delay)
+
+    limiter = client['limiter']
+    if limiter is None:
+        return await request_func(client, *args)
+
+    condition = client['limiter_condition']
+    async with condition:
+        while not limiter_try_acquire(limiter):
+            try:
+                await asyncio.wait_for(condition.wait(), LIMITER_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+
+    resp = None
+    start_time = time.time()
+    try:
+        resp = await request_func(client, *args)
+    finally:
+        limiter_release(limiter, start_time, api_name or request_func.__name__, resp)
+        async with condition:
+            condition.notify_all()
+
+    return resp
+
+
+async def retry_request(client, request_func, *args, retry_policy=None, description=None, rate_group=None,
+                        api_name=None):
+    """
+    Make a request, retrying retryable failures the same way api_utils.retry_call() does.
+    :param client: client dict
+    :param request_func: request coroutine function of this module, ex. post_topology
+    :param args: args for request_func, after client.
+    :param retry_policy: retry policy dict, default client['retry_policy'].
+    :param description: Optional text for retry messages, ex. "topology for site ID 12345"
+    :param rate_group: Optional rate limit group of request_func, ex. RATE_LIMIT_TOPOLOGY
+    :param api_name: Optional name the limiter tracks latency under, default request_func name.
+    :return: last response object. Check resp.cgx_status for success.
+    """
+    if retry_policy is None:
+        retry_policy = client['retry_policy'] or new_retry_policy()
+
+    request_text = "API request for {0}".format(description) if description else "API request"
+
+    retry_number = 0
+    while True:
+        resp = await limited_request(client, request_func, args, rate_group=rate_group, api_name=api_name)
+
+        delay = next_retry_delay(retry_policy, retry_number, resp, request_text)
+        if delay is None:
+            return resp
+
+        await asyncio.sleep(delay)
+        retry_number += 1
+
+
+async def paged_query(client, request_func, query_params=None, page_size=DEFAULT_PAGE_SIZE, rate_group=None):
+    """
+    Async generator - run a "query" API one page at a time, see api_utils.paged_query().
+    :param client: client dict
+    :param request_func: query request coroutine function of this module, ex. post_waninterfaces_query
+    :param query_params: dict of query_params to filter on, or None for all objects.
+    :param page_size: items to request per page.
+    :param rate_group: Optional rate limit group of request_func.
+    :return: yields tuple of status (bool), list of items for the page. Stops after a failed (False) page.
+    """
+    paging = new_paging_state()
+
+    while True:
+        page = paging['page']
+        resp = await retry_request(client, request_func, query_page(page, page_size, query_params),
+                                   description="query page {0}".format(page), rate_group=rate_group)
+        status, items, last_page = check_query_page(paging, resp, page_size)
+
+        yield status, items
+
+        if last_page:
+            return
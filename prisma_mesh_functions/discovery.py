@@ -0,0 +1,1321 @@
+#!/usr/bin/env python
+"""
+VPN topology / Site WAN Interface discovery
+
+"""
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+from functools import partial
+from progressbar import Bar, ETA, Percentage, ProgressBar
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .api_utils import new_retry_policy, paged_query, retry_call, log_hedge_stats, bind_retry_notices, hedging, \
+    RATE_LIMIT_TOPOLOGY, RATE_LIMIT_WANINTERFACES
+from .interning import anynet_pair_key
+from . import async_client
+
+# Set NON-SYSLOG logging to use function name
+logger = logging.getLogger(__name__)
+
+# default max API requests in flight at the same time. The actual number adapts below this, see api_utils.
+DEFAULT_WORKERS = 16
+# batched topology queries - starting nodes per query, and the per-query time we try to stay under.
+BATCH_START_SIZE = 8
+BATCH_TARGET_SECONDS = 10
+# the tenant-wide Site WAN Interface query pages through every SWI in the tenant, one page after another. Only used
+# when the sites needed are at least this share of the tenant, otherwise one GET per site is fewer/faster requests.
+BULK_SWI_MIN_SHARE = 0.25
+# topology link types kept in the snapshot. 'anynet' is pre public/private split.
+ANYNET_TYPE_PUB = "public-anynet"
+ANYNET_TYPE_PRIV = "private-anynet"
+ANYNET_TYPE_GENERIC = "anynet"
+ANYNET_TYPES = [ANYNET_TYPE_PUB, ANYNET_TYPE_PRIV, ANYNET_TYPE_GENERIC]
+# anynet link fields kept from topology responses - everything the VPN/anynet calculations, CSV and scripts read.
+ANYNET_LINK_FIELDS = ['type', 'path_id', 'source_wan_if_id', 'target_wan_if_id', 'status', 'sub_type', 'admin_up']
+# status of links listed from the tenant link inventory. It is config only, operational status is in topology.
+INVENTORY_LINK_STATUS = "unknown"
+# on-disk topology snapshot cache. Bump the format version if the snapshot dict layout changes.
+TOPOLOGY_CACHE_VERSION = 2
+DEFAULT_CACHE_MAX_AGE = 0           # seconds, 0 = off. Cached link status can be this old, so it is opt-in.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".prisma_configure_mesh")
+
+
+def project_topology(topology):
+    """
+    Cut a topology query response down to just the anynet links, and just the fields of those links that are
+    used. Other link types (stubs, servicelinks, etc.) and nodes are dropped, so the (possibly huge) response can be
+    freed as soon as it is read.
+    :param topology: topology query response
+    :return: topology dict with only a 'links' list of projected anynet links.
+    """
+    links = []
+
+    for link in topology.get('links', []):
+        if link.get('type', "") not in ANYNET_TYPES:
+            continue
+
+        projected_link = {}
+        for field in ANYNET_LINK_FIELDS:
+            if field in link:
+                projected_link[field] = link[field]
+
+        # 4.3.x compatibility
+        if not projected_link.get('source_wan_if_id') and link.get('source_wan_path_id'):
+            projected_link['source_wan_if_id'] = link['source_wan_path_id']
+        if not projected_link.get('target_wan_if_id') and link.get('target_wan_path_id'):
+            projected_link['target_wan_if_id'] = link['target_wan_path_id']
+
+        links.append(projected_link)
+
+    return {
+        "links": links
+    }
+
+
+def query_site_topology(site, sdk_vars, sdk_session):
+    """
+    Query the VPN topology for a single site.
+    :param site: Site ID
+    :param sdk_vars: sdk_vars global info struct
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :return: topology dict, or False if the site could not be queried.
+    """
+    resp = retry_call(sdk_session.post.topology, site_topology_query(site),
+                      retry_policy=sdk_vars.get('retry_policy'), description="topology for site ID {0}".format(site),
+                      limiter=sdk_vars.get('api_limiter'), rate_limits=sdk_vars.get('rate_limits'),
+                      rate_group=RATE_LIMIT_TOPOLOGY, hedge_policy=sdk_vars.get('hedge_policy'))
+
+    return site_topology_result(site, resp)
+
+
+def site_topology_query(site):
+    """
+    Build the topology query for a single site.
+    :param site: Site ID
+    :return: query dict
+    """
+    return {
+        "type": "basenet",
+        "nodes": [
+            site
+        ]
+    }
+
+
+def site_topology_result(site, resp):
+    """
+    Get the topology from a single site topology query response.
+    :param site: Site ID
+    :param resp: topology query response
+    :return: topology dict, or False if the query failed.
+    """
+    if not resp.cgx_status:
+        print("ERROR: could not query site ID {0}. Continuing.".format(site))
+        return False
+
+    topology = resp.cgx_content
+    if topology:
+        topology = project_topology(topology)
+
+    return topology
+
+
+def query_site_waninterfaces(site, sdk_vars, sdk_session):
+    """
+    Query the Site WAN Interfaces for a single site.
+    :param site: Site ID
+    :param sdk_vars: sdk_vars global info struct
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :return: list of Site WAN Interface items, or None if the site could not be queried.
+    """
+    resp = retry_call(sdk_session.get.waninterfaces, site, retry_policy=sdk_vars.get('retry_policy'),
+                      description="Site WAN Interfaces for site ID {0}".format(site),
+                      limiter=sdk_vars.get('api_limiter'),
+                      rate_limits=sdk_vars.get('rate_limits'), rate_group=RATE_LIMIT_WANINTERFACES,
+                      hedge_policy=sdk_vars.get('hedge_policy'))
+
+    return site_waninterfaces_result(site, resp)
+
+
+def site_waninterfaces_result(site, resp):
+    """
+    Get the Site WAN Interface items from a single site Site WAN Interface response.
+    :param site: Site ID
+    :param resp: Site WAN Interface response
+    :return: list of Site WAN Interface items, or None if the query failed.
+    """
+    if not resp.cgx_status:
+        print("ERROR: could not query Site WAN Interfaces for site ID {0}. Continuing.".format(site))
+        return None
+
+    site_wan_if_result = resp.cgx_content
+    if not site_wan_if_result:
+        return []
+
+    site_wan_if_items = site_wan_if_result.get('items', [])
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug('SITE WAN IF ITEMS ({0}): {1}'.format(len(site_wan_if_items),
+                                                           json.dumps(site_wan_if_items, indent=4)))
+    return site_wan_if_items
+
+
+def query_topology_batch(site_batch, sdk_vars, sdk_session):
+    """
+    Query the VPN topology for a batch of sites with a single request.
+    :param site_batch: list of Site IDs
+    :param sdk_vars: sdk_vars global info struct
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :return: tuple of topology dict (or False if the request failed), seconds the request took.
+    """
+    if len(site_batch) == 1:
+        # single site - use the normal per-site retry logic.
+        start_time = time.time()
+        topology = query_site_topology(site_batch[0], sdk_vars, sdk_session)
+        return topology, time.time() - start_time
+
+    # no retries, a failed batch is split instead.
+    start_time = time.time()
+    resp = retry_call(sdk_session.post.topology, batch_topology_query(site_batch),
+                      retry_policy=new_retry_policy(max_retries=0), limiter=sdk_vars.get('api_limiter'),
+                      rate_limits=sdk_vars.get('rate_limits'), rate_group=RATE_LIMIT_TOPOLOGY,
+                      api_name=batch_api_name(site_batch))
+
+    return batch_topology_result(site_batch, resp, time.time() - start_time)
+
+
+def batch_api_name(site_batch):
+    """
+    Get the name the concurrency limiter tracks batch topology query latency under. Bigger batches take longer
+    normally, so each batch size has its own - otherwise a batch after single site queries reads as congestion.
+    :param site_batch: list of Site IDs
+    :return: API name text
+    """
+    return "topology_batch_{0}".format(len(site_batch))
+
+
+def batch_topology_query(site_batch):
+    """
+    Build the topology query for a batch of sites.
+    :param site_batch: list of Site IDs
+    :return: query dict
+    """
+    return {
+        "type": "basenet",
+        "nodes": list(site_batch)
+    }
+
+
+def batch_topology_result(site_batch, resp, elapsed):
+    """
+    Get the topology from a batch topology query response.
+    :param site_batch: list of Site IDs
+    :param resp: topology query response
+    :param elapsed: seconds the request took
+    :return: tuple of topology dict (or False if the request failed), seconds the request took.
+    """
+    if not resp.cgx_status or not resp.cgx_content:
+        logger.info("Topology query for {0} sites failed/timed out after {1:.1f}s, splitting."
+                    "".format(len(site_batch), elapsed))
+        return False, elapsed
+
+    return project_topology(resp.cgx_content), elapsed
+
+
+def tenant_waninterfaces_query(sdk_session, data):
+    """
+    Run the tenant-wide Site WAN Interface query. SDK 6.x post.waninterfaces_query() is per site, so this one is
+    called by URL (built the same way the SDK builds it).
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :param data: query dict
+    :return: SDK response
+    """
+    url = async_client.tenant_api_url(sdk_session, "waninterfaces_query")
+    return sdk_session.rest_call(url, "post", data=data)
+
+
+def use_bulk_swi(site_count, sdk_vars):
+    """
+    Decide if Site WAN Interfaces for a number of sites should come from the tenant-wide query.
+    :param site_count: number of sites that need Site WAN Interfaces
+    :param sdk_vars: sdk_vars global info struct ('bulk_swi', 'tenant_site_count')
+    :return: Boolean
+    """
+    if not sdk_vars.get('bulk_swi', False) or not site_count:
+        return False
+
+    tenant_site_count = sdk_vars.get('tenant_site_count')
+    if not tenant_site_count:
+        # tenant size not known, can't tell.
+        return True
+
+    return site_count >= tenant_site_count * BULK_SWI_MIN_SHARE
+
+
+def query_all_waninterfaces(site_id_list, sdk_vars, sdk_session):
+    """
+    Query Site WAN Interfaces for the whole tenant with the paged WAN interface query API, instead of one GET per
+    site. Pages are indexed as they arrive, keeping only the fields discovery uses.
+    :param site_id_list: list of site IDs to keep Site WAN Interfaces for
+    :param sdk_vars: sdk_vars global info struct
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :return: dict of site ID to list of Site WAN Interface items, or None if the controller does not support
+             the query (caller should fall back to per-site queries).
+    """
+    if not hasattr(sdk_session, 'rest_call'):
+        return None
+    query_func = partial(tenant_waninterfaces_query, sdk_session)
+
+    wanted_sites = set(site_id_list)
+    site_wan_if_dict = {}
+    swi_count = 0
+
+    for status, items in paged_query(query_func, retry_policy=sdk_vars.get('retry_policy'),
+                                     limiter=sdk_vars.get('api_limiter'), rate_limits=sdk_vars.get('rate_limits'),
+                                     rate_group=RATE_LIMIT_WANINTERFACES):
+        if not status or not index_waninterfaces_page(site_wan_if_dict, items, wanted_sites):
+            return None
+        swi_count += len(items)
+
+    logger.info("Loaded {0} Site WAN Interfaces with tenant-wide query.".format(swi_count))
+    return site_wan_if_dict
+
+
+def index_waninterfaces_page(site_wan_if_dict, items, wanted_sites):
+    """
+    Add a page of tenant-wide Site WAN Interface query results to a site ID index, keeping only the fields
+    discovery uses.
+    :param site_wan_if_dict: dict of site ID to list of Site WAN Interface items, updated in place.
+    :param items: Site WAN Interface items from the page
+    :param wanted_sites: set of site IDs to keep Site WAN Interfaces for
+    :return: Boolean, False if the results can't be used (caller should fall back to per-site queries).
+    """
+    for current_swi in items:
+        site_id = current_swi.get('site_id')
+        if not site_id:
+            # query results do not say which site they belong to, can't use them.
+            logger.info("Site WAN Interface query results missing site_id, using per-site queries.")
+            return False
+        if site_id in wanted_sites:
+            site_wan_if_dict.setdefault(site_id, []).append({
+                'id': current_swi.get('id'),
+                'network_id': current_swi.get('network_id')
+            })
+
+    return True
+
+
+async def async_query_site_topology(site, client):
+    """
+    Query the VPN topology for a single site (asyncio client).
+    :param site: Site ID
+    :param client: async_client client dict
+    :return: topology dict, or False if the site could not be queried.
+    """
+    resp = await async_client.retry_request(client, async_client.post_topology, site_topology_query(site),
+                                            description="topology for site ID {0}".format(site),
+                                            rate_group=RATE_LIMIT_TOPOLOGY)
+    return site_topology_result(site, resp)
+
+
+async def async_query_site_waninterfaces(site, client):
+    """
+    Query the Site WAN Interfaces for a single site (asyncio client).
+    :param site: Site ID
+    :param client: async_client client dict
+    :return: list of Site WAN Interface items, or None if the site could not be queried.
+    """
+    resp = await async_client.retry_request(client, async_client.get_waninterfaces, site,
+                                            description="Site WAN Interfaces for site ID {0}".format(site),
+                                            rate_group=RATE_LIMIT_WANINTERFACES)
+    return site_waninterfaces_result(site, resp)
+
+
+async def async_query_topology_batch(site_batch, client):
+    """
+    Query the VPN topology for a batch of sites with a single request (asyncio client).
+    :param site_batch: list of Site IDs
+    :param client: async_client client dict
+    :return: tuple of topology dict (or False if the request failed), seconds the request took.
+    """
+    start_time = time.time()
+    if len(site_batch) == 1:
+        # single site - use the normal per-site retry logic.
+        topology = await async_query_site_topology(site_batch[0], client)
+        return topology, time.time() - start_time
+
+    # no retries, a failed batch is split instead.
+    resp = await async_client.retry_request(client, async_client.post_topology, batch_topology_query(site_batch),
+                                            retry_policy=new_retry_policy(max_retries=0),
+                                            rate_group=RATE_LIMIT_TOPOLOGY, api_name=batch_api_name(site_batch))
+
+    return batch_topology_result(site_batch, resp, time.time() - start_time)
+
+
+async def async_query_all_waninterfaces(site_id_list, client):
+    """
+    Query Site WAN Interfaces for the whole tenant with the paged WAN interface query API (asyncio client).
+    :param site_id_list: list of site IDs to keep Site WAN Interfaces for
+    :param client: async_client client dict
+    :return: dict of site ID to list of Site WAN Interface items, or None if the controller does not support
+             the query (caller should fall back to per-site queries).
+    """
+    wanted_sites = set(site_id_list)
+    site_wan_if_dict = {}
+    swi_count = 0
+
+    async for status, items in async_client.paged_query(client, async_client.post_waninterfaces_query,
+                                                        rate_group=RATE_LIMIT_WANINTERFACES):
+        if not status or not index_waninterfaces_page(site_wan_if_dict, items, wanted_sites):
+            return None
+        swi_count += len(items)
+
+    logger.info("Loaded {0} Site WAN Interfaces with tenant-wide query.".format(swi_count))
+    return site_wan_if_dict
+
+
+# discover_sites() query kinds, for threads and for the asyncio client.
+DISCOVERY_QUERIES = {
+    'topology': query_topology_batch,
+    'swi': query_site_waninterfaces,
+    'bulk_swi': query_all_waninterfaces
+}
+ASYNC_DISCOVERY_QUERIES = {
+    'topology': async_query_topology_batch,
+    'swi': async_query_site_waninterfaces,
+    'bulk_swi': async_query_all_waninterfaces
+}
+
+
+@contextmanager
+def thread_discovery_executor(workers, sdk_vars, sdk_session):
+    """
+    Context manager - run discover_sites() queries on a pool of threads.
+    :param workers: number of threads
+    :param sdk_vars: sdk_vars global info struct
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :return: yields tuple of submit function (query kind, first arg) -> future, and wait function
+             (futures) -> set of done futures (at least one).
+    """
+    # hedge threads are only kept while discovery runs (and outlast the query threads that use them).
+    with hedging(sdk_vars.get('hedge_policy')), ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit(kind, arg):
+            # background (quiet) loads stay quiet in the pool threads too.
+            return executor.submit(bind_retry_notices(DISCOVERY_QUERIES[kind]), arg, sdk_vars, sdk_session)
+
+        def wait_first(futures):
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            return done
+
+        yield submit, wait_first
+
+
+@contextmanager
+def async_discovery_executor(sdk_vars, sdk_session):
+    """
+    Context manager - run discover_sites() queries as tasks on an asyncio event loop in this thread. The loop only
+    runs while discover_sites() waits for results.
+    :param sdk_vars: sdk_vars global info struct
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :return: yields tuple of submit function (query kind, first arg) -> task, and wait function
+             (tasks) -> set of done tasks (at least one).
+    """
+    loop = asyncio.new_event_loop()
+    client = loop.run_until_complete(async_client.open_client(sdk_session, sdk_vars))
+
+    def submit(kind, arg):
+        return loop.create_task(ASYNC_DISCOVERY_QUERIES[kind](arg, client))
+
+    def wait_first(tasks):
+        done, _ = loop.run_until_complete(asyncio.wait(list(tasks), return_when=asyncio.FIRST_COMPLETED))
+        return done
+
+    try:
+        yield submit, wait_first
+    finally:
+        # cancel anything left if discovery was stopped early.
+        pending = [x for x in asyncio.all_tasks(loop) if not x.done()]
+        for task in pending:
+            task.cancel()
+        if pending:
+            loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+        loop.run_until_complete(async_client.close_client(client))
+        loop.close()
+
+
+def discover_sites(site_id_list, sdk_vars, sdk_session, pbar=None, topology_site_ids=None, swi_site_ids=None,
+                   cancel=None):
+    """
+    Generator - query topology and Site WAN Interfaces for many sites at once using a bounded pool of workers.
+    The number of requests actually in flight is further limited by sdk_vars['api_limiter'], if set.
+    Results are yielded in site_id_list order, as soon as each site (and all sites before it) are done, so
+    merging results is deterministic regardless of which worker finished first.
+
+    With sdk_vars['topology_batch'] > 1, many site IDs are packed into each topology query. The batch size tunes
+    itself between 1 and that value: it doubles while queries finish well under BATCH_TARGET_SECONDS, and halves
+    when a query is slow. A failed/timed out batch is split in two and re-queued, down to single sites (which
+    use the normal per-site retry logic). The full topology of a batch is yielded with the first site of that
+    batch, other sites get None - links seen in more than one batch are de-duplicated by the caller using the
+    sorted SWI anynet lookup key.
+
+    With sdk_vars['bulk_swi'] set, Site WAN Interfaces for all sites come from one paged tenant-wide query when
+    they are a large enough share of the tenant (see use_bulk_swi()), falling back to one GET per site if the
+    controller does not support it.
+
+    With sdk_vars['async_api'] set, queries run as asyncio tasks on this thread instead of on a thread pool, so
+    sdk_vars['workers'] can be in the thousands. Hedging (sdk_vars['hedge_policy']) is thread pool only.
+    :param site_id_list: list of site IDs to query
+    :param sdk_vars: sdk_vars global info struct ('workers', 'topology_batch', 'bulk_swi', 'tenant_site_count',
+                     'async_api')
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :param pbar: Optional started ProgressBar with max_value of len(site_id_list) + 1.
+    :param topology_site_ids: Optional set of site IDs to query topology for (default all in site_id_list).
+    :param swi_site_ids: Optional set of site IDs to query Site WAN Interfaces for (default all in site_id_list).
+    :param cancel: Optional threading.Event - once set, no more queries are started and sites not yet yielded are
+                   dropped (queries already in flight still finish).
+    :return: yields tuple of site ID, topology (None if returned with an earlier site or not queried, False on
+             failure), list of Site WAN Interface items (None if not queried or failed).
+    """
+    workers = max(1, sdk_vars.get('workers', DEFAULT_WORKERS))
+    batch_max = max(1, sdk_vars.get('topology_batch', 0))
+    batch_size = min(BATCH_START_SIZE, batch_max)
+
+    # site indexes waiting for a query, kept in site_id_list order. Sites not needing a query are pre-finished.
+    topology_queue = []
+    swi_needed = []
+    topology_finished = {}
+    swi_finished = {}
+    for index, site in enumerate(site_id_list):
+        if topology_site_ids is None or site in topology_site_ids:
+            topology_queue.append(index)
+        else:
+            topology_finished[index] = None
+        if swi_site_ids is None or site in swi_site_ids:
+            swi_needed.append(index)
+        else:
+            swi_finished[index] = None
+    swi_queue = []
+    topology_site_count = len(topology_queue)
+    in_flight = {}
+    next_index = 0
+    site_processed = 1
+    topology_requests = 0
+
+    if sdk_vars.get('async_api', False):
+        executor = async_discovery_executor(sdk_vars, sdk_session)
+    else:
+        executor = thread_discovery_executor(workers, sdk_vars, sdk_session)
+
+    with executor as (submit, wait_first):
+
+        if use_bulk_swi(len(swi_needed), sdk_vars):
+            future = submit('bulk_swi', [site_id_list[x] for x in swi_needed])
+            in_flight[future] = ('bulk_swi', [])
+        else:
+            swi_queue = list(swi_needed)
+
+        while topology_queue or swi_queue or in_flight:
+
+            if cancel is not None and cancel.is_set():
+                logger.info("Topology load cancelled, {0} of {1} sites not loaded.".format(
+                    len(site_id_list) - next_index, len(site_id_list)))
+                break
+
+            # keep the pool full, topology first since it is the long pole.
+            while len(in_flight) < workers and (topology_queue or swi_queue):
+                if topology_queue:
+                    batch = topology_queue[:batch_size]
+                    del topology_queue[:batch_size]
+                    future = submit('topology', [site_id_list[x] for x in batch])
+                    in_flight[future] = ('topology', batch)
+                    topology_requests += 1
+                else:
+                    index = swi_queue.pop(0)
+                    future = submit('swi', site_id_list[index])
+                    in_flight[future] = ('swi', [index])
+
+            done = wait_first(in_flight)
+
+            for future in done:
+                kind, batch = in_flight.pop(future)
+
+                if kind == 'bulk_swi':
+                    site_wan_if_dict = future.result()
+                    if site_wan_if_dict is None:
+                        # not supported on this controller, fall back to per-site queries.
+                        swi_queue = list(swi_needed)
+                        continue
+                    for index in swi_needed:
+                        swi_finished[index] = site_wan_if_dict.get(site_id_list[index], [])
+                    newly_complete = [x for x in swi_needed if x in topology_finished]
+
+                elif kind == 'swi':
+                    swi_finished[batch[0]] = future.result()
+                    newly_complete = batch if batch[0] in topology_finished else []
+
+                else:
+                    topology, elapsed = future.result()
+
+                    if not topology and len(batch) > 1:
+                        # split the batch, both halves go back in the queue.
+                        topology_queue = sorted(topology_queue + batch)
+                        batch_size = max(1, min(batch_size, len(batch) // 2))
+                        continue
+
+                    # tune batch size for the next query.
+                    if elapsed > BATCH_TARGET_SECONDS:
+                        batch_size = max(1, batch_size // 2)
+                    elif elapsed < BATCH_TARGET_SECONDS / 2 and len(batch) >= batch_size:
+                        batch_size = min(batch_max, batch_size * 2)
+
+                    topology_finished[batch[0]] = topology
+                    for index in batch[1:]:
+                        topology_finished[index] = None
+                    newly_complete = [x for x in batch if x in swi_finished]
+
+                # iterate bar and counter as each site finishes.
+                site_processed += len(newly_complete)
+                if pbar is not None and newly_complete:
+                    pbar.update(site_processed)
+
+            # hand back every site that is now complete, in original order.
+            while next_index in topology_finished and next_index in swi_finished:
+                yield site_id_list[next_index], topology_finished.pop(next_index), swi_finished.pop(next_index)
+                next_index += 1
+
+    logger.info("Loaded topology for {0} sites using {1} topology requests.".format(topology_site_count,
+                                                                                    topology_requests))
+    log_hedge_stats(sdk_vars.get('hedge_policy'))
+
+
+def new_topology_snapshot():
+    """
+    Create an empty topology snapshot. A snapshot holds everything discovery learns about a set of sites, for
+    both Internet (public) and Private WAN VPNs, so every meshing stance can work from one set of API queries.
+    :return: snapshot dict
+    """
+    return {
+        "timestamp": time.time(),               # when the snapshot was first built
+        "site_id_to_role_dict": {},             # site ID -> element_cluster_role
+        "all_anynets_pub": {},                  # SWI pair key (interning) -> public-anynet topology link
+        "all_anynets_priv": {},                 # SWI pair key (interning) -> private-anynet topology link
+        "all_anynets_generic": {},              # SWI pair key (interning) -> (pre 4.4) anynet topology link
+        "site_swi_dict_pub": {},                # site ID -> list of publicwan SWIs
+        "site_swi_dict_priv": {},               # site ID -> list of privatewan SWIs
+        "swi_to_site_dict": {},                 # SWI -> site ID
+        "swi_to_wan_network_dict": {},          # SWI -> WAN network ID
+        "wan_network_to_swi_dict": {},          # WAN network ID -> list of SWIs
+        "topology_sites": [],                   # site IDs with topology loaded
+        "swi_sites": [],                        # site IDs with Site WAN Interfaces loaded
+        "stale_sites": [],                      # site IDs with links changed since topology was loaded
+        "inventory_loaded": False               # True if configured links were listed from the link inventory
+    }
+
+
+def merge_topology(snapshot, topology):
+    """
+    Merge anynet links from a (projected) topology query response into the snapshot.
+    :param snapshot: topology snapshot dict
+    :param topology: topology dict from project_topology()
+    :return: empty
+    """
+    for link in topology.get('links', []):
+        link_type = link.get('type', "")
+
+        # if an anynet link (SWI to SWI)
+        if link_type == ANYNET_TYPE_PUB:
+            all_anynets = snapshot['all_anynets_pub']
+        elif link_type == ANYNET_TYPE_PRIV:
+            all_anynets = snapshot['all_anynets_priv']
+        elif link_type == ANYNET_TYPE_GENERIC:
+            all_anynets = snapshot['all_anynets_generic']
+        else:
+            continue
+
+        # vpn record, check for uniqueness.
+        source_swi = link.get('source_wan_if_id')
+        dest_swi = link.get('target_wan_if_id')
+        # create anynet lookup key
+        anynet_lookup_key = anynet_pair_key(source_swi, dest_swi)
+        existing_link = all_anynets.get(anynet_lookup_key, None)
+        if not existing_link or existing_link.get('status') == INVENTORY_LINK_STATUS:
+            # path is not in current anynets (or only from the link inventory), add
+            all_anynets[anynet_lookup_key] = link
+
+    return
+
+
+def merge_waninterfaces(snapshot, site, site_wan_if_items, wan_network_to_type_dict):
+    """
+    Merge a site's Site WAN Interfaces into the snapshot SWI / WAN network indexes.
+    :param snapshot: topology snapshot dict
+    :param site: Site ID
+    :param site_wan_if_items: list of Site WAN Interface items for the site
+    :param wan_network_to_type_dict: xlation dict of WAN network ID to type ('publicwan' or 'privatewan')
+    :return: empty
+    """
+    swi_to_site_dict = snapshot['swi_to_site_dict']
+    swi_to_wan_network_dict = snapshot['swi_to_wan_network_dict']
+    wan_network_to_swi_dict = snapshot['wan_network_to_swi_dict']
+    site_swi_list_pub = []
+    site_swi_list_priv = []
+
+    # iterate all the site wan interfaces
+    for current_swi in site_wan_if_items:
+        # get the WN bound to the SWI.
+        wan_network_id = current_swi.get('network_id', "")
+        swi_id = current_swi.get('id', "")
+
+        if swi_id:
+            # update SWI -> Site xlation dict
+            swi_to_site_dict[swi_id] = site
+
+        wan_network_type = wan_network_to_type_dict.get(wan_network_id, "")
+
+        # get the SWIs that match a VPN mesh type
+        if wan_network_id and swi_id and wan_network_type in ['publicwan', 'privatewan']:
+            logger.debug('SWI_ID = SITE: {0} = {1}'.format(swi_id, site))
+
+            # update swi -> WN xlate dict
+            swi_to_wan_network_dict[swi_id] = wan_network_id
+
+            # update site-level SWI list.
+            if wan_network_type == 'publicwan':
+                site_swi_list_pub.append(swi_id)
+            else:
+                site_swi_list_priv.append(swi_id)
+
+            # update WN -> swi xlate dict
+            wan_network_to_swi_dict.setdefault(wan_network_id, []).append(swi_id)
+
+    # add all matching mesh_type stubs to site_swi_dict
+    snapshot['site_swi_dict_pub'][site] = site_swi_list_pub
+    snapshot['site_swi_dict_priv'][site] = site_swi_list_priv
+
+    return
+
+
+def inventory_link(item):
+    """
+    Convert a tenant link inventory item to the topology link fields kept in the snapshot (ANYNET_LINK_FIELDS).
+    The link type is set when merged, see merge_inventory().
+    :param item: anynet link item from the link inventory query
+    :return: link dict, or None if the item is missing a Site WAN Interface ID.
+    """
+    source_swi = item.get('ep1_wan_if_id')
+    dest_swi = item.get('ep2_wan_if_id')
+    if not source_swi or not dest_swi:
+        return None
+
+    return {
+        'path_id': item.get('id'),
+        'source_wan_if_id': source_swi,
+        'target_wan_if_id': dest_swi,
+        'status': INVENTORY_LINK_STATUS,
+        # the inventory only has created links, system (auto) links are only in topology.
+        'sub_type': 'on-demand',
+        'admin_up': item.get('admin_up')
+    }
+
+
+def query_anynet_inventory(sdk_vars, sdk_session):
+    """
+    List every configured VPN Mesh Link in the tenant with the paged anynet link query API, instead of reading
+    them out of each site's topology. Enough to find the modifiable links (ex. for Hub/Spoke), but the inventory
+    has no operational status and no system (auto) Branch <-> DC links.
+    :param sdk_vars: sdk_vars global info struct
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :return: list of links (see inventory_link()), or None if the SDK or controller does not support the query.
+    """
+    query_func = getattr(sdk_session.post, 'anynetlinks_query', None)
+    if query_func is None:
+        return None
+
+    links = []
+    for status, items in paged_query(query_func, retry_policy=sdk_vars.get('retry_policy'),
+                                     limiter=sdk_vars.get('api_limiter'), rate_limits=sdk_vars.get('rate_limits')):
+        if not status:
+            return None
+        for item in items:
+            link = inventory_link(item)
+            if link:
+                links.append(link)
+
+    logger.info("Loaded {0} VPN Mesh Links from the tenant link inventory.".format(len(links)))
+    return links
+
+
+def merge_inventory(snapshot, links, wan_network_to_type_dict):
+    """
+    Merge links from the tenant link inventory into the snapshot. Links already read from topology are kept, they
+    have operational status. Links with no Site WAN Interface loaded can't be typed, and are dropped - their sites
+    were not asked for.
+    :param snapshot: topology snapshot dict
+    :param links: list of links from query_anynet_inventory()
+    :param wan_network_to_type_dict: xlation dict of WAN network ID to type ('publicwan' or 'privatewan')
+    :return: empty
+    """
+    swi_to_wan_network_dict = snapshot['swi_to_wan_network_dict']
+
+    for link in links:
+        source_swi = link['source_wan_if_id']
+        dest_swi = link['target_wan_if_id']
+        wan_network_id = swi_to_wan_network_dict.get(source_swi) or swi_to_wan_network_dict.get(dest_swi)
+        wan_network_type = wan_network_to_type_dict.get(wan_network_id, "")
+
+        if wan_network_type == 'publicwan':
+            all_anynets = snapshot['all_anynets_pub']
+            link_type = ANYNET_TYPE_PUB
+        elif wan_network_type == 'privatewan':
+            all_anynets = snapshot['all_anynets_priv']
+            link_type = ANYNET_TYPE_PRIV
+        else:
+            continue
+
+        anynet_lookup_key = anynet_pair_key(source_swi, dest_swi)
+        if anynet_lookup_key not in all_anynets:
+            all_anynets[anynet_lookup_key] = dict(link, type=link_type)
+
+    snapshot['inventory_loaded'] = True
+
+    return
+
+
+def forget_inventory_links(snapshot):
+    """
+    Remove links that came from the tenant link inventory (and not topology) from the snapshot.
+    :param snapshot: topology snapshot dict
+    :return: empty
+    """
+    for all_anynets in [snapshot['all_anynets_pub'], snapshot['all_anynets_priv'], snapshot['all_anynets_generic']]:
+        for anynet_key in list(all_anynets.keys()):
+            if all_anynets[anynet_key].get('status') == INVENTORY_LINK_STATUS:
+                del all_anynets[anynet_key]
+
+    snapshot['inventory_loaded'] = False
+
+    return
+
+
+def update_link_site_ids(snapshot):
+    """
+    Update all anynet links in the snapshot with source/target site IDs. Can't be done while merging topology,
+    because the SWI -> Site xlation table is not finished until all sites are loaded.
+    :param snapshot: topology snapshot dict
+    :return: empty
+    """
+    swi_to_site_dict = snapshot['swi_to_site_dict']
+
+    for all_anynets in [snapshot['all_anynets_pub'], snapshot['all_anynets_priv'], snapshot['all_anynets_generic']]:
+        for anynet_key, link in all_anynets.items():
+            source_swi = link.get('source_wan_if_id')
+            dest_swi = link.get('target_wan_if_id')
+            link['source_site_id'] = swi_to_site_dict.get(source_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
+            link['target_site_id'] = swi_to_site_dict.get(dest_swi, 'UNKNOWN (Unable to map SWI to Site ID)')
+
+    return
+
+
+def skipped_request_count(skipped_topology, skipped_swi, sdk_vars):
+    """
+    Work out how many API requests discover_sites() would have made for sites it was not asked to query.
+    :param skipped_topology: set of site IDs topology was not queried for
+    :param skipped_swi: set of site IDs Site WAN Interfaces were not queried for
+    :param sdk_vars: sdk_vars global info struct ('topology_batch', 'bulk_swi')
+    :return: number of requests (int). For batched topology queries, the fewest the sites could have taken.
+    """
+    batch_max = max(1, sdk_vars.get('topology_batch', 0))
+    request_count = (len(skipped_topology) + batch_max - 1) // batch_max
+
+    if not sdk_vars.get('bulk_swi', False):
+        # the tenant-wide query is made either way, per-site queries are saved.
+        request_count += len(skipped_swi)
+
+    return request_count
+
+
+def update_topology_snapshot(snapshot, site_id_list, site_id_to_role_dict, wan_network_to_type_dict,
+                             sdk_vars, sdk_session, topology_site_id_list=None, link_inventory=False,
+                             site_callback=None, quiet=False, skip_inactive=True, cancel=None):
+    """
+    Make sure the snapshot has topology and Site WAN Interface info for every site in site_id_list. Only sites not
+    already in the snapshot are queried.
+    :param snapshot: topology snapshot dict (from new_topology_snapshot())
+    :param site_id_list: list of site IDs needed
+    :param site_id_to_role_dict: xlation dict of site ID to element_cluster_role
+    :param wan_network_to_type_dict: xlation dict of WAN network ID to type ('publicwan' or 'privatewan')
+    :param sdk_vars: sdk_vars global info struct
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :param topology_site_id_list: Optional list of the site IDs in site_id_list that need topology (default all),
+                                  ex. from custom_topology_site_ids().
+    :param link_inventory: List configured links from the tenant link inventory instead of querying topology,
+                           for callers that only need the modifiable links (no operational status). Topology is
+                           still queried if the inventory is not available.
+    :param site_callback: Optional function called with (snapshot, site ID) for each site in site_id_list once its
+                          topology and Site WAN Interfaces are in the snapshot - sites already loaded first, then
+                          each queried site as it arrives. Lets callers work on sites while the rest load.
+    :param quiet: No progress output (for background loads), log only.
+    :param skip_inactive: Leave out inactive sites if sdk_vars['skip_inactive'] is set. Only for creating links -
+                          callers removing links need every existing link, inactive sites included.
+    :param cancel: Optional threading.Event to stop loading early (see discover_sites()). Sites loaded before it was
+                   set are kept in the snapshot, the rest are queried by the next update.
+    :return: the updated snapshot
+    """
+    snapshot['site_id_to_role_dict'].update(site_id_to_role_dict)
+
+    hub_sites = set()
+    if not sdk_vars.get('hub_topology', False):
+        # DC <-> DC links are never meshed, so every link we show or change has a branch end and is in that
+        # branch's topology. Hub topology responses are the largest, skip them (Hub SWIs are still loaded).
+        hub_sites = set(x for x, role in snapshot['site_id_to_role_dict'].items() if role == 'HUB')
+
+    if snapshot['stale_sites']:
+        # links were changed at these sites, confirm with a fresh topology query.
+        forget_site_topology(snapshot, snapshot['stale_sites'])
+        snapshot['stale_sites'] = []
+        if snapshot['inventory_loaded']:
+            forget_inventory_links(snapshot)
+
+    if topology_site_id_list is None:
+        topology_site_id_list = site_id_list
+
+    inventory_links = None
+    if link_inventory:
+        if not snapshot['inventory_loaded']:
+            inventory_links = query_anynet_inventory(sdk_vars, sdk_session)
+            if inventory_links is None:
+                inventory_text = "Tenant link inventory not available, using VPN topology instead."
+            else:
+                inventory_text = "Listed {0} VPN Mesh Links from the tenant link inventory, VPN topology is not " \
+                                 "needed.".format(len(inventory_links))
+            if quiet:
+                logger.info(inventory_text)
+            else:
+                print(inventory_text)
+        if snapshot['inventory_loaded'] or inventory_links is not None:
+            topology_site_id_list = []
+    elif snapshot['inventory_loaded']:
+        # inventory links have no status, topology is needed now.
+        forget_inventory_links(snapshot)
+
+    topology_loaded = set(snapshot['topology_sites'])
+    swi_loaded = set(snapshot['swi_sites'])
+    topology_site_ids = set(x for x in topology_site_id_list if x not in topology_loaded and x not in hub_sites)
+    swi_site_ids = set(x for x in site_id_list if x not in swi_loaded)
+
+    sdk_vars['inactive_sites_skipped'] = set()
+    if skip_inactive and sdk_vars.get('skip_inactive', True):
+        # admin disabled sites and sites with no role can't have VPN links, don't query them. Their SWIs are left
+        # out too - without the site's own topology, links to it (from DCs, or other inactive sites) would show as
+        # new.
+        inactive_sites = sdk_vars.get('inactive_site_ids') or set()
+        skipped_topology = topology_site_ids & inactive_sites
+        skipped_swi = swi_site_ids & inactive_sites
+        sdk_vars['inactive_sites_skipped'] = skipped_topology | skipped_swi
+        if skipped_topology or skipped_swi:
+            topology_site_ids -= skipped_topology
+            swi_site_ids -= skipped_swi
+            skipped_text = "Skipping {0} inactive sites (admin disabled or no role), saving {1} API requests." \
+                           "".format(len(skipped_topology | skipped_swi),
+                                     skipped_request_count(skipped_topology, skipped_swi, sdk_vars))
+            if quiet:
+                logger.info(skipped_text)
+            else:
+                print(skipped_text)
+
+    all_site_ids = site_id_list
+    site_id_list = [x for x in site_id_list if x in topology_site_ids or x in swi_site_ids]
+
+    # links still to come from the inventory complete every site at once, after it is merged.
+    pipeline_sites = site_callback is not None and inventory_links is None
+    if pipeline_sites:
+        queried_sites = set(site_id_list)
+        for site in all_site_ids:
+            if site not in queried_sites:
+                site_callback(snapshot, site)
+
+    if not site_id_list:
+        if inventory_links is not None:
+            merge_inventory(snapshot, inventory_links, wan_network_to_type_dict)
+            update_link_site_ids(snapshot)
+            if site_callback is not None:
+                for site in all_site_ids:
+                    site_callback(snapshot, site)
+        logger.info("All requested sites already in topology snapshot.")
+        return snapshot
+
+    if quiet:
+        logger.info("Loading VPN topology information for {0} sites in the background.".format(len(site_id_list)))
+    else:
+        print("Loading VPN topology information for {0} sites, please wait.".format(len(site_id_list)))
+
+    debug_enabled = logger.isEnabledFor(logging.DEBUG)
+    if debug_enabled:
+        logger.debug('SITE_ID_LIST ({0}): {1}'.format(len(site_id_list), json.dumps(site_id_list, indent=4)))
+
+    # could be a long query - start a progress bar.
+    pbar = None
+    if not quiet:
+        pbar = ProgressBar(widgets=[Percentage(), Bar(), ETA()], max_value=len(site_id_list)+1).start()
+
+    # query many sites at once, results come back in site_id_list order.
+    for site, topology, site_wan_if_items in discover_sites(site_id_list, sdk_vars, sdk_session, pbar=pbar,
+                                                            topology_site_ids=topology_site_ids,
+                                                            swi_site_ids=swi_site_ids, cancel=cancel):
+
+        if topology:
+            # iterate topology. We need to iterate all of the matching SWIs, and existing anynet connections (sorted).
+            if debug_enabled:
+                logger.debug("TOPOLOGY: {0}".format(json.dumps(topology, indent=4)))
+            merge_topology(snapshot, topology)
+
+        # Query 2 - SWI for site, since stub-topology may not be in topology info.
+        if site_wan_if_items is not None:
+            merge_waninterfaces(snapshot, site, site_wan_if_items, wan_network_to_type_dict)
+            snapshot['swi_sites'].append(site)
+
+        if site in topology_site_ids and topology is not False:
+            snapshot['topology_sites'].append(site)
+
+        if pipeline_sites:
+            site_callback(snapshot, site)
+
+    # finish after iteration.
+    if pbar is not None:
+        pbar.finish()
+
+    if inventory_links is not None:
+        # typed by the Site WAN Interfaces, so merged after they are loaded.
+        merge_inventory(snapshot, inventory_links, wan_network_to_type_dict)
+
+    update_link_site_ids(snapshot)
+
+    if site_callback is not None and not pipeline_sites:
+        for site in all_site_ids:
+            site_callback(snapshot, site)
+
+    if debug_enabled:
+        logger.debug("SWI -> WN xlate ({0}): {1}".format(len(snapshot['swi_to_wan_network_dict']),
+                                                        json.dumps(snapshot['swi_to_wan_network_dict'], indent=4)))
+        logger.debug("All Anynets Pub ({0}): {1}".format(len(snapshot['all_anynets_pub']),
+                                                         json.dumps(snapshot['all_anynets_pub'], indent=4)))
+        logger.debug("All Anynets Priv ({0}): {1}".format(len(snapshot['all_anynets_priv']),
+                                                          json.dumps(snapshot['all_anynets_priv'], indent=4)))
+        logger.debug("SWI construct Pub ({0}): {1}".format(len(snapshot['site_swi_dict_pub']),
+                                                           json.dumps(snapshot['site_swi_dict_pub'], indent=4)))
+        logger.debug("SWI construct Priv ({0}): {1}".format(len(snapshot['site_swi_dict_priv']),
+                                                            json.dumps(snapshot['site_swi_dict_priv'], indent=4)))
+        logger.debug("WN xlate ({0}): {1}".format(len(snapshot['wan_network_to_swi_dict']),
+                                                  json.dumps(snapshot['wan_network_to_swi_dict'], indent=4)))
+        logger.debug("SWI -> SITE xlate ({0}): {1}".format(len(snapshot['swi_to_site_dict']),
+                                                           json.dumps(snapshot['swi_to_site_dict'], indent=4)))
+
+    return snapshot
+
+
+def custom_topology_site_ids(site_id_list_a, site_id_list_b, site_id_to_role_dict, hub_topology=False):
+    """
+    Pick the sites that need topology for an A <-> B mesh. Every A <-> B anynet is in the topology of both of its
+    sites, so only one side needs querying - whichever needs fewer queries. When hub topology is skipped, a side
+    with DC sites also needs the branches on the other side, as DC <-> branch links are read from the branch.
+    :param site_id_list_a: list of site IDs for list A
+    :param site_id_list_b: list of site IDs for list B
+    :param site_id_to_role_dict: xlation dict of site ID to element_cluster_role
+    :param hub_topology: True if HUB site topology is queried (sdk_vars['hub_topology'])
+    :return: set of site IDs
+    """
+    def side_site_ids(side_list, other_list):
+        if hub_topology:
+            return set(side_list)
+
+        side_site_id_set = set(x for x in side_list if site_id_to_role_dict.get(x) != 'HUB')
+        if len(side_site_id_set) != len(set(side_list)):
+            # side has DC sites, need the branches they pair with.
+            side_site_id_set.update(x for x in other_list if site_id_to_role_dict.get(x) != 'HUB')
+        return side_site_id_set
+
+    site_ids_a = side_site_ids(site_id_list_a, site_id_list_b)
+    site_ids_b = side_site_ids(site_id_list_b, site_id_list_a)
+
+    return site_ids_a if len(site_ids_a) <= len(site_ids_b) else site_ids_b
+
+
+def topology_snapshot_view(snapshot, mesh_type):
+    """
+    Get the anynets and Site-SWI dict for one VPN mesh type out of a snapshot.
+    :param snapshot: topology snapshot dict
+    :param mesh_type: 'publicwan' or 'privatewan'
+    :return: tuple of all_anynets dict, site_swi_dict
+    """
+    if mesh_type in ['privatewan']:
+        all_anynets = snapshot['all_anynets_priv']
+        site_swi_dict = snapshot['site_swi_dict_priv']
+    else:
+        all_anynets = snapshot['all_anynets_pub']
+        site_swi_dict = snapshot['site_swi_dict_pub']
+
+    if snapshot['all_anynets_generic']:
+        # older controllers report untyped anynets, these apply to either mesh type.
+        combined_anynets = dict(snapshot['all_anynets_generic'])
+        combined_anynets.update(all_anynets)
+        all_anynets = combined_anynets
+
+    return all_anynets, site_swi_dict
+
+
+def topology_cache_filename(cache_dir, tenant_str):
+    """
+    Get the topology snapshot cache file name for a tenant.
+    :param cache_dir: directory to keep cache files in
+    :param tenant_str: file-system friendly tenant name
+    :return: file name string
+    """
+    return os.path.join(cache_dir, "{0}_topology_cache.json".format(tenant_str))
+
+
+def save_cached_topology_snapshot(snapshot, filename, cache_key):
+    """
+    Write a topology snapshot to disk. The snapshot is written to a temp file in the same directory and moved
+    into place, so an interrupted write never leaves a partial cache file behind.
+    :param snapshot: topology snapshot dict
+    :param filename: cache file name
+    :param cache_key: dict identifying what the snapshot is for (tenant ID, controller). Must match on load.
+    :return: Boolean, True if saved.
+    """
+    cache_dir = os.path.dirname(filename)
+    cache_data = {
+        "version": TOPOLOGY_CACHE_VERSION,
+        "cache_key": cache_key,
+        "snapshot": snapshot
+    }
+
+    temp_filename = None
+    try:
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        temp_fd, temp_filename = tempfile.mkstemp(dir=cache_dir if cache_dir else None,
+                                                  prefix=".topology_cache_", suffix=".tmp")
+        with os.fdopen(temp_fd, 'w') as outfile:
+            json.dump(cache_data, outfile)
+            outfile.flush()
+            os.fsync(outfile.fileno())
+        os.replace(temp_filename, filename)
+    except (ValueError, IOError, OSError) as e:
+        logger.warning("Could not save topology cache {0}: {1}".format(filename, e))
+        if temp_filename and os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        return False
+
+    logger.info("Saved topology snapshot for {0} sites to {1}.".format(len(snapshot['topology_sites']), filename))
+    return True
+
+
+def load_cached_topology_snapshot(filename, cache_key, max_age):
+    """
+    Read a topology snapshot from disk, if it exists, matches cache_key, and is not older than max_age.
+    :param filename: cache file name
+    :param cache_key: dict identifying what the snapshot is for (tenant ID, controller).
+    :param max_age: max age of the snapshot in seconds.
+    :return: topology snapshot dict, or None if no usable cache.
+    """
+    if not os.path.exists(filename):
+        return None
+
+    try:
+        with open(filename) as data_file:
+            cache_data = json.load(data_file)
+    except (ValueError, IOError) as e:
+        logger.warning("Could not load topology cache {0}: {1}".format(filename, e))
+        return None
+
+    if not isinstance(cache_data, dict) or cache_data.get('version') != TOPOLOGY_CACHE_VERSION:
+        logger.info("Topology cache {0} is from a different version, ignoring.".format(filename))
+        return None
+
+    if cache_data.get('cache_key') != cache_key:
+        logger.info("Topology cache {0} is for a different tenant/controller, ignoring.".format(filename))
+        return None
+
+    snapshot = cache_data.get('snapshot')
+    if not isinstance(snapshot, dict) or set(snapshot.keys()) != set(new_topology_snapshot().keys()):
+        logger.info("Topology cache {0} is not a valid snapshot, ignoring.".format(filename))
+        return None
+
+    age = time.time() - snapshot.get('timestamp', 0)
+    if age > max_age or age < 0:
+        logger.info("Topology cache {0} is {1:.0f} seconds old, ignoring.".format(filename, age))
+        return None
+
+    # anynet keys are packed ID numbers, only valid in the process that made them. Key again from the links.
+    for anynets_name in ['all_anynets_pub', 'all_anynets_priv', 'all_anynets_generic']:
+        snapshot[anynets_name] = {anynet_pair_key(link.get('source_wan_if_id'), link.get('target_wan_if_id')): link
+                                  for link in snapshot[anynets_name].values()}
+
+    return snapshot
+
+
+def save_session_topology_snapshot(sdk_vars):
+    """
+    Save the session topology snapshot to the on-disk cache, if the cache is enabled.
+    :param sdk_vars: sdk_vars global info struct
+    :return: Boolean, True if saved.
+    """
+    snapshot = sdk_vars.get("topology_snapshot")
+    filename = sdk_vars.get("topology_cache_file")
+    if not snapshot or not filename:
+        return False
+
+    return save_cached_topology_snapshot(snapshot, filename, sdk_vars.get("topology_cache_key"))
+
+
+def print_cached_topology_age(sdk_vars):
+    """
+    Print how old cached link status is, if any sites shown still have topology from the on-disk cache.
+    :param sdk_vars: sdk_vars global info struct ('topology_cache_sites', 'topology_cache_timestamp')
+    :return: empty
+    """
+    cached_site_count = len(sdk_vars.get("topology_cache_sites") or [])
+    if not cached_site_count:
+        return
+
+    cache_age = time.time() - sdk_vars["topology_cache_timestamp"]
+    print("NOTE: Link status for {0} sites is from cached VPN topology information {1:.0f} minutes old. Use "
+          "--refresh (or Re-query All Selected Sites in the custom mesh menu) to reload."
+          "".format(cached_site_count, cache_age / 60))
+
+    return
+
+
+def print_skipped_inactive_sites(sdk_vars):
+    """
+    Print how many inactive sites the last topology load left out, as links to them are not shown.
+    :param sdk_vars: sdk_vars global info struct ('inactive_sites_skipped')
+    :return: empty
+    """
+    skipped_site_count = len(sdk_vars.get("inactive_sites_skipped") or [])
+    if not skipped_site_count:
+        return
+
+    print("NOTE: {0} inactive sites (admin disabled or no role) were skipped, links to them are not shown. Use "
+          "--include-inactive to include them.".format(skipped_site_count))
+
+    return
+
+
+def forget_site_topology(snapshot, site_id_list):
+    """
+    Remove the topology for sites from the snapshot, so the next update queries it again. Anynet links with both
+    ends in the sites are dropped (changed links always have both ends marked stale), the re-query brings back the
+    ones that still exist. Links to other sites are kept, the other site may not be queried again.
+    Site WAN Interfaces are kept, link changes do not change them.
+    :param snapshot: topology snapshot dict
+    :param site_id_list: list of site IDs
+    :return: empty
+    """
+    forget_sites = set(site_id_list)
+    swi_to_site_dict = snapshot['swi_to_site_dict']
+
+    for all_anynets in [snapshot['all_anynets_pub'], snapshot['all_anynets_priv'], snapshot['all_anynets_generic']]:
+        for anynet_key in list(all_anynets.keys()):
+            link = all_anynets[anynet_key]
+            if swi_to_site_dict.get(link.get('source_wan_if_id')) in forget_sites and \
+                    swi_to_site_dict.get(link.get('target_wan_if_id')) in forget_sites:
+                del all_anynets[anynet_key]
+
+    snapshot['topology_sites'] = [x for x in snapshot['topology_sites'] if x not in forget_sites]
+
+    return
+
+
+def mark_anynets_stale(sdk_vars, anynets_list):
+    """
+    Mark the sites at both ends of anynets as stale in the session topology snapshot before they are changed.
+    Stale sites get a fresh topology query on the next snapshot update. The cache is saved right away, so even if
+    the run stops part way through the changes, the next run does not trust the old links.
+    :param sdk_vars: sdk_vars global info struct
+    :param anynets_list: list of anynet dicts (lookup key -> anynet) about to be changed.
+    :return: empty
+    """
+    mark_sites_stale(sdk_vars, [site_id for anynets in anynets_list for anynet in anynets.values()
+                                for site_id in [anynet.get('source_site_id'), anynet.get('target_site_id')]])
+
+    return
+
+
+def mark_sites_stale(sdk_vars, site_id_list):
+    """
+    Mark sites as stale in the session topology snapshot, so the next snapshot update queries their topology again
+    (ex. Refresh Link Status). The cache is saved right away.
+    :param sdk_vars: sdk_vars global info struct
+    :param site_id_list: list of site IDs
+    :return: empty
+    """
+    snapshot = sdk_vars.get("topology_snapshot")
+    if not snapshot:
+        return
+
+    stale_sites = snapshot['stale_sites']
+    for site_id in site_id_list:
+        if site_id and site_id not in stale_sites:
+            stale_sites.append(site_id)
+
+    save_session_topology_snapshot(sdk_vars)
+
+    return
+
+
+def fold_anynet_result(sdk_vars, action, anynet, result):
+    """
+    Fold the result of a create/delete/enable/disable of an anynet into the session topology snapshot, so the
+    snapshot matches the change without querying the topology again.
+    :param sdk_vars: sdk_vars global info struct
+    :param action: one of 'create', 'delete', 'enable', 'disable'
+    :param anynet: anynet dict that was changed (needs source/target_wan_if_id and site IDs)
+    :param result: cgx_content returned by the API, or False if the change failed.
+    :return: empty
+    """
+    snapshot = sdk_vars.get("topology_snapshot")
+    if not snapshot or result is False:
+        return
+
+    source_swi = anynet.get('source_wan_if_id')
+    dest_swi = anynet.get('target_wan_if_id')
+    anynet_lookup_key = anynet_pair_key(source_swi, dest_swi)
+    all_anynets_list = [snapshot['all_anynets_pub'], snapshot['all_anynets_priv'], snapshot['all_anynets_generic']]
+    result = result if isinstance(result, dict) else {}
+
+    if action == 'create':
+        # new links go with the VPN type of the SWIs.
+        if source_swi in snapshot['site_swi_dict_priv'].get(anynet.get('source_site_id'), []):
+            all_anynets = snapshot['all_anynets_priv']
+            link_type = ANYNET_TYPE_PRIV
+        else:
+            all_anynets = snapshot['all_anynets_pub']
+            link_type = ANYNET_TYPE_PUB
+        all_anynets[anynet_lookup_key] = {
+            'type': link_type,
+            'path_id': result.get('id'),
+            'source_wan_if_id': source_swi,
+            'target_wan_if_id': dest_swi,
+            'source_site_id': anynet.get('source_site_id'),
+            'target_site_id': anynet.get('target_site_id'),
+            'admin_up': result.get('admin_up', True),
+            'status': 'init',
+            'sub_type': 'on-demand'
+        }
+
+    elif action == 'delete':
+        for all_anynets in all_anynets_list:
+            all_anynets.pop(anynet_lookup_key, None)
+
+    elif action in ['enable', 'disable']:
+        for all_anynets in all_anynets_list:
+            link = all_anynets.get(anynet_lookup_key)
+            if link:
+                link['admin_up'] = result.get('admin_up', action == 'enable')
+
+    return
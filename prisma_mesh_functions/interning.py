@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+"""
+Dense integer numbers for Site WAN Interface (and other object) IDs, and packed 64-bit anynet pair keys
+
+"""
+import threading
+
+# bits per ID number in a pair key - two numbers are packed into one 64-bit key.
+PAIR_KEY_BITS = 32
+
+
+def new_id_table():
+    """
+    Create an empty ID table. Numbers are handed out in order from 0, and are only valid for this table (never
+    save them - save the ID text and intern it again).
+    :return: ID table dict
+    """
+    return {
+        "numbers": {},                  # ID text -> number
+        "ids": [],                      # number -> ID text
+        "lock": threading.Lock()        # held while adding IDs, background topology loads intern too.
+    }
+
+
+# process-wide ID table, used when no table is given.
+ID_TABLE = new_id_table()
+
+
+def intern_id(id_text, id_table=None):
+    """
+    Get the number for an ID, adding it to the table if new.
+    :param id_text: ID text, ex. Site WAN Interface ID
+    :param id_table: Optional ID table, default ID_TABLE.
+    :return: number (int)
+    """
+    if id_table is None:
+        id_table = ID_TABLE
+
+    number = id_table['numbers'].get(id_text)
+    if number is None:
+        with id_table['lock']:
+            number = id_table['numbers'].get(id_text)
+            if number is None:
+                number = len(id_table['ids'])
+                id_table['ids'].append(id_text)
+                id_table['numbers'][id_text] = number
+
+    return number
+
+
+def intern_ids(id_list, id_table=None):
+    """
+    Get the numbers for a list of IDs, adding any new ones to the table.
+    :param id_list: list of ID text
+    :param id_table: Optional ID table, default ID_TABLE.
+    :return: list of numbers, in id_list order.
+    """
+    return [intern_id(id_text, id_table) for id_text in id_list]
+
+
+def pair_key(number_a, number_b):
+    """
+    Pack two ID numbers into one 64-bit key, the same whichever order they are given in.
+    :param number_a: number from intern_id()
+    :param number_b: number from intern_id()
+    :return: pair key (int)
+    """
+    if number_a < number_b:
+        return (number_a << PAIR_KEY_BITS) | number_b
+    return (number_b << PAIR_KEY_BITS) | number_a
+
+
+def anynet_pair_key(swi_a, swi_b, id_table=None):
+    """
+    Get the anynet lookup key for a Site WAN Interface pair - the key of the snapshot and calculated anynet dicts.
+    :param swi_a: Site WAN Interface ID
+    :param swi_b: Site WAN Interface ID
+    :param id_table: Optional ID table, default ID_TABLE.
+    :return: pair key (int)
+    """
+    return pair_key(intern_id(swi_a, id_table), intern_id(swi_b, id_table))
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+"""
+On-disk cache of sites, WAN networks and service binding maps, revalidated with conditional GETs
+
+"""
+import json
+import logging
+import os
+import tempfile
+import time
+import requests
+from . import api_utils
+from .async_client import tenant_api_url
+
+# Set NON-SYSLOG logging to use function name
+logger = logging.getLogger(__name__)
+
+# Bump the format version if the cache file layout (or the fields kept) changes.
+METADATA_CACHE_VERSION = 3
+# lists served without an ETag are loaded page by page, only checking for ETag support again after this long.
+NO_ETAG_RECHECK_SECONDS = 7 * 24 * 3600
+# fields kept for each object type - everything the metadata indexes read.
+METADATA_CACHE_FIELDS = {
+    "sites": ['id', 'name', 'element_cluster_role', 'service_binding', 'tags', 'admin_state'],
+    "wannetworks": ['id', 'name', 'type'],
+    "servicebindingmaps": ['id', 'name']
+}
+
+
+def metadata_cache_filename(cache_dir, tenant_str, api_name):
+    """
+    Get the metadata cache file name for a tenant and object type.
+    :param cache_dir: directory to keep cache files in
+    :param tenant_str: file-system friendly tenant name
+    :param api_name: METADATA_CACHE_FIELDS key, ex. 'sites'
+    :return: file name string
+    """
+    return os.path.join(cache_dir, "{0}_{1}_cache.json".format(tenant_str, api_name))
+
+
+def save_metadata_cache(filename, cache_key, etag, items):
+    """
+    Write a list of objects and the ETag it was served with to disk (temp file moved into place).
+    :param filename: cache file name
+    :param cache_key: dict identifying what the objects are for (tenant ID, controller). Must match on load.
+    :param etag: ETag response header of the list, or None if the controller sent none.
+    :param items: list of objects (cut down to METADATA_CACHE_FIELDS). Not kept without an ETag, as it can't be
+                  revalidated - only the fact there was no ETag is.
+    :return: Boolean, True if saved.
+    """
+    cache_dir = os.path.dirname(filename)
+    cache_data = {
+        "version": METADATA_CACHE_VERSION,
+        "cache_key": cache_key,
+        "timestamp": time.time(),
+        "etag": etag,
+        "items": items if etag else None
+    }
+
+    temp_filename = None
+    try:
+        if cache_dir and not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        temp_fd, temp_filename = tempfile.mkstemp(dir=cache_dir if cache_dir else None,
+                                                  prefix=".metadata_cache_", suffix=".tmp")
+        with os.fdopen(temp_fd, 'w') as outfile:
+            json.dump(cache_data, outfile)
+        os.replace(temp_filename, filename)
+    except (ValueError, IOError, OSError) as e:
+        logger.warning("Could not save metadata cache {0}: {1}".format(filename, e))
+        if temp_filename and os.path.exists(temp_filename):
+            os.remove(temp_filename)
+        return False
+
+    return True
+
+
+def load_metadata_cache(filename, cache_key):
+    """
+    Read a cached list of objects from disk, if it exists and matches cache_key.
+    :param filename: cache file name
+    :param cache_key: dict identifying what the objects are for (tenant ID, controller).
+    :return: tuple of ETag, list of objects - or None, None if the list was served without an ETag (less than
+             NO_ETAG_RECHECK_SECONDS ago). Or None if no usable cache.
+    """
+    if not os.path.exists(filename):
+        return None
+
+    try:
+        with open(filename) as data_file:
+            cache_data = json.load(data_file)
+    except (ValueError, IOError) as e:
+        logger.warning("Could not load metadata cache {0}: {1}".format(filename, e))
+        return None
+
+    if not isinstance(cache_data, dict) or cache_data.get('version') != METADATA_CACHE_VERSION or \
+            cache_data.get('cache_key') != cache_key:
+        logger.info("Metadata cache {0} is from a different version or tenant/controller, ignoring."
+                    "".format(filename))
+        return None
+
+    if not cache_data.get('etag'):
+        if time.time() - cache_data.get('timestamp', 0) > NO_ETAG_RECHECK_SECONDS:
+            logger.info("Metadata cache {0} has no ETag and is old, checking again.".format(filename))
+            return None
+        return None, None
+
+    if not isinstance(cache_data.get('items'), list):
+        logger.info("Metadata cache {0} has no objects, ignoring.".format(filename))
+        return None
+
+    return cache_data['etag'], cache_data['items']
+
+
+def conditional_get(sdk_session, url, etag=None):
+    """
+    GET an API URL, asking for 304 Not Modified if it still matches etag. The SDK treats 304 as an error, so this
+    uses the SDK session's requests Session directly (same login, connection pool and SSL settings).
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :param url: API URL
+    :param etag: Optional ETag from the last full response.
+    :return: requests Response, extended like SDK responses with cgx_status (True for 200 or 304) and cgx_content.
+    """
+    headers = {'If-None-Match': etag} if etag else {}
+
+    try:
+        response = sdk_session.expose_session().get(url, headers=headers, allow_redirects=False,
+                                                    timeout=getattr(sdk_session, 'rest_call_timeout', None))
+    except requests.exceptions.RequestException as e:
+        logger.info("Error, {0}.".format(e))
+        response = requests.Response()
+        response.cgx_status = False
+        response.cgx_content = {
+            '_error': [
+                {
+                    'message': 'REST Request Exception: {0}'.format(e),
+                    'data': {}
+                }
+            ]
+        }
+        return response
+
+    response.cgx_status = response.status_code in [200, 304]
+    try:
+        response.cgx_content = response.json() if response.status_code != 304 and response.content else {}
+    except ValueError:
+        response.cgx_content = {}
+
+    return response
+
+
+def load_items(page_func, api_name, query_func, get_func, sdk_vars, sdk_session, description=None):
+    """
+    Hand every object of a type to page_func. With sdk_vars['metadata_cache_dir'] set, the list from the last run
+    is revalidated with a conditional GET - if it has not changed, that costs one 304 round-trip. A changed list
+    (or the first one) is downloaded in full and cached again. Lists served without an ETag can't be revalidated,
+    so only that is cached, and later runs go straight to the normal paged load (see api_utils.query_all_pages()).
+    The paged load is also used if the GET fails, or the cache is off.
+    :param page_func: function called with each list of items.
+    :param api_name: METADATA_CACHE_FIELDS key, ex. 'sites'
+    :param query_func: SDK query function, or None if this SDK does not have one.
+    :param get_func: SDK function to GET the full list, ex. sdk_session.get.sites
+    :param sdk_vars: sdk_vars global info struct ('metadata_cache_dir', 'metadata_cache_key', 'tenant_str')
+    :param sdk_session: Authenticated CloudGenix SDK Session.
+    :param description: Optional text for messages, ex. "sites"
+    :return: Boolean, True if every object was handed to page_func.
+    """
+    cache_dir = sdk_vars.get('metadata_cache_dir')
+    cache_key = sdk_vars.get('metadata_cache_key')
+
+    if cache_dir:
+        filename = metadata_cache_filename(cache_dir, sdk_vars['tenant_str'], api_name)
+        cached = load_metadata_cache(filename, cache_key)
+        etag, cached_items = cached if cached is not None else (None, None)
+
+        if cached is not None and etag is None:
+            # served without an ETag last time, nothing to revalidate.
+            logger.info("No ETag for {0} last time, loading it page by page.".format(description))
+        else:
+            url = tenant_api_url(sdk_session, api_name)
+            resp = api_utils.retry_call(conditional_get, sdk_session, url, etag,
+                                        retry_policy=sdk_vars.get('retry_policy'), description=description,
+                                        rate_limits=sdk_vars.get('rate_limits'))
+
+            if resp.cgx_status and resp.status_code == 304 and cached_items is not None:
+                logger.info("{0} unchanged since last run, using cached copy.".format(description))
+                page_func(cached_items)
+                return True
+
+            if resp.cgx_status and resp.status_code != 304 and isinstance(resp.cgx_content, dict):
+                fields = METADATA_CACHE_FIELDS[api_name]
+                items = [{key: item.get(key) for key in fields} for item in resp.cgx_content.get('items', [])]
+                etag = resp.headers.get('ETag')
+                # drop the full response before indexing.
+                del resp
+                page_func(items)
+                if not etag:
+                    logger.info("No ETag for {0}, loading it page by page next time.".format(description))
+                save_metadata_cache(filename, cache_key, etag, items)
+                return True
+
+    return api_utils.query_all_pages(page_func, query_func, get_func, description=description,
+                                     retry_policy=sdk_vars.get('retry_policy'),
+                                     rate_limits=sdk_vars.get('rate_limits'))
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+"""
+HTTP transport (connection pool) setup for the CloudGenix SDK session
+
+"""
+import logging
+import socket
+import threading
+from urllib.parse import urlparse
+import cloudgenix
+from urllib3.connection import HTTPConnection
+
+# Set NON-SYSLOG logging to use function name
+logger = logging.getLogger(__name__)
+
+# extra pooled connections above the worker count, for requests made outside the worker pools (metadata, etc).
+POOL_HEADROOM = 4
+# TCP keep-alive probes on idle pooled connections (seconds), so firewalls/NAT do not silently drop them.
+TCP_KEEPALIVE_IDLE = 60
+TCP_KEEPALIVE_INTERVAL = 15
+TCP_KEEPALIVE_COUNT = 4
+# connect timeout, and read timeouts per API endpoint (first URL path match wins). Others use the SDK timeout.
+DEFAULT_CONNECT_TIMEOUT = 10.0      # seconds
+DEFAULT_ENDPOINT_TIMEOUTS = [
+    ("/topology", 240.0),           # large sites can take minutes.
+    ("/waninterfaces", 60.0),
+    ("/anynetlinks", 60.0),
+    ("/servicebindingmaps", 60.0),
+    ("/wannetworks", 60.0),
+    ("/sites", 60.0)
+]
+
+
+def keepalive_socket_options():
+    """
+    Get urllib3 socket options with TCP keep-alive enabled, using the tuning options this platform has.
+    :return: list of socket option tuples
+    """
+    socket_options = list(HTTPConnection.default_socket_options)
+    socket_options.append((socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1))
+
+    # Linux uses TCP_KEEPIDLE, macOS calls it TCP_KEEPALIVE.
+    keepidle = getattr(socket, 'TCP_KEEPIDLE', None) or getattr(socket, 'TCP_KEEPALIVE', None)
+    if keepidle is not None:
+        socket_options.append((socket.IPPROTO_TCP, keepidle, TCP_KEEPALIVE_IDLE))
+    if hasattr(socket, 'TCP_KEEPINTVL'):
+        socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, TCP_KEEPALIVE_INTERVAL))
+    if hasattr(socket, 'TCP_KEEPCNT'):
+        socket_options.append((socket.IPPROTO_TCP, socket.TCP_KEEPCNT, TCP_KEEPALIVE_COUNT))
+
+    return socket_options
+
+
+def endpoint_timeout(url, endpoint_timeouts=None, default=None):
+    """
+    Look up the read timeout for an API URL.
+    :param url: API request URL
+    :param endpoint_timeouts: Optional list of (URL path substring, read timeout) tuples, default
+                              DEFAULT_ENDPOINT_TIMEOUTS.
+    :param default: timeout to return if no endpoint matches.
+    :return: read timeout in seconds, or default.
+    """
+    if endpoint_timeouts is None:
+        endpoint_timeouts = DEFAULT_ENDPOINT_TIMEOUTS
+
+    path = urlparse(url).path
+    for endpoint, read_timeout in endpoint_timeouts:
+        if endpoint in path:
+            return read_timeout
+
+    return default
+
+
+def configure_transport(sdk_session, workers, endpoint_timeouts=None):
+    """
+    Replace the SDK session HTTPS adapter with one sized for parallel API requests. Keeps the SDK SSL context and
+    transport retry settings, and asks for gzip responses.
+    :param sdk_session: CloudGenix SDK Session (API object), before login.
+    :param workers: max API requests in flight at once (sdk_vars['workers'])
+    :param endpoint_timeouts: Optional list of (URL path substring, read timeout) tuples, default
+                              DEFAULT_ENDPOINT_TIMEOUTS.
+    :return: the mounted PooledHttpAdapter (for transport_stats()), or None if this SDK can't take one.
+    """
+    # TlsHttpAdapter and update_session_adapter() are only in newer SDKs (6.8+).
+    tls_http_adapter = getattr(cloudgenix, 'TlsHttpAdapter', None)
+    if tls_http_adapter is None or not hasattr(sdk_session, 'update_session_adapter'):
+        print("WARNING: This CloudGenix SDK does not support custom HTTP adapters (needs SDK >= 6.8.1b1), using "
+              "the default connection pool without keep-alive or per-endpoint timeouts.")
+        return None
+
+    class PooledHttpAdapter(tls_http_adapter):
+        """
+        SDK HTTPS adapter with TCP keep-alive, per-endpoint timeouts and a request count (for connection reuse
+        stats).
+        """
+        def __init__(self, endpoint_timeouts=None, connect_timeout=DEFAULT_CONNECT_TIMEOUT, **kwargs):
+            self.endpoint_timeouts = list(endpoint_timeouts if endpoint_timeouts is not None
+                                          else DEFAULT_ENDPOINT_TIMEOUTS)
+            self.connect_timeout = connect_timeout
+            self.request_count = 0
+            self.request_count_lock = threading.Lock()
+            super(PooledHttpAdapter, self).__init__(**kwargs)
+
+        def init_poolmanager(self, *args, **kwargs):
+            kwargs['socket_options'] = keepalive_socket_options()
+            return super(PooledHttpAdapter, self).init_poolmanager(*args, **kwargs)
+
+        def send(self, request, timeout=None, **kwargs):
+            read_timeout = endpoint_timeout(request.url, self.endpoint_timeouts)
+            if read_timeout is not None:
+                timeout = (self.connect_timeout, read_timeout)
+            elif isinstance(timeout, (int, float)):
+                timeout = (self.connect_timeout, timeout)
+
+            with self.request_count_lock:
+                self.request_count += 1
+
+            return super(PooledHttpAdapter, self).send(request, timeout=timeout, **kwargs)
+
+    adapter_kwargs = {
+        "endpoint_timeouts": endpoint_timeouts,
+        "pool_maxsize": workers + POOL_HEADROOM
+    }
+    ssl_context = getattr(sdk_session, '_ca_ssl_context', None)
+    if ssl_context is not None:
+        adapter_kwargs['ssl_context'] = ssl_context
+    retry = getattr(sdk_session, '_rest_call_retry_object', None)
+    if retry is not None:
+        adapter_kwargs['max_retries'] = retry
+
+    adapter = PooledHttpAdapter(**adapter_kwargs)
+    sdk_session.update_session_adapter(adapter=adapter)
+    sdk_session.add_headers({'Accept-Encoding': 'gzip, deflate'})
+
+    return adapter
+
+
+def transport_stats(adapter):
+    """
+    Get connection reuse counts for an adapter from configure_transport().
+    :param adapter: PooledHttpAdapter
+    :return: dict of requests, connections (opened), reused (requests that did not need a new connection).
+    """
+    connections = 0
+    pools = adapter.poolmanager.pools
+    for pool_key in list(pools.keys()):
+        pool = pools.get(pool_key)
+        if pool is not None:
+            connections += pool.num_connections
+
+    return {
+        "requests": adapter.request_count,
+        "connections": connections,
+        "reused": max(0, adapter.request_count - connections)
+    }
+
+
+def log_transport_stats(adapter):
+    """
+    Log connection reuse counts for an adapter from configure_transport(). Every new connection costs a TCP and
+    TLS handshake, so reuse well under 100% means handshakes are adding to request latency.
+    :param adapter: PooledHttpAdapter, or None.
+    :return: No return
+    """
+    if adapter is None:
+        return
+
+    stats = transport_stats(adapter)
+    if not stats['requests']:
+        return
+
+    logger.info("API connections: {0} opened for {1} requests ({2:.1f}% reused)."
+                "".format(stats['connections'], stats['requests'], 100.0 * stats['reused'] / stats['requests']))
@@ -7,7 +7,8 @@ import os
 import sys
 import logging
 from .utils import re_pick, stat_inc
-from . import menus
+from .interning import intern_ids, pair_key
+from . import menus, discovery
 
 # Set NON-SYSLOG logging to use function name
 logger = logging.getLogger(__name__)
@@ -130,23 +131,72 @@ def site_swi_dicts(siteid_list_a, siteid_list_b, site_swi_all_dict):
     return a_dict, b_dict
 
 
+def count_current_anynet(statistics, anynet):
+    """
+    Count an existing anynet in the calculate_vpn_links() statistics, by status and sub-type.
+    :param statistics: Statistics dict, updated in place.
+    :param anynet: current anynet (topology link) dict
+    :return: empty
+    """
+    status = anynet.get('status', 'other')
+    sub_type = anynet.get('sub_type', 'other')
+    adminstate_query = anynet.get('admin_up')
+    if adminstate_query == None:
+        admin_state = 'na'
+    elif adminstate_query == True:
+        admin_state = 'enabled'
+    else:
+        admin_state = 'disabled'
+
+    if status == 'up':
+        status_txt = 'up'
+    elif status == 'down':
+        if admin_state in ['enabled', 'na']:
+            status_txt = 'down'
+        else:
+            status_txt = 'admindown'
+    elif status == 'init':
+        if admin_state in ['enabled', 'na']:
+            status_txt = 'init'
+        else:
+            status_txt = 'admindown'
+    elif status == 'unknown':
+        # listed from the tenant link inventory, no operational status.
+        status_txt = 'other'
+    else:
+        status_txt = 'other'
+        logger.debug("Got OTHER type: {0}".format(status))
+
+    if sub_type in ['always-on', 'auto']:
+        sub_txt = 'always'
+        stat_inc(statistics, 'sub_always')
+    elif sub_type == 'on-demand':
+        sub_txt = 'demand'
+        stat_inc(statistics, 'sub_demand')
+    else:
+        sub_txt = 'other'
+        stat_inc(statistics, 'sub_other')
+        logger.debug("Got OTHER sub-type: {0}".format(sub_type))
+
+    stat_inc(statistics, status_txt + '_anynets_' + sub_txt)
+
+    return
+
+
 def calculate_vpn_links(site_a_swi_dict, site_b_swi_dict, all_anynets, swi_to_site_dict, site_id_to_role_dict):
     """
     Function to take site swi dicts, current anynets, and calculate stats and new anynets needed.
     :param site_a_swi_dict: Site-SWI dict for list A format { '<siteid>': ['<SWI1>', '<SWI2>', ...] }
     :param site_b_swi_dict: Site-SWI dict for list B format { '<siteid>': ['<SWI1>', '<SWI2>', ...] }
-    :param all_anynets: Current Anynet list (with standard topology info + SITE id fields added)
+    :param all_anynets: Current Anynet dict keyed by SWI pair key (interning.anynet_pair_key()), with standard
+                        topology info + SITE id fields added
     :param swi_to_site_dict: xlation SWI to SiteID mapping format { '<swi_id>': '<siteid>' }
-    :return: tuple with - new_anynets: new anynets list in similar format to all_anynets.
+    :return: tuple with - new_anynets: new anynets dict in similar format to all_anynets.
                            statistics: Dict with statistics on VPN Mesn/Anynets
     """
 
-    calculated_anynets = {}
+    calculated_anynets = set()
     current_anynets = {}
-    counted_sitea = {}
-    counted_siteb = {}
-    counted_swia = {}
-    counted_swib = {}
 
     new_anynets = {}
     statistics = {
@@ -176,129 +226,159 @@ def calculate_vpn_links(site_a_swi_dict, site_b_swi_dict, all_anynets, swi_to_si
         'swi_listb': 0
     }
 
-    # recurse every possible site a swi -> site b swi relationship
+    # role / list A position of each site, looked up once instead of once per SWI pair. The position is only kept
+    # for sites with the same SWIs in both lists, see below.
+    site_index_a = {siteid: index for index, siteid in enumerate(site_a_swi_dict)
+                    if site_b_swi_dict.get(siteid) == site_a_swi_dict[siteid]}
+    # SWIs are paired as (SWI, ID number) - the numbers make the pair keys, the text goes in new anynets.
+    site_b_list = [(siteid_b, list(zip(swi_list_b, intern_ids(swi_list_b))),
+                    site_id_to_role_dict.get(siteid_b, "UNKNOWN") in ['HUB'], site_index_a.get(siteid_b))
+                   for siteid_b, swi_list_b in site_b_swi_dict.items()]
+
+    statistics['sites_lista'] = len(site_a_swi_dict)
+    statistics['swi_lista'] = len(set(swi for swi_list in site_a_swi_dict.values() for swi in swi_list))
+    if statistics['swi_lista']:
+        # list B is only walked (and counted) for A SWIs.
+        statistics['sites_listb'] = len(site_b_list)
+        statistics['swi_listb'] = len(set(swi for swi_list in site_b_swi_dict.values() for swi in swi_list))
+
+    # every possible site a swi -> site b swi relationship
     for siteid_a, swi_list_a in site_a_swi_dict.items():
-        logger.info("SITEID A: {0}".format(siteid_a))
-        if not counted_sitea.get(siteid_a, False):
-            logger.info("NEW SITEA: {0}".format(siteid_a))
-            stat_inc(statistics, 'sites_lista')
-            counted_sitea[siteid_a] = True
-
-        for swi_a in swi_list_a:
-            if not counted_swia.get(swi_a, False):
-                logger.info("NEW SWIA: {0}".format(swi_a))
-                stat_inc(statistics, 'swi_lista')
-                counted_swia[swi_a] = True
-
-            for siteid_b, swi_list_b in site_b_swi_dict.items():
-                logger.info("SITEID B: {0}".format(siteid_b))
-                if not counted_siteb.get(siteid_b, False):
-                    logger.info("NEW SITEB: {0}".format(siteid_b))
-                    stat_inc(statistics, 'sites_listb')
-                    counted_siteb[siteid_b] = True
-
-                for swi_b in swi_list_b:
-                    if not counted_swib.get(swi_b, False):
-                        logger.info("NEW SWIB: {0}".format(swi_b))
-                        stat_inc(statistics, 'swi_listb')
-                        counted_swib[swi_b] = True
-
-                    # create anynet lookup key
-                    anynet_lookup_key = "_".join(sorted([swi_a, swi_b]))
+        index_a = site_index_a.get(siteid_a)
+        siteid_a_dc = site_id_to_role_dict.get(siteid_a, "UNKNOWN") in ['HUB']
+
+        # B sites this site pairs with, never DC <-> DC or same site. When both sites have the same SWIs in both
+        # lists and the B site is earlier in list A, every pair was already calculated from that side - skip it.
+        pair_site_list = [(siteid_b, swi_list_b) for siteid_b, swi_list_b, siteid_b_dc, index_b in site_b_list
+                          if siteid_b != siteid_a and not (siteid_a_dc and siteid_b_dc) and
+                          not (index_a is not None and index_b is not None and index_b < index_a)]
+
+        for swi_a, number_a in zip(swi_list_a, intern_ids(swi_list_a)):
+            for siteid_b, swi_list_b in pair_site_list:
+                for swi_b, number_b in swi_list_b:
+                    if number_a == number_b:
+                        continue
+
+                    anynet_lookup_key = pair_key(number_a, number_b)
 
                     # fastpath - have we already calculated this anynet?
-                    already_calculated = calculated_anynets.get(anynet_lookup_key, False)
-
-                    # is SWI source same as dest?
-                    same_swi = (swi_a == swi_b)
-                    logger.debug("SAME SWI: {0}".format(same_swi))
-
-                    # is this a DC <-> DC  Link?
-                    siteid_a_role = site_id_to_role_dict.get(siteid_a, "UNKNOWN")
-                    siteid_b_role = site_id_to_role_dict.get(siteid_b, "UNKNOWN")
-                    dc_dc = ((siteid_a_role in ['HUB']) and (siteid_b_role in ['HUB']))
-                    logger.debug("DC <-> DC: {0}".format(dc_dc))
-
-                    # is this a site1:swia <-> site1:swib relationship?
-                    same_site = (siteid_a == siteid_b)
-                    logger.debug("SAME SITE: {0}".format(same_site))
-
-                    if (not already_calculated) and (not same_swi) and (not dc_dc) and (not same_site):
-                        # new anynet relationship, lets iterate.
-
-                        # Does this Anynet currently exist in the topology?
-                        already_exists = all_anynets.get(anynet_lookup_key, False)
-
-                        if already_exists:
-                            # anynet exists, lets populate stats.
-                            stat_inc(statistics, 'current_anynets')
-                            status = already_exists.get('status', 'other')
-                            sub_type = already_exists.get('sub_type', 'other')
-                            adminstate_query = already_exists.get('admin_up')
-                            if adminstate_query == None:
-                                admin_state = 'na'
-                            elif adminstate_query == True:
-                                admin_state = 'enabled'
-                            else:
-                                admin_state = 'disabled'
-
-                            logger.debug("{0}: \n\t{1}\n\t{2}".format(anynet_lookup_key, status, sub_type))
-                            if status == 'up':
-                                status_txt = 'up'
-                            elif status == 'down':
-                                if admin_state in ['enabled', 'na']:
-                                    status_txt = 'down'
-                                else:
-                                    status_txt = 'admindown'
-                            elif status == 'init':
-                                if admin_state in ['enabled', 'na']:
-                                    status_txt = 'init'
-                                else:
-                                    status_txt = 'admindown'
-                            else:
-                                status_txt = 'other'
-                                # debug
-                                print("Got OTHER type: ", status)
-
-                            if sub_type in ['always-on', 'auto']:
-                                sub_txt = 'always'
-                                stat_inc(statistics, 'sub_always')
-                            elif sub_type == 'on-demand':
-                                sub_txt = 'demand'
-                                stat_inc(statistics, 'sub_demand')
-                            else:
-                                sub_txt = 'other'
-                                stat_inc(statistics, 'sub_other')
-                                # debug
-                                print("Got OTHER sub-type: ", sub_type)
-
-                            stat_inc(statistics, status_txt + '_anynets_' + sub_txt)
-
-                            # Add the anynet to the "current_anynets" object which has filtered anynets from all
-                            current_anynets[anynet_lookup_key] = already_exists
-
-                        else:
-                            # this is a never seen SWI SWI relationship, anynet will need to be added.
-                            logger.debug("{0}: \n\t{1}\n\t{2}".format(anynet_lookup_key,
-                                                                      'new',
-                                                                      siteid_a + "(" + swi_a + ")" +
-                                                                      " <-> " + siteid_b + "(" + swi_b + ")"))
-                            new_anynets[anynet_lookup_key] = {
-                                'status': 'new',
-                                'source_wan_if_id': swi_a,
-                                'target_wan_if_id': swi_b,
-                                'source_site_id': swi_to_site_dict.get(swi_a, None),
-                                'target_site_id': swi_to_site_dict.get(swi_b, None)
-                            }
-                            statistics['needed_anynets'] = statistics.get('needed_anynets', 0) + 1
-
-                        # now that the anynet is handled, mark it as done in fastpath dict so we don't calc for it again
-                        calculated_anynets[anynet_lookup_key] = True
+                    if anynet_lookup_key in calculated_anynets:
+                        continue
+                    calculated_anynets.add(anynet_lookup_key)
+
+                    # Does this Anynet currently exist in the topology?
+                    already_exists = all_anynets.get(anynet_lookup_key, False)
+
+                    if already_exists:
+                        # anynet exists, lets populate stats.
+                        count_current_anynet(statistics, already_exists)
+                        current_anynets[anynet_lookup_key] = already_exists
+
+                    else:
+                        # this is a never seen SWI SWI relationship, anynet will need to be added.
+                        new_anynets[anynet_lookup_key] = {
+                            'status': 'new',
+                            'source_wan_if_id': swi_a,
+                            'target_wan_if_id': swi_b,
+                            'source_site_id': swi_to_site_dict.get(swi_a, None),
+                            'target_site_id': swi_to_site_dict.get(swi_b, None)
+                        }
+
+    statistics['current_anynets'] = len(current_anynets)
+    statistics['needed_anynets'] = len(new_anynets)
+    logger.info("Calculated {0} current and {1} new anynets for {2} A sites and {3} B sites."
+                "".format(len(current_anynets), len(new_anynets), len(site_a_swi_dict), len(site_b_swi_dict)))
 
     # return the calculated data.
     return new_anynets, current_anynets, statistics
 
 
+def new_vpn_link_calculation(siteid_list_a, siteid_list_b, site_id_to_role_dict):
+    """
+    Start a pipelined calculate_vpn_links(). Sites are added one at a time with add_site_vpn_links() as their
+    topology and Site WAN Interfaces load, and each is paired with the sites added before it - so the links are
+    worked out while the rest of the tenant is still loading. Gives the same new and current anynets as
+    calculate_vpn_links() (statistics are not kept).
+    :param siteid_list_a: List A of site IDs
+    :param siteid_list_b: List B of site IDs
+    :param site_id_to_role_dict: site ID to Site Role text.
+    :return: calculation dict
+    """
+    site_index_a = {}
+    for index, siteid in enumerate(siteid_list_a):
+        site_index_a.setdefault(siteid, index)
+
+    return {
+        "site_index_a": site_index_a,                   # site ID -> position in list A (first, if listed twice)
+        "site_set_b": set(siteid_list_b),
+        "site_id_to_role_dict": site_id_to_role_dict,
+        "added_sites": [],                              # (site ID, (SWI, ID number) list, list A position,
+                                                        #  in list B, is DC)
+        "new_anynets": {},                              # same format as calculate_vpn_links() new_anynets
+        "current_anynets": {}                           # same format as calculate_vpn_links() current_anynets
+    }
+
+
+def add_site_vpn_links(calculation, siteid, swi_list, all_anynets_list, swi_to_site_dict):
+    """
+    Add a site to a pipelined VPN link calculation, and work out its links to every site added before it. The
+    topology and Site WAN Interfaces of this site and the sites before it must already be loaded.
+    :param calculation: calculation dict from new_vpn_link_calculation()
+    :param siteid: Site ID
+    :param swi_list: the site's SWIs for the mesh type, format ['<SWI1>', '<SWI2>', ...]. None or empty if none.
+    :param all_anynets_list: list of current anynet dicts to look links up in, first match wins.
+    :param swi_to_site_dict: xlation SWI to SiteID mapping format { '<swi_id>': '<siteid>' }
+    :return: No return
+    """
+    index_a = calculation['site_index_a'].get(siteid)
+    in_b = siteid in calculation['site_set_b']
+    if not swi_list or (index_a is None and not in_b):
+        return
+
+    is_dc = calculation['site_id_to_role_dict'].get(siteid, "UNKNOWN") in ['HUB']
+    swi_list = list(zip(swi_list, intern_ids(swi_list)))
+    new_anynets = calculation['new_anynets']
+    current_anynets = calculation['current_anynets']
+
+    for other_siteid, other_swi_list, other_index_a, other_in_b, other_is_dc in calculation['added_sites']:
+        if (is_dc and other_is_dc) or other_siteid == siteid:
+            continue
+
+        # calculate_vpn_links() meets a site pair first from whichever list A site comes first - same direction.
+        if index_a is not None and other_in_b and (other_index_a is None or not in_b or index_a < other_index_a):
+            swi_list_a, swi_list_b = swi_list, other_swi_list
+        elif other_index_a is not None and in_b:
+            swi_list_a, swi_list_b = other_swi_list, swi_list
+        else:
+            continue
+
+        for swi_a, number_a in swi_list_a:
+            for swi_b, number_b in swi_list_b:
+                if number_a == number_b:
+                    continue
+
+                anynet_lookup_key = pair_key(number_a, number_b)
+
+                already_exists = False
+                for all_anynets in all_anynets_list:
+                    already_exists = all_anynets.get(anynet_lookup_key, False)
+                    if already_exists:
+                        break
+
+                if already_exists:
+                    current_anynets[anynet_lookup_key] = already_exists
+                else:
+                    new_anynets[anynet_lookup_key] = {
+                        'status': 'new',
+                        'source_wan_if_id': swi_a,
+                        'target_wan_if_id': swi_b,
+                        'source_site_id': swi_to_site_dict.get(swi_a, None),
+                        'target_site_id': swi_to_site_dict.get(swi_b, None)
+                    }
+
+    calculation['added_sites'].append((siteid, swi_list, index_a, in_b, is_dc))
+
+
 def load_save_list(item_list, list_name, all_values, tenant_file_name):
     """
     Load/save JSON menu for WAN Networks.
@@ -910,6 +990,8 @@ def main_vpn_menu(siteid_list_a, siteid_list_b, all_anynets,
         print("")
         print_selection_overview(statistics, site_a_wan_networks, site_b_wan_networks)
         print("")
+        discovery.print_cached_topology_age(sdk_vars)
+        discovery.print_skipped_inactive_sites(sdk_vars)
 
         action = [
             ("Edit WAN Networks in List A", 'edit_wna'),
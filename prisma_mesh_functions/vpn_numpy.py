@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Vectorized Full Mesh VPN link calculation - the same new and current anynets as vpn.calculate_vpn_links() when
+list A and list B are the same sites. Optional - needs the 'numpy' module.
+
+"""
+import logging
+from .interning import intern_ids, PAIR_KEY_BITS
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Set NON-SYSLOG logging to use function name
+logger = logging.getLogger(__name__)
+
+
+def swi_columns(site_id_list, site_swi_dict, site_id_to_role_dict):
+    """
+    Build the SWI arrays for a Full Mesh: one row per SWI, in site list order.
+    :param site_id_list: List of site IDs, each site once.
+    :param site_swi_dict: Site-SWI dict format { '<siteid>': ['<SWI1>', '<SWI2>', ...] }
+    :param site_id_to_role_dict: site ID to Site Role text.
+    :return: tuple of SWI list, SWI ID number array, DC (HUB) site array, start row of each site's SWIs (one extra
+             entry, the row count).
+    """
+    swi_list = []
+    dc_column = []
+    site_start_list = []
+
+    for siteid in site_id_list:
+        site_start_list.append(len(swi_list))
+        site_swi_list = site_swi_dict.get(siteid) or []
+        swi_list.extend(site_swi_list)
+        dc_column.extend([site_id_to_role_dict.get(siteid, "UNKNOWN") in ['HUB']] * len(site_swi_list))
+    site_start_list.append(len(swi_list))
+
+    return swi_list, numpy.array(intern_ids(swi_list), dtype=numpy.uint64), numpy.array(dc_column, dtype=bool), \
+        site_start_list
+
+
+def full_mesh_vpn_links(site_id_list, site_swi_dict, all_anynets_list, swi_to_site_dict, site_id_to_role_dict):
+    """
+    Calculate the anynets for a Full Mesh of a list of sites, with array operations instead of a loop per SWI pair.
+    Every SWI is paired with the SWIs of the sites after it (upper triangle), never same site or DC <-> DC, and
+    the pair keys are checked against the current anynets in bulk.
+    :param site_id_list: List of site IDs (list A and list B). Sites listed more than once are only used once.
+    :param site_swi_dict: Site-SWI dict for the mesh type, format { '<siteid>': ['<SWI1>', '<SWI2>', ...] }
+    :param all_anynets_list: list of current anynet dicts to look links up in, first match wins.
+    :param swi_to_site_dict: xlation SWI to SiteID mapping format { '<swi_id>': '<siteid>' }
+    :param site_id_to_role_dict: site ID to Site Role text.
+    :return: tuple with - new_anynets, current_anynets in calculate_vpn_links() format.
+    """
+    new_anynets = {}
+    current_anynets = {}
+
+    site_id_list = list(dict.fromkeys(site_id_list))
+    swi_list, numbers, dc_column, site_start_list = swi_columns(site_id_list, site_swi_dict, site_id_to_role_dict)
+
+    # pairs for each site's SWIs (rows) and the SWIs of every later site (columns) - same site pairs are never
+    # made. Flattening each block row by row keeps calculate_vpn_links() order, so the first of any repeated pair
+    # is the one kept.
+    key_blocks = []
+    source_blocks = []
+    target_blocks = []
+    for site_index in range(len(site_id_list)):
+        start, end = site_start_list[site_index], site_start_list[site_index + 1]
+        if start == end or end == len(swi_list):
+            continue
+
+        numbers_a = numbers[start:end, None]
+        numbers_b = numbers[None, end:]
+        mask = numbers_a != numbers_b
+        if dc_column[start]:
+            mask &= ~dc_column[None, end:]
+
+        low = numpy.minimum(numbers_a, numbers_b)
+        high = numpy.maximum(numbers_a, numbers_b)
+        key_blocks.append(((low << numpy.uint64(PAIR_KEY_BITS)) | high)[mask])
+        rows, columns = numpy.nonzero(mask)
+        source_blocks.append(rows + start)
+        target_blocks.append(columns + end)
+
+    if not key_blocks:
+        return new_anynets, current_anynets
+
+    keys = numpy.concatenate(key_blocks)
+    sources = numpy.concatenate(source_blocks)
+    targets = numpy.concatenate(target_blocks)
+
+    # drop repeated pairs (SWI listed twice, or in two sites), keeping the first.
+    _, first_index = numpy.unique(keys, return_index=True)
+    first_index.sort()
+    keys = keys[first_index]
+    sources = sources[first_index]
+    targets = targets[first_index]
+
+    existing_key_set = set()
+    for all_anynets in all_anynets_list:
+        existing_key_set.update(all_anynets)
+    existing_keys = numpy.fromiter(existing_key_set, dtype=numpy.uint64, count=len(existing_key_set))
+    exists = numpy.isin(keys, existing_keys)
+
+    for anynet_lookup_key, source, target, already_exists in zip(keys.tolist(), sources.tolist(),
+                                                                targets.tolist(), exists.tolist()):
+        link = False
+        if already_exists:
+            for all_anynets in all_anynets_list:
+                link = all_anynets.get(anynet_lookup_key, False)
+                if link:
+                    break
+
+        if link:
+            current_anynets[anynet_lookup_key] = link
+        else:
+            swi_a = swi_list[source]
+            swi_b = swi_list[target]
+            new_anynets[anynet_lookup_key] = {
+                'status': 'new',
+                'source_wan_if_id': swi_a,
+                'target_wan_if_id': swi_b,
+                'source_site_id': swi_to_site_dict.get(swi_a, None),
+                'target_site_id': swi_to_site_dict.get(swi_b, None)
+            }
+
+    logger.info("Calculated {0} current and {1} new anynets for {2} sites."
+                "".format(len(current_anynets), len(new_anynets), len(site_id_list)))
+
+    return new_anynets, current_anynets
@@ -16,6 +16,10 @@ setup(name='prisma_configure_mesh',
             'cloudgenix >= 6.2.1b1',
             'progressbar2 >= 3.53.1'
       ],
+      extras_require={
+            'async': ['aiohttp >= 3.7.4'],
+            'numpy': ['numpy >= 1.17']
+      },
       packages=['prisma_mesh_functions'],
       entry_points={
             'console_scripts': [
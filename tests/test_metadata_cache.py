@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+"""
+metadata_cache.load_items() against a local stand-in controller (http.server on 127.0.0.1).
+
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import requests
+
+from prisma_mesh_functions import api_utils, metadata_cache
+
+TENANT_ID = "1234"
+
+
+class StubControllerHandler(BaseHTTPRequestHandler):
+    """
+    Serves the sites list of the server's 'state', with an ETag unless state['send_etag'] is False. Answers 304
+    when If-None-Match matches, and state['status'] (ex. 500) instead of the list if set.
+    """
+    def do_GET(self):
+        state = self.server.state
+        if_none_match = self.headers.get('If-None-Match')
+        state['requests'].append((self.path, if_none_match))
+
+        if state.get('status'):
+            self.send_response(state['status'])
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        body = json.dumps({"items": state['items']}).encode()
+        etag = '"{0}"'.format(hashlib.md5(body).hexdigest())
+
+        if state['send_etag'] and if_none_match == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        if state['send_etag']:
+            self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        return
+
+
+class LoadItemsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubControllerHandler)
+        self.server.state = {
+            "items": [{"id": "1", "name": "Site 1", "extra": "dropped"}, {"id": "2", "name": "Site 2"}],
+            "send_etag": True,
+            "status": None,
+            "requests": []
+        }
+        self.server_thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.server_thread.start()
+
+        self.cache_dir = tempfile.mkdtemp()
+        self.http_session = requests.Session()
+        controller = "http://127.0.0.1:{0}".format(self.server.server_address[1])
+        self.sdk_session = SimpleNamespace(controller=controller, tenant_id=TENANT_ID, rest_call_timeout=10,
+                                           expose_session=lambda: self.http_session)
+        self.sdk_vars = {
+            "metadata_cache_dir": self.cache_dir,
+            "metadata_cache_key": {"tenant_id": TENANT_ID, "controller": controller},
+            "tenant_str": "tenant",
+            "retry_policy": api_utils.new_retry_policy(max_retries=0),
+            "rate_limits": None
+        }
+        self.fallback_calls = 0
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.http_session.close()
+        shutil.rmtree(self.cache_dir)
+
+    def fallback_get(self):
+        # stands in for sdk_session.get.sites in the paged (non-cached) load.
+        self.fallback_calls += 1
+        return SimpleNamespace(cgx_status=True, cgx_content={"items": [{"id": "fallback"}]})
+
+    def load(self):
+        pages = []
+        status = metadata_cache.load_items(pages.append, 'sites', None, self.fallback_get, self.sdk_vars,
+                                           self.sdk_session, description="sites")
+        self.assertTrue(status)
+        return [item for page in pages for item in page]
+
+    def cache_filename(self):
+        return metadata_cache.metadata_cache_filename(self.cache_dir, "tenant", 'sites')
+
+    def expected_items(self):
+        fields = metadata_cache.METADATA_CACHE_FIELDS['sites']
+        return [{key: item.get(key) for key in fields} for item in self.server.state['items']]
+
+    def test_200_is_cached(self):
+        self.assertEqual(self.load(), self.expected_items())
+        self.assertEqual(self.server.state['requests'][0][1], None)
+        cached = metadata_cache.load_metadata_cache(self.cache_filename(), self.sdk_vars['metadata_cache_key'])
+        self.assertIsNotNone(cached)
+        self.assertEqual(cached[1], self.expected_items())
+        self.assertEqual(self.fallback_calls, 0)
+
+    def test_304_uses_cached_items(self):
+        first = self.load()
+        second = self.load()
+        self.assertEqual(second, first)
+        # second request revalidated with the ETag from the first.
+        self.assertIsNotNone(self.server.state['requests'][1][1])
+        self.assertEqual(self.fallback_calls, 0)
+
+    def test_changed_list_is_downloaded_again(self):
+        self.load()
+        self.server.state['items'][0]['name'] = "Renamed"
+        self.assertEqual(self.load()[0]['name'], "Renamed")
+        cached = metadata_cache.load_metadata_cache(self.cache_filename(), self.sdk_vars['metadata_cache_key'])
+        self.assertEqual(cached[1][0]['name'], "Renamed")
+        # and the new copy revalidates.
+        self.assertEqual(self.load()[0]['name'], "Renamed")
+        self.assertEqual(len(self.server.state['requests']), 3)
+        self.assertEqual(self.fallback_calls, 0)
+
+    def test_no_etag_uses_paged_load_next_time(self):
+        self.server.state['send_etag'] = False
+        self.assertEqual(self.load(), self.expected_items())
+        # only the missing ETag is kept, not the objects.
+        self.assertEqual(metadata_cache.load_metadata_cache(self.cache_filename(),
+                                                            self.sdk_vars['metadata_cache_key']), (None, None))
+        # nothing to revalidate, the next run pages instead of another full GET.
+        self.assertEqual(self.load(), [{"id": "fallback"}])
+        self.assertEqual(len(self.server.state['requests']), 1)
+        self.assertEqual(self.fallback_calls, 1)
+
+    def test_no_etag_is_checked_again_later(self):
+        self.server.state['send_etag'] = False
+        self.load()
+        with open(self.cache_filename()) as cache_file:
+            cache_data = json.load(cache_file)
+        cache_data['timestamp'] -= metadata_cache.NO_ETAG_RECHECK_SECONDS + 1
+        with open(self.cache_filename(), 'w') as cache_file:
+            json.dump(cache_data, cache_file)
+
+        self.server.state['send_etag'] = True
+        self.assertEqual(self.load(), self.expected_items())
+        self.assertEqual(len(self.server.state['requests']), 2)
+        self.assertEqual(self.fallback_calls, 0)
+        # ETag now sent, so the list is cached.
+        self.assertIsNotNone(metadata_cache.load_metadata_cache(self.cache_filename(),
+                                                                self.sdk_vars['metadata_cache_key'])[0])
+
+    def test_failed_get_uses_paged_load(self):
+        self.server.state['status'] = 500
+        self.assertEqual(self.load(), [{"id": "fallback"}])
+        self.assertEqual(self.fallback_calls, 1)
+        self.assertFalse(os.path.exists(self.cache_filename()))
+
+    def test_cache_off_uses_paged_load(self):
+        self.sdk_vars['metadata_cache_dir'] = None
+        self.assertEqual(self.load(), [{"id": "fallback"}])
+        self.assertEqual(self.server.state['requests'], [])
+        self.assertEqual(self.fallback_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()